@@ -22,7 +22,7 @@ class DensityOfStates:
             List of points on energy spectrum . The default is None.
         total : list float, optional
             List of densities at each point. The default is None.
-        projected : list float, optional
+        projected : list float or ndarray, optional
             dictionary by the following order
             projected[iatom][iprincipal][iorbital][ispin][ienergy].
 
@@ -60,15 +60,24 @@ class DensityOfStates:
 
             self.total = interpolated
 
-            for iatom in range(len(projected)):
-                for iprincipal in range(len(projected[iatom])):
-                    for iorbital in range(len(projected[iatom][iprincipal])):
-                        for ispin in range(len(projected[iatom][iprincipal][iorbital])):
-                            x = energies
-                            y = projected[iatom][iprincipal][iorbital][ispin]
-                            xs, ys = interpolate(x, y, factor=interpolation_factor)
-
-                            self.projected[iatom][iprincipal][iorbital][ispin] = ys
+            if isinstance(projected, np.ndarray):
+                # all the projections at once, the energies are the last axis
+                xs, ys = interpolate(
+                    energies, np.moveaxis(projected, -1, 0), factor=interpolation_factor
+                )
+                self.projected = np.moveaxis(ys, 0, -1)
+            else:
+                for iatom in range(len(projected)):
+                    for iprincipal in range(len(projected[iatom])):
+                        for iorbital in range(len(projected[iatom][iprincipal])):
+                            for ispin in range(
+                                len(projected[iatom][iprincipal][iorbital])
+                            ):
+                                x = energies
+                                y = projected[iatom][iprincipal][iorbital][ispin]
+                                xs, ys = interpolate(x, y, factor=interpolation_factor)
+
+                                self.projected[iatom][iprincipal][iorbital][ispin] = ys
 
             self.energies = xs
 
@@ -595,35 +595,33 @@ class ElectronicBandStructure:
 
         p.show()
 
-    def ibz2fbz(self, rotations):
+    def ibz2fbz(self, rotations, tolerance=1e-5):
         """Generates the full Brillouin zone from the irreducible Brillouin
         zone using point symmetries.
 
         Parameters:
             - self.kpoints: the kpoints used to sample the Brillouin zone
-            - self.projected: the projected band structure at each kpoint
+            - self.bands, self.projected, self.projected_phase: the band
+              structure at each kpoint, taken from the irreducible kpoint
+              of every new kpoint
+            - self.weights: the weight of every irreducible kpoint is
+              split evenly between the kpoints it unfolds to, so the
+              total weight is kept
             - rotations: the point symmetry operations of the lattice
+            - tolerance: kpoints closer than this are the same
         """
-        klist = []
-        plist = []
-        # for each symmetry operation
-
-        for i, _ in enumerate(rotations):
-            # for each point
-            for j, _ in enumerate(self.kpoints):
-                # apply symmetry operation to kpoint
-                sympoint_vector = np.dot(rotations[i], self.kpoints[j])
-                # apply boundary conditions
-                # bound_ops = -1.0*(sympoint_vector > 0.5) + 1.0*(sympoint_vector < -0.5)
-                # sympoint_vector += bound_ops
-
-                sympoint = sympoint_vector.tolist()
-
-                if sympoint not in klist:
-                    klist.append(sympoint)
-
-                    projection = self.projected[j].tolist()
-                    plist.append(projection)
-
-        self.kpoints = np.array(klist)
-        self.projected = np.array(plist)
+        self.kpoints, index = mathematics.unfold_kpoints(
+            self.kpoints, rotations, tolerance
+        )
+        if self.bands is not None:
+            self.bands = self.bands[index]
+        if self.projected is not None:
+            self.projected = self.projected[index]
+        if self.projected_phase is not None:
+            self.projected_phase = self.projected_phase[index]
+        if self.weights is not None:
+            weights = np.asarray(self.weights)
+            counts = np.bincount(index, minlength=len(weights))[index]
+            self.weights = weights[index] / counts.reshape(
+                (-1,) + (1,) * (weights.ndim - 1)
+            )
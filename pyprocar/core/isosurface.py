@@ -21,6 +21,7 @@ class Isosurface(Surface):
             padding=None,
             transform_matrix=None,
             boundaries=None,
+            matrix_cache=None,
     ):
         """
         This class contains a surface that finds all the poins correcponding
@@ -67,6 +68,11 @@ class Isosurface(Surface):
         boundaries : TYPE, pyprocar surface
             DESCRIPTION. The default is None. The boundaries in which the isosurface will be clipped with
             for example the first brillouin zone
+        matrix_cache : TYPE, dict
+            DESCRIPTION. The default is None. If a dictionary is given, the
+            padded and interpolated V_matrix are stored in it, so isosurfaces
+            of the same function at other isovalues created with the same
+            dictionary skip the padding and the Fourier interpolation.
 
         """
 
@@ -79,6 +85,7 @@ class Isosurface(Surface):
         self.interpolation_factor = interpolation_factor
         self.transform_matrix = transform_matrix
         self.boundaries = boundaries
+        self.matrix_cache = matrix_cache
         
         if self.algorithm not in ['classic', 'lewiner']:
 
@@ -119,12 +126,10 @@ class Isosurface(Surface):
             """
 
             if boundaries is not None:
-                suprecell_surface = Surface(
-                    verts=verts, faces=faces, face_normals=normals
-                )
-                if not np.isnan(suprecell_surface.pyvista_obj.points[0, 0]):
-                    verts, faces = self.clip(suprecell_surface, boundaries)
-                # verts, faces = self.clip(suprecell_surface, boundaries)
+                if not np.isnan(verts[0, 0]):
+                    verts, faces = clip_by_planes(
+                        verts, faces, boundaries.centers, boundaries.face_normals
+                    )
 
         
    
@@ -146,26 +151,7 @@ class Isosurface(Surface):
         verts,faces
 
         """
-
-        for iface in range(len(S2.faces)):
-            normal = S2.face_normals[iface]
-
-            center = np.average(S2.verts[S2.faces[iface]], axis=0)
-
-            S1.pyvista_obj.clip(origin=center, normal=normal, inplace=True)
-
-        faces = []
-        courser = 0
-        for i in range(S1.pyvista_obj.n_faces):
-            npoints = S1.pyvista_obj.faces[courser]
-            face = []
-            courser += 1
-            for ipoint in range(npoints):
-                face.append(S1.pyvista_obj.faces[courser])
-                courser += 1
-            faces.append(face)
-
-        return S1.pyvista_obj.points, faces
+        return clip_by_planes(S1.verts, S1.faces, S2.centers, S2.face_normals)
 
     @property
     def X(self):
@@ -263,7 +249,7 @@ class Isosurface(Surface):
     @property
     def surface_boundaries(self):
         """
-        This function tries to find the isosurface using no interpolation to find the
+        This function finds the boundaries of the isosurface using no interpolation to find the
         correct positions of the surface to be able to shift to the interpolated one
         to the correct position
 
@@ -274,31 +260,48 @@ class Isosurface(Surface):
 
         """
 
-        padding_x = self.padding[0]
-        padding_y = self.padding[1]
-        padding_z = self.padding[2]
+        return self._get_surface_boundaries(self._get_eigen_matrix())
 
-        eigen_matrix = np.pad(
-            self.V_matrix,
-            ((padding_x, padding_x), (padding_y, padding_y), (padding_z, padding_z)),
-            "wrap",
-        )
-        try:
-            verts, faces, normals, values = measure.marching_cubes_lewiner(
-                eigen_matrix, self.isovalue
-            )
-            for ix in range(3):
-                verts[:, ix] -= verts[:, ix].min()
-                verts[:, ix] -= (
-                    verts[:, ix].max() - verts[:, ix].min()
-                ) / 2  # +self.origin[ix]
-                verts[:, ix] *= self.dxyz[ix]
-            mins = verts.min(axis=0)
-            maxs = verts.max(axis=0)
-
-            return [(mins[0], maxs[0]), (mins[1], maxs[1]), (mins[2], maxs[2])]
-        except:
+    def _get_surface_boundaries(self, eigen_matrix):
+        """
+        surface_boundaries of the padded matrix. The size of the surface is
+        found from the grid (see isosurface_extent) instead of running the
+        marching cubes.
+        """
+        extent = isosurface_extent(eigen_matrix, self.isovalue)
+        if extent is None:
             return None
+        dxyz = self.dxyz
+        return [
+            (-extent[ix] / 2 * dxyz[ix], extent[ix] / 2 * dxyz[ix]) for ix in range(3)
+        ]
+
+    def _get_eigen_matrix(self, interp_factor=1):
+        """
+        V_matrix padded and, if interp_factor is not 1, Fourier
+        interpolated. Taken from matrix_cache when it is there.
+        """
+        key = (tuple(self.padding), interp_factor)
+        if self.matrix_cache is not None and key in self.matrix_cache:
+            return self.matrix_cache[key]
+
+        if interp_factor == 1:
+            padding_x = self.padding[0]
+            padding_y = self.padding[1]
+            padding_z = self.padding[2]
+
+            eigen_matrix = np.pad(
+                self.V_matrix,
+                ((padding_x, padding_x), (padding_y, padding_y), (padding_z, padding_z)),
+                "wrap",
+            )
+        else:
+            # Fourier interpolate the mapped function E(x,y,z)
+            eigen_matrix = fft_interpolate(self._get_eigen_matrix(), interp_factor)
+
+        if self.matrix_cache is not None:
+            self.matrix_cache[key] = eigen_matrix
+        return eigen_matrix
 
     def _get_isosurface(self, interp_factor=1):
         """
@@ -322,29 +325,18 @@ class Isosurface(Surface):
 
         """
 
-        # Amount of kpoints needed to add on to fully sample 1st BZ
-
-        padding_x = self.padding[0]
-        padding_y = self.padding[1]
-        padding_z = self.padding[2]
+        # the boundaries are only needed to place interpolated surfaces
+        bnd = None
+        if interp_factor != 1 and not np.any(self.XYZ >= 0.5):
+            bnd = self._get_surface_boundaries(self._get_eigen_matrix())
 
-        eigen_matrix = np.pad(
-            self.V_matrix,
-            ((padding_x, padding_x), (padding_y, padding_y), (padding_z, padding_z)),
-            "wrap",
-        )
-
-        bnd = self.surface_boundaries
-
-        if interp_factor != 1:
-            # Fourier interpolate the mapped function E(x,y,z)
-
-            eigen_matrix = fft_interpolate(eigen_matrix, interp_factor)
+        # Amount of kpoints needed to add on to fully sample 1st BZ
+        eigen_matrix = self._get_eigen_matrix(interp_factor)
 
-            # after the FFT we loose the center of the BZ, using numpy roll we
-            # bring back the center of the BZ
-            # eigen_matrix = np.roll(eigen_matrix, 4  ,
-            #     axis=[0, 1, 2])
+        # after the FFT we loose the center of the BZ, using numpy roll we
+        # bring back the center of the BZ
+        # eigen_matrix = np.roll(eigen_matrix, 4  ,
+        #     axis=[0, 1, 2])
 
         try:
 
@@ -413,47 +405,161 @@ def map2matrix(XYZ, V):
     ----------
     XYZ : TYPE
         DESCRIPTION.
-    V : TYPE
-        DESCRIPTION.
+    V : TYPE, (n,) or (n, ...)
+        DESCRIPTION. Values at XYZ. Several values per point (e.g. all the
+        bands at once) are mapped in a single call.
 
     Returns
     -------
-    mapped_func : TYPE
+    mapped_func : TYPE, (nx, ny, nz) or (nx, ny, nz, ...)
         DESCRIPTION.
 
     """
-    XYZ = XYZ
-    V = V
+    X, ix = np.unique(XYZ[:, 0], return_inverse=True)
+    Y, iy = np.unique(XYZ[:, 1], return_inverse=True)
+    Z, iz = np.unique(XYZ[:, 2], return_inverse=True)
+    shape = (len(X), len(Y), len(Z))
+    V = np.asarray(V)
+
+    # cells without a point are left as nan
+    mapped_func = np.full(shape + V.shape[1:], np.nan)
+
+    # points with a missing (nan) coordinate do not belong to any cell
+    valid = ~np.isnan(XYZ).any(axis=1)
+    cells = np.ravel_multi_index(
+        (ix.ravel()[valid], iy.ravel()[valid], iz.ravel()[valid]), shape
+    )
+    # if several points fall in the same cell the first one is kept
+    cells, first = np.unique(cells, return_index=True)
+    mapped_func.reshape((-1,) + V.shape[1:])[cells] = V[valid][first]
+    return mapped_func
 
-    X = np.unique(XYZ[:, 0])
-    Y = np.unique(XYZ[:, 1])
-    Z = np.unique(XYZ[:, 2])
 
-    mapped_func = np.zeros(shape=(len(X), len(Y), len(Z)))
-    # kpoint_matrix = np.zeros(shape=(len(kx), len(ky), len(kz), 3)) This was added to check if the mesh grid is working
+def clip_by_planes(verts, faces, origins, normals):
+    """
+    Clips a triangulated surface with planes, keeping the part behind all
+    of them (opposite to the normals), e.g. inside a Brillouin zone.
+
+    Every plane is applied to all the triangles at once: the triangles with
+    the three vertices inside are kept, the ones with one or two vertices
+    inside are cut into one or two triangles, whose new vertices are on the
+    crossing edges and are shared by the neighbouring triangles.
 
-    count = 0
-    for ix in range(len(X)):
-        condition1 = XYZ[:, 0] == X[ix]
-        count += 1
+    Parameters
+    ----------
+    verts : TYPE, float (nverts,3)
+        DESCRIPTION.
+    faces : TYPE, int (nfaces,3)
+        DESCRIPTION. Triangles.
+    origins : TYPE, float (nplanes,3)
+        DESCRIPTION. A point of each plane.
+    normals : TYPE, float (nplanes,3)
+        DESCRIPTION. Normal of each plane.
 
-        for iy in range(len(Y)):
-            condition2 = XYZ[:, 1] == Y[iy]
+    Returns
+    -------
+    verts : TYPE, float (n,3)
+        DESCRIPTION. Only the vertices used by the clipped faces.
+    faces : TYPE, int (m,3)
+        DESCRIPTION.
 
-            # print(count)
-            for iz in range(len(Z)):
+    """
+    verts = np.asarray(verts, dtype=float)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    for origin, normal in zip(origins, normals):
+        distance = np.dot(verts - origin, normal)
+        inside = distance[faces] <= 0
+        ninside = inside.sum(axis=1)
+
+        # rotate the cut triangles (keeping their orientation) so the
+        # vertex alone on its side is the first one
+        cut = faces[(ninside == 1) | (ninside == 2)]
+        alone = inside[(ninside == 1) | (ninside == 2)]
+        alone = np.where(alone.sum(axis=1, keepdims=True) == 1, alone, ~alone)
+        shift = np.argmax(alone, axis=1)
+        cut = cut[np.arange(len(cut))[:, None], (np.arange(3) + shift[:, None]) % 3]
+
+        # new vertices on the crossing edges, one per edge
+        edges = np.concatenate([cut[:, [0, 1]], cut[:, [0, 2]]])
+        edges = np.sort(edges, axis=1)
+        edges, index = np.unique(edges, axis=0, return_inverse=True)
+        d0 = distance[edges[:, 0]]
+        d1 = distance[edges[:, 1]]
+        # an end of the edge on the plane is used as it is
+        on_plane = np.where(d0 == 0, edges[:, 0], edges[:, 1])
+        new = (d0 != 0) & (d1 != 0)
+        edge_verts = on_plane.copy()
+        edge_verts[new] = len(verts) + np.arange(np.count_nonzero(new))
+        index = edge_verts[index.reshape(2, -1)]
+        t = (d0[new] / (d0[new] - d1[new]))[:, None]
+        start = verts[edges[new, 0]]
+        verts = np.concatenate([verts, start + t * (verts[edges[new, 1]] - start)])
+
+        # one vertex inside: triangle 0, p01, p02
+        one = ninside[(ninside == 1) | (ninside == 2)] == 1
+        p01 = index[0]
+        p02 = index[1]
+        triangles_one = np.stack([cut[one, 0], p01[one], p02[one]], axis=1)
+        # two vertices inside (1, 2): quad 1, 2, p02, p01
+        two = ~one
+        triangles_two = np.concatenate(
+            [
+                np.stack([cut[two, 1], cut[two, 2], p02[two]], axis=1),
+                np.stack([cut[two, 1], p02[two], p01[two]], axis=1),
+            ]
+        )
+        faces = np.concatenate([faces[ninside == 3], triangles_one, triangles_two])
 
-                condition3 = XYZ[:, 2] == Z[iz]
-                tot_cond = np.all([condition1, condition2, condition3], axis=0)
-                if len(V[tot_cond]) != 0:
+    # drop the vertices that are not used anymore
+    used, faces = np.unique(faces, return_inverse=True)
+    return verts[used], faces.reshape(-1, 3)
 
-                    mapped_func[ix, iy, iz] = V[tot_cond][0]
-                    # kpoint_matrix[ikx, iky, ikz] = [
-                    #     kx[ikx], ky[iky], kz[ikz]]
-                else:
-                    mapped_func[ix, iy, iz] = np.nan
-                    # kpoint_matrix[ikx, iky, ikz] = [np.nan, np.nan, np.nan]
-    return mapped_func
+
+def isosurface_extent(matrix, isovalue):
+    """
+    Size, in grid points along each direction, of the isosurface the
+    marching cubes finds in matrix, without extracting the surface. The
+    vertices of the marching cubes are on the edges of the grid whose ends
+    are on different sides of the isovalue, at the linearly interpolated
+    position, so the extremes of the surface come from those edges.
+
+    Parameters
+    ----------
+    matrix : TYPE, float (nx,ny,nz)
+        DESCRIPTION.
+    isovalue : TYPE, float
+        DESCRIPTION.
+
+    Returns
+    -------
+    extent : TYPE, float (3,)
+        DESCRIPTION. None if there is no isosurface.
+
+    """
+    above = matrix > isovalue
+    lower = np.full(3, np.inf)
+    upper = np.full(3, -np.inf)
+    for axis in range(3):
+        head = [slice(None)] * 3
+        tail = [slice(None)] * 3
+        head[axis] = slice(None, -1)
+        tail[axis] = slice(1, None)
+        head, tail = tuple(head), tuple(tail)
+        edges = np.nonzero(above[head] != above[tail])
+        if len(edges[0]) == 0:
+            continue
+        for ix in range(3):
+            if ix == axis:
+                v0 = matrix[head][edges]
+                v1 = matrix[tail][edges]
+                coords = edges[ix] + (isovalue - v0) / (v1 - v0)
+            else:
+                coords = edges[ix]
+            lower[ix] = min(lower[ix], coords.min())
+            upper[ix] = max(upper[ix], coords.max())
+    if not np.all(np.isfinite(lower)):
+        return None
+    return upper - lower
 
 
 def fft_interpolate(function, interpolation_factor=2):
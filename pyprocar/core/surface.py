@@ -57,6 +57,8 @@ class Surface(object):
 
         self.verts = verts
         self.faces = faces
+        if self.faces is not None:
+            self.faces = _as_faces_array(self.faces)
         self.face_normals = face_normals
         self.vert_normals = vert_normals
         self.face_colors = face_colors
@@ -96,9 +98,13 @@ class Surface(object):
         """
 
         if self.verts is not None:
-            centers = np.zeros(shape=(len(self.faces), 3))
-            for iface in range(self.nfaces):
-                centers[iface, 0:3] = np.average(self.verts[self.faces[iface]], axis=0)
+            verts = np.asarray(self.verts)
+            if isinstance(self.faces, np.ndarray):
+                centers = verts[self.faces].mean(axis=1).reshape(-1, 3)
+            else:
+                centers = np.zeros(shape=(len(self.faces), 3))
+                for iface in range(self.nfaces):
+                    centers[iface, 0:3] = np.average(verts[self.faces[iface]], axis=0)
         else:
             centers = None
         return centers
@@ -146,15 +152,8 @@ class Surface(object):
         [n_verts_1st_face,1st_vert,2nd_vert,...,nverts_2nd_face,1st_vert,2nd_vert,...]
         """
         verts = np.array(self.verts)
-        faces = np.array(self.faces)
-        new_faces = []
 
-        for iface in faces:
-            new_faces.append(len(iface))
-            for ivert in iface:
-                new_faces.append(ivert)
-
-        self.pyvista_obj = pyvista.PolyData(verts, np.array(new_faces))
+        self.pyvista_obj = pyvista.PolyData(verts, _to_pyvista_faces(self.faces))
         if self.scalars is not None:
             self.pyvista_obj["scalars"] = self.scalars
             self.pyvista_obj.set_active_scalars("scalars")
@@ -166,17 +165,12 @@ class Surface(object):
         """
         creates a trimesh object
         """
-        if np.any(np.array([len(x) for x in self.faces]) > 3):
-            faces = []
-            for i in range(0, len(self.pyvista_obj.triangulate().faces), 4):
-                point_1 = self.pyvista_obj.triangulate().faces[i + 1]
-                point_2 = self.pyvista_obj.triangulate().faces[i + 2]
-                point_3 = self.pyvista_obj.triangulate().faces[i + 3]
-                faces.append([point_1, point_2, point_3])
-            self.trimesh_obj = trimesh.Trimesh(vertices=self.verts, faces=faces)
-
+        if isinstance(self.faces, np.ndarray) and self.faces.shape[1] == 3:
+            faces = self.faces
         else:
-            self.trimesh_obj = trimesh.Trimesh(vertices=self.verts, faces=self.faces)
+            # polygons are triangulated (once) by pyvista
+            faces = self.pyvista_obj.triangulate().faces.reshape(-1, 4)[:, 1:]
+        self.trimesh_obj = trimesh.Trimesh(vertices=self.verts, faces=faces)
 
     def set_scalars(
         self,
@@ -220,14 +214,15 @@ class Surface(object):
 
 
         """
+        scalars = np.asarray(self.scalars)
         if vmin is None:
-            vmin = min(self.scalars)
+            vmin = scalars.min()
         if vmax is None:
-            vmax = max(self.scalars)
+            vmax = scalars.max()
         norm = mpcolors.Normalize(vmin=vmin, vmax=vmax)
         cmap = cm.get_cmap(cmap)
 
-        colors = np.array([cmap(norm(x)) for x in self.scalars]).reshape(-1, 4)
+        colors = np.asarray(cmap(norm(scalars))).reshape(-1, 4)
         self.face_colors = colors
 
         # This next line will make all the surfaces double sided if you want
@@ -279,17 +274,58 @@ def convert_from_pyvista_faces(pyvista_obj):
     vert conections
 
     """
+    faces = np.asarray(pyvista_obj.faces)
+    nfaces = pyvista_obj.n_faces
+    if nfaces > 0 and len(faces) % nfaces == 0:
+        # all the faces have the same number of vertices
+        size = len(faces) // nfaces - 1
+        if np.all(faces[:: size + 1] == size):
+            return faces.reshape(nfaces, size + 1)[:, 1:]
+
     new_faces = []
     courser = 0
-    for iface in range(pyvista_obj.n_faces):
+    for iface in range(nfaces):
         start = courser + 1
-        end = start + pyvista_obj.faces[courser]
-        face = pyvista_obj.faces[start:end]
+        end = start + faces[courser]
+        face = faces[start:end]
         courser = end
         new_faces.append(face)
     return new_faces
 
 
+def _as_faces_array(faces):
+    """
+    Faces as a contiguous (nfaces, nverts) int array when all of them have
+    the same number of vertices (e.g. triangles), otherwise as a list of
+    int arrays.
+    """
+    if len(faces) == 0:
+        return np.zeros(shape=(0, 3), dtype=np.int64)
+    try:
+        return np.ascontiguousarray(faces, dtype=np.int64).reshape(len(faces), -1)
+    except (ValueError, TypeError):
+        return [np.asarray(face, dtype=np.int64) for face in faces]
+
+
+def _to_pyvista_faces(faces):
+    """
+    Flat VTK connectivity of faces,
+    [n_verts_1st_face,1st_vert,2nd_vert,...,nverts_2nd_face,1st_vert,2nd_vert,...]
+    """
+    if isinstance(faces, np.ndarray):
+        sizes = np.full(shape=(len(faces), 1), fill_value=faces.shape[1])
+        return np.hstack((sizes, faces)).ravel()
+
+    sizes = np.array([len(face) for face in faces], dtype=np.int64)
+    starts = np.cumsum(sizes + 1) - (sizes + 1)
+    new_faces = np.empty(shape=(sizes.sum() + len(sizes),), dtype=np.int64)
+    is_size = np.zeros(len(new_faces), dtype=bool)
+    is_size[starts] = True
+    new_faces[is_size] = sizes
+    new_faces[~is_size] = np.concatenate(faces)
+    return new_faces
+
+
 def boolean_add(surfaces):
     """
     This functtion uses boolean add from PyVista
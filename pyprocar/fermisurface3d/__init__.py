@@ -1,2 +1,8 @@
-from .fermisurface3D import FermiSurface3D, FermiSurfaceBand3D
+from .fermisurface3D import (
+    FermiSurface3D,
+    FermiSurfaceBand3D,
+    FermiSurfaceSweep,
+    crossing_bands,
+)
 from .brillouin_zone import BrillouinZone
+from .projection import PeriodicProjector
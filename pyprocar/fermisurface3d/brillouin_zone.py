@@ -9,6 +9,10 @@ __maintainer__ = "Pedram Tavadze"
 __email__ = "petavazohi@mail.wvu.edu"
 __date__ = "March 31, 2020"
 
+# vertices and faces of the Wigner-Seitz cell of every reciprocal lattice
+# already used, every band surface needs the same Brillouin zone
+_WIGNER_SEITZ_CACHE = {}
+
 
 class Lines:
     def __init__(self, verts=None, faces=None):
@@ -105,7 +109,14 @@ class BrillouinZone(Surface):
             Using the Wigner-Seitz Method, this function finds the 1st
             Brillouin Zone in terms of vertices and faces
         """
-
+        reciprocal = np.asarray(self.reciprocal, dtype=float)
+        key = reciprocal.tobytes()
+        if key not in _WIGNER_SEITZ_CACHE:
+            _WIGNER_SEITZ_CACHE[key] = self._wigner_seitz()
+        verts, faces = _WIGNER_SEITZ_CACHE[key]
+        return verts.copy(), faces.copy()
+
+    def _wigner_seitz(self):
         kpoints = []
         for i in range(-1, 2):
             for j in range(-1, 2):
@@ -124,12 +135,14 @@ class BrillouinZone(Surface):
                 faces.append(brill.ridge_dict[idict])
 
         verts = brill.vertices
-        return np.array(verts), np.array(faces)
+        # the faces are polygons with different number of vertices
+        return np.array(verts), faces
 
     def _fix_normals_direction(self):
         # directions = np.zeros_like(self.centers)
+        centers = self.centers
         for iface in range(self.nfaces):
-            center = self.centers[iface]
+            center = centers[iface]
             n1 = center / np.linalg.norm(center)
             n2 = self.face_normals[iface]
 
@@ -3,26 +3,46 @@ Created on Fri March 31 2020
 @author: Pedram Tavadze
 
 """
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import itertools
-import scipy.interpolate as interpolate
 from ..core import Isosurface
+from ..core.isosurface import map2matrix
 from .brillouin_zone import BrillouinZone
+from .projection import PeriodicProjector
 from matplotlib import colors as mpcolors
 from matplotlib import cm
+from ..utils.spectral import BandDerivatives, EV_TO_J, HBAR_J
+
+
+def crossing_bands(bands, emin, emax=None):
+    """
+    Bands taking a value between ``emin`` and ``emax`` (default ``emin``),
+    the others cannot have an isosurface at these energies.
+
+    Parameters
+    ----------
+    bands : (..., nband) float
+        Energies of the bands (last axis) at the kpoints or on a grid.
+
+    Returns
+    -------
+    (nband,) bool
+    """
+    if emax is None:
+        emax = emin
+    bands = np.reshape(bands, (-1, np.shape(bands)[-1]))
+    return (np.nanmin(bands, axis=0) <= emax) & (np.nanmax(bands, axis=0) >= emin)
+
 
-import math
-HBAR_EV = 6.582119 *10**(-16) #eV*s
-HBAR_J = 1.0545718 *10**(-34) #eV*s
-METER_ANGSTROM = 10**(-10) #m /A
-EV_TO_J = 1.602*10**(-19)
-FREE_ELECTRON_MASS = 9.11*10**-31 #  kg
 class FermiSurfaceBand3D(Isosurface):
 
     def __init__(
         self,
         kpoints=None,
         band=None,
+        band_matrix=None,
         spd=None,
         spd_spin=None,
         fermi_velocity_vector = False,
@@ -38,7 +58,11 @@ class FermiSurfaceBand3D(Isosurface):
         vmin=0,
         vmax=1,
         supercell=[1, 1, 1],
-        sym =False
+        sym =False,
+        derivatives=None,
+        derivatives_index=0,
+        matrix_cache=None,
+        projector=None,
     ):
 
         """
@@ -52,6 +76,9 @@ class FermiSurfaceBand3D(Isosurface):
         band : (n,) float
             A list of energies of ith band cooresponding to the
             kpoints.
+        band_matrix : (nx,ny,nz) float, optional
+            The band already mapped on the grid of the kpoints (see
+            ``map2matrix``). The default is None, it is mapped here.
         spd :
             numpy array containing the information about ptojection of atoms,
             orbitals and spin on each band (check procarparser)  
@@ -83,6 +110,20 @@ class FermiSurfaceBand3D(Isosurface):
             DESCRIPTION. The default is 0.
         vmax : TYPE, float
             DESCRIPTION. The default is 1.
+        derivatives : BandDerivatives, optional
+            Derivatives already computed for a set of bands on the same
+            kpoints, this band being the one at ``derivatives_index``.
+            The default is None, they are computed for this band when
+            needed.
+        derivatives_index : int, optional
+            The default is 0.
+        matrix_cache : dict, optional
+            The default is None. Stores the padded and interpolated grid
+            of the band for surfaces at other energies
+            (see ``Isosurface``).
+        projector : PeriodicProjector, optional
+            The default is None. Projector of the kpoints shared with the
+            other bands, it is created here when needed.
         """
 
         self.kpoints = kpoints
@@ -100,6 +141,9 @@ class FermiSurfaceBand3D(Isosurface):
         self.fermi_velocity_vector = fermi_velocity_vector
         self.fermi_velocity = fermi_velocity
         self.effective_mass = effective_mass
+        self.derivatives = derivatives
+        self.derivatives_index = derivatives_index
+        self._projector = projector
         self.brillouin_zone = self._get_brilloin_zone(self.supercell)
 
 
@@ -109,12 +153,14 @@ class FermiSurfaceBand3D(Isosurface):
                 self,
                 XYZ=self.kpoints,
                 V=self.band,
+                V_matrix=band_matrix,
                 isovalue=self.fermi,
                 algorithm="lewiner",
                 interpolation_factor=interpolation_factor,
                 padding=self.supercell * 2,
                 transform_matrix=self.reciprocal_lattice,
                 boundaries=self.brillouin_zone,
+                matrix_cache=matrix_cache,
 
             )
         else:
@@ -122,12 +168,14 @@ class FermiSurfaceBand3D(Isosurface):
                 self,
                 XYZ=self.kpoints,
                 V=self.band,
+                V_matrix=band_matrix,
                 isovalue=self.fermi,
                 algorithm="lewiner",
                 interpolation_factor=interpolation_factor,
                 padding=self.supercell,
                 transform_matrix=self.reciprocal_lattice,
                 boundaries=self.brillouin_zone,
+                matrix_cache=matrix_cache,
             )
             
         
@@ -136,268 +184,55 @@ class FermiSurfaceBand3D(Isosurface):
         if self.spd_spin is not None and self.verts is not None:
             self.create_spin_texture( vectors = self.spd_spin)
             
-        if self.fermi_velocity_vector is not None and self.verts is not None:
+        if (
+            self.fermi_velocity_vector == True
+            or self.fermi_velocity == True
+            or self.effective_mass == True
+        ) and self.verts is not None:
             self.calculate_first_and_second_derivative_energy()
+
+        if self.fermi_velocity_vector == True and self.verts is not None:
             self.create_vector_texture( vectors = self.group_velocity_vector)
             
         if self.fermi_velocity == True and self.verts is not None:
-            self.calculate_first_and_second_derivative_energy()
             self.project_color(cmap, vmin, vmax, scalars = self.group_velocity_magnitude)
         if self.effective_mass == True and self.verts is not None:
-            self.calculate_first_and_second_derivative_energy()
             self.project_color(cmap, vmin, vmax, scalars = self.effective_mass_list)
 
         if self.sym == True:
             self.ibz2fbz()
 
-    def create_vector_texture(self,vectors):
-
+    @property
+    def projector(self):
+        if self._projector is None:
+            self._projector = PeriodicProjector(self.kpoints, self.reciprocal_lattice)
+        return self._projector
 
-        XYZ_extended = self.XYZ.copy()
-        vectors_extended_X = vectors[0].copy()
-        vectors_extended_Y = vectors[1].copy()
-        vectors_extended_Z = vectors[2].copy()
-
-        for ix in range(3):
-            for iy in range(self.supercell[ix]):
-                temp = self.XYZ.copy()
-                temp[:, ix] += 1 * (iy + 1)
-                XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                vectors_extended_X = np.append(
-                    vectors_extended_X, vectors[0], axis=0
-                )
-                vectors_extended_Y = np.append(
-                    vectors_extended_Y, vectors[1], axis=0
-                )
-                vectors_extended_Z = np.append(
-                    vectors_extended_Z, vectors[2], axis=0
-                )
-                temp = self.XYZ.copy()
-                temp[:, ix] -= 1 * (iy + 1)
-                XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                vectors_extended_X = np.append(
-                    vectors_extended_X, vectors[0], axis=0
-                )
-                vectors_extended_Y = np.append(
-                    vectors_extended_Y, vectors[1], axis=0
-                )
-                vectors_extended_Z = np.append(
-                    vectors_extended_Z, vectors[2], axis=0
-                )
-
-        if np.any(self.XYZ >= 0.5): # @logan : I think this should be before the above loop with another else statment
-            for iy in range(self.supercell[ix]):
-                temp = self.XYZ.copy()
-                temp[:, 0] -= 1 * (iy + 1)
-                temp[:, 1] -= 1 * (iy + 1)
-                XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                vectors_extended_X = np.append(
-                    vectors_extended_X, vectors[0], axis=0
-                )
-                vectors_extended_Y = np.append(
-                    vectors_extended_Y, vectors[1], axis=0
-                )
-                vectors_extended_Z = np.append(
-                    vectors_extended_Z, vectors[2], axis=0
-                )
-                temp = self.XYZ.copy()
-                temp[:, 0] -= 1 * (iy + 1)
-                temp[:, 2] -= 1 * (iy + 1)
-                XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                vectors_extended_X = np.append(
-                    vectors_extended_X, vectors[0], axis=0
-                )
-                vectors_extended_Y = np.append(
-                    vectors_extended_Y, vectors[1], axis=0
-                )
-                vectors_extended_Z = np.append(
-                    vectors_extended_Z, vectors[2], axis=0
-                )
-                temp = self.XYZ.copy()
-                temp[:, 1] -= 1 * (iy + 1)
-                temp[:, 2] -= 1 * (iy + 1)
-                XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                vectors_extended_X = np.append(
-                    vectors_extended_X, vectors[0], axis=0
-                )
-                vectors_extended_Y = np.append(
-                    vectors_extended_Y, vectors[1], axis=0
-                )
-                vectors_extended_Z = np.append(
-                    vectors_extended_Z, vectors[2], axis=0
-                )
-
-                temp = self.XYZ.copy()
-                temp[:, 0] -= 1 * (iy + 1)
-                temp[:, 1] -= 1 * (iy + 1)
-                temp[:, 2] -= 1 * (iy + 1)
-                XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                vectors_extended_X = np.append(
-                    vectors_extended_X, vectors[0], axis=0
-                )
-                vectors_extended_Y = np.append(
-                    vectors_extended_Y, vectors[1], axis=0
-                )
-                vectors_extended_Z = np.append(
-                    vectors_extended_Z, vectors[2], axis=0
-                )
-
-        # XYZ_extended = self.XYZ.copy()
-        # scalars_extended = self.spd.copy()
-
-        XYZ_transformed = np.dot(XYZ_extended, self.reciprocal_lattice)
-        # XYZ_transformed = XYZ_extended
-
-        if self.projection_accuracy.lower()[0] == "n":
-
-            vectors_X = interpolate.griddata(
-                XYZ_transformed, vectors_extended_X, self.verts, method="nearest"
-            )
-            vectors_Y = interpolate.griddata(
-                XYZ_transformed, vectors_extended_Y, self.verts, method="nearest"
-            )
-            vectors_Z = interpolate.griddata(
-                XYZ_transformed, vectors_extended_Z, self.verts, method="nearest"
-            )
+    def create_vector_texture(self,vectors):
+        """
+        Projects the vectors at the kpoints to the vertices of the surface.
 
-        elif self.projection_accuracy.lower()[0] == "h":
+        Parameters
+        ----------
+        vectors : (3,n) float
+            The x, y and z components of the vectors at the kpoints.
+        """
+        vectors = np.asarray(vectors)
+        projected = self.projector.project(
+            vectors.T, self.verts, self.projection_accuracy
+        )
+        self.set_vectors(projected[:, 0], projected[:, 1], projected[:, 2])
 
-            vectors_X = interpolate.griddata(
-                XYZ_transformed, vectors_extended_X, self.verts, method="linear"
-            )
-            vectors_Y = interpolate.griddata(
-                XYZ_transformed, vectors_extended_Y, self.verts, method="linear"
-            )
-            vectors_Z = interpolate.griddata(
-                XYZ_transformed, vectors_extended_Z, self.verts, method="linear"
-            )
+    def create_spin_texture(self, vectors=None):
+        """
+        Projects the spin texture to the vertices of the surface, by
+        default the one given by ``spd_spin``.
+        """
+        if vectors is None:
+            vectors = self.spd_spin
+        if vectors is not None:
+            self.create_vector_texture(vectors)
 
-        self.set_vectors(vectors_X, vectors_Y, vectors_Z)
-            
-    def create_spin_texture(self):
-
-        if self.spd_spin is not None:
-            XYZ_extended = self.XYZ.copy()
-            vectors_extended_X = self.spd_spin[0].copy()
-            vectors_extended_Y = self.spd_spin[1].copy()
-            vectors_extended_Z = self.spd_spin[2].copy()
-
-            for ix in range(3):
-                for iy in range(self.supercell[ix]):
-                    temp = self.XYZ.copy()
-                    temp[:, ix] += 1 * (iy + 1)
-                    XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                    vectors_extended_X = np.append(
-                        vectors_extended_X, self.spd_spin[0], axis=0
-                    )
-                    vectors_extended_Y = np.append(
-                        vectors_extended_Y, self.spd_spin[1], axis=0
-                    )
-                    vectors_extended_Z = np.append(
-                        vectors_extended_Z, self.spd_spin[2], axis=0
-                    )
-                    temp = self.XYZ.copy()
-                    temp[:, ix] -= 1 * (iy + 1)
-                    XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                    vectors_extended_X = np.append(
-                        vectors_extended_X, self.spd_spin[0], axis=0
-                    )
-                    vectors_extended_Y = np.append(
-                        vectors_extended_Y, self.spd_spin[1], axis=0
-                    )
-                    vectors_extended_Z = np.append(
-                        vectors_extended_Z, self.spd_spin[2], axis=0
-                    )
-
-            if np.any(self.XYZ >= 0.5): # @logan : I think this should be before the above loop with another else statment
-                for iy in range(self.supercell[ix]):
-                    temp = self.XYZ.copy()
-                    temp[:, 0] -= 1 * (iy + 1)
-                    temp[:, 1] -= 1 * (iy + 1)
-                    XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                    vectors_extended_X = np.append(
-                        vectors_extended_X, self.spd_spin[0], axis=0
-                    )
-                    vectors_extended_Y = np.append(
-                        vectors_extended_Y, self.spd_spin[1], axis=0
-                    )
-                    vectors_extended_Z = np.append(
-                        vectors_extended_Z, self.spd_spin[2], axis=0
-                    )
-                    temp = self.XYZ.copy()
-                    temp[:, 0] -= 1 * (iy + 1)
-                    temp[:, 2] -= 1 * (iy + 1)
-                    XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                    vectors_extended_X = np.append(
-                        vectors_extended_X, self.spd_spin[0], axis=0
-                    )
-                    vectors_extended_Y = np.append(
-                        vectors_extended_Y, self.spd_spin[1], axis=0
-                    )
-                    vectors_extended_Z = np.append(
-                        vectors_extended_Z, self.spd_spin[2], axis=0
-                    )
-                    temp = self.XYZ.copy()
-                    temp[:, 1] -= 1 * (iy + 1)
-                    temp[:, 2] -= 1 * (iy + 1)
-                    XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                    vectors_extended_X = np.append(
-                        vectors_extended_X, self.spd_spin[0], axis=0
-                    )
-                    vectors_extended_Y = np.append(
-                        vectors_extended_Y, self.spd_spin[1], axis=0
-                    )
-                    vectors_extended_Z = np.append(
-                        vectors_extended_Z, self.spd_spin[2], axis=0
-                    )
-
-                    temp = self.XYZ.copy()
-                    temp[:, 0] -= 1 * (iy + 1)
-                    temp[:, 1] -= 1 * (iy + 1)
-                    temp[:, 2] -= 1 * (iy + 1)
-                    XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                    vectors_extended_X = np.append(
-                        vectors_extended_X, self.spd_spin[0], axis=0
-                    )
-                    vectors_extended_Y = np.append(
-                        vectors_extended_Y, self.spd_spin[1], axis=0
-                    )
-                    vectors_extended_Z = np.append(
-                        vectors_extended_Z, self.spd_spin[2], axis=0
-                    )
-
-            # XYZ_extended = self.XYZ.copy()
-            # scalars_extended = self.spd.copy()
-
-            XYZ_transformed = np.dot(XYZ_extended, self.reciprocal_lattice)
-            # XYZ_transformed = XYZ_extended
-
-            if self.projection_accuracy.lower()[0] == "n":
-
-                spin_X = interpolate.griddata(
-                    XYZ_transformed, vectors_extended_X, self.verts, method="nearest"
-                )
-                spin_Y = interpolate.griddata(
-                    XYZ_transformed, vectors_extended_Y, self.verts, method="nearest"
-                )
-                spin_Z = interpolate.griddata(
-                    XYZ_transformed, vectors_extended_Z, self.verts, method="nearest"
-                )
-
-            elif self.projection_accuracy.lower()[0] == "h":
-
-                spin_X = interpolate.griddata(
-                    XYZ_transformed, vectors_extended_X, self.verts, method="linear"
-                )
-                spin_Y = interpolate.griddata(
-                    XYZ_transformed, vectors_extended_Y, self.verts, method="linear"
-                )
-                spin_Z = interpolate.griddata(
-                    XYZ_transformed, vectors_extended_Z, self.verts, method="linear"
-                )
-
-            self.set_vectors(spin_X, spin_Y, spin_Z)
-   
     def project_color(self, cmap, vmin, vmax, scalars ):
         """
         Projects the scalars to the surface.
@@ -413,158 +248,34 @@ class FermiSurfaceBand3D(Isosurface):
         -------
         None.
         """
-
-        XYZ_extended = self.XYZ.copy()
-        scalars_extended =  scalars.copy()
-
-
-        for ix in range(3):
-            for iy in range(self.supercell[ix]):
-                temp = self.XYZ.copy()
-                temp[:, ix] += 1 * (iy + 1)
-                XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                scalars_extended = np.append(scalars_extended,  scalars, axis=0)
-                temp = self.XYZ.copy()
-                temp[:, ix] -= 1 * (iy + 1)
-                XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                scalars_extended = np.append(scalars_extended,  scalars, axis=0)
-        if np.any(self.XYZ >= 0.5): # @logan same here
-            for iy in range(self.supercell[ix]):
-                temp = self.XYZ.copy()
-                temp[:, 0] -= 1 * (iy + 1)
-                temp[:, 1] -= 1 * (iy + 1)
-                XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                scalars_extended = np.append(scalars_extended,  scalars, axis=0)
-                temp = self.XYZ.copy()
-                temp[:, 0] -= 1 * (iy + 1)
-                temp[:, 2] -= 1 * (iy + 1)
-                XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                scalars_extended = np.append(scalars_extended,  scalars, axis=0)
-                temp = self.XYZ.copy()
-                temp[:, 1] -= 1 * (iy + 1)
-                temp[:, 2] -= 1 * (iy + 1)
-                XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                scalars_extended = np.append(scalars_extended,  scalars, axis=0)
-
-                temp = self.XYZ.copy()
-                temp[:, 0] -= 1 * (iy + 1)
-                temp[:, 1] -= 1 * (iy + 1)
-                temp[:, 2] -= 1 * (iy + 1)
-                XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                scalars_extended = np.append(scalars_extended,  scalars, axis=0)
-
-        XYZ_transformed = np.dot(XYZ_extended, self.reciprocal_lattice)
-
-
-        # XYZ_transformed = XYZ_extended
-
-        if self.projection_accuracy.lower()[0] == "n":
-            colors = interpolate.griddata(
-                XYZ_transformed, scalars_extended, self.centers, method="nearest"
-            )
-        elif self.projection_accuracy.lower()[0] == "h":
-            colors = interpolate.griddata(
-                XYZ_transformed, scalars_extended, self.centers, method="linear"
-            )
+        colors = self.projector.project(
+            scalars, self.centers, self.projection_accuracy
+        )
 
         self.set_scalars(colors)
         self.set_color_with_cmap(cmap, vmin, vmax)
               
     def calculate_first_and_second_derivative_energy(self):
-        def get_energy(kp_reduced):
-            return kp_reduced_to_energy[f'({kp_reduced[0]},{kp_reduced[1]},{kp_reduced[2]})']
-        def get_cartesian_kp(kp_reduced):
-            return kp_reduced_to_kp_cart[f'({kp_reduced[0]},{kp_reduced[1]},{kp_reduced[2]})']
-        def energy_meshgrid_mapping(mesh_list):
-            import copy 
-            mesh_list_cart = copy.deepcopy(mesh_list)
-            F = np.zeros(shape = mesh_list[0].shape)
-            for k in range(mesh_list[0].shape[2]):
-                for j in range(mesh_list[0].shape[1]):
-                    for i in range(mesh_list[0].shape[0]):
-                        kx = mesh_list[0][i,j,k]
-                        ky = mesh_list[1][i,j,k]
-                        kz = mesh_list[2][i,j,k]
-        
-                        mesh_list_cart[0][i,j,k] = get_cartesian_kp([kx,ky,kz])[0]
-                        mesh_list_cart[1][i,j,k] = get_cartesian_kp([kx,ky,kz])[1]
-                        mesh_list_cart[2][i,j,k] = get_cartesian_kp([kx,ky,kz])[2]
-                        F[i,j,k] = get_energy([kx,ky,kz])
-        
-            return F
-        def fermi_velocity_meshgrid_mapping(mesh_list):
-            X = np.zeros(shape = mesh_list[0].shape)
-            Y = np.zeros(shape = mesh_list[0].shape)
-            Z = np.zeros(shape = mesh_list[0].shape)
-            for k in range(mesh_list[0].shape[2]):
-                for j in range(mesh_list[0].shape[1]):
-                    for i in range(mesh_list[0].shape[0]):
-                        kx = mesh_list[0][i,j,k]
-                        ky = mesh_list[1][i,j,k]
-                        kz = mesh_list[2][i,j,k]
-                        
-                        X[i,j,k] = get_gradient([kx,ky,kz])[0]
-                        Y[i,j,k] = get_gradient([kx,ky,kz])[1]
-                        Z[i,j,k] = get_gradient([kx,ky,kz])[2]
-        
-            return X,Y,Z
-        
-        kpoints_cart = np.matmul(self.XYZ,  self.reciprocal_lattice)
-        
-        mesh_list = np.meshgrid(np.unique(self.XYZ[:,0]),
-                                np.unique(self.XYZ[:,1]),
-                                np.unique(self.XYZ[:,2]), indexing = 'ij')
-        
-        
-        kp_reduced_to_energy = {f'({key[0]},{key[1]},{key[2]})':value for (key,value) in zip(self.XYZ,self.band)}
-        kp_reduced_to_kp_cart = {f'({key[0]},{key[1]},{key[2]})':value for (key,value) in zip(self.XYZ,kpoints_cart)}
-        kp_reduced_to_mesh_index = {f'({kp[0]},{kp[1]},{kp[2]})': np.argwhere((mesh_list[0]==kp[0]) & 
-                                                                              (mesh_list[1]==kp[1]) & 
-                                                                              (mesh_list[2]==kp[2]) )[0] for kp in self.XYZ}
-        
-        
-        energy_meshgrid = energy_meshgrid_mapping(mesh_list) 
-
-        change_in_energy = np.gradient(energy_meshgrid)
-
-        grad_x_list = [change_in_energy[0][kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][0],
-                  kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][1],
-                  kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][2]
-                  ]
-                  for kp in self.XYZ]
-        grad_y_list = [change_in_energy[1][kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][0],
-                              kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][1],
-                              kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][2]
-                              ]
-                  for kp in self.XYZ]
-        grad_z_list = [change_in_energy[2][kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][0],
-                              kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][1],
-                              kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][2]
-                              ]
-                  for kp in self.XYZ]
-        
-        gradient_list = np.array([grad_x_list,grad_y_list,grad_z_list]).T
+        """
+        Calculates the group velocity at every k-point and, if
+        `effective_mass` is set, the effective mass tensor and the
+        harmonic mean of its diagonal.
 
-        lattice = np.linalg.inv(self.reciprocal_lattice.T).T
+        The derivatives are spectral (see `pyprocar.utils.spectral`) and
+        are taken from `derivatives` when they were already computed for
+        all the bands.
+        """
+        if self.derivatives is None:
+            self.derivatives = BandDerivatives(
+                self.kpoints, self.band, self.reciprocal_lattice
+            )
+            self.derivatives_index = 0
+        iband = self.derivatives_index
 
-      
-        gradient_list = gradient_list/(2*math.pi)
-        gradient_list = np.multiply(gradient_list, np.array([np.linalg.norm(lattice[:,0])*METER_ANGSTROM * len(np.unique(self.XYZ[:,0])),
-                                                             np.linalg.norm(lattice[:,1])*METER_ANGSTROM * len(np.unique(self.XYZ[:,1])),
-                                                             np.linalg.norm(lattice[:,2])*METER_ANGSTROM * len(np.unique(self.XYZ[:,2]))])
-                            )
-        
-        gradient_list_cart = np.array([np.matmul(lattice, gradient) for gradient in gradient_list])
-        
- 
-        
-        # kp_reduced_to_grad_x = {f'({key[0]},{key[1]},{key[2]})':value for (key,value) in zip(self.XYZ,grad_x_list)}
-        # kp_reduced_to_grad_y = {f'({key[0]},{key[1]},{key[2]})':value for (key,value) in zip(self.XYZ,grad_y_list)}
-        # kp_reduced_to_grad_z = {f'({key[0]},{key[1]},{key[2]})':value for (key,value) in zip(self.XYZ,grad_z_list)}
-        
-        self.group_velocity_x = gradient_list_cart[:,0]/HBAR_EV
-        self.group_velocity_y = gradient_list_cart[:,1]/HBAR_EV
-        self.group_velocity_z = gradient_list_cart[:,2]/HBAR_EV
+        velocity = self.derivatives.velocity[iband]
+        self.group_velocity_x = velocity[:, 0]
+        self.group_velocity_y = velocity[:, 1]
+        self.group_velocity_z = velocity[:, 2]
         
         self.group_velocity_vector = [self.group_velocity_x,self.group_velocity_y,self.group_velocity_z]
         
@@ -573,83 +284,11 @@ class FermiSurfaceBand3D(Isosurface):
                                          self.group_velocity_z**2)**0.5
         
         if self.effective_mass == True:
-            kp_reduced_to_gradient = {f'({key[0]},{key[1]},{key[2]})':value for (key,value) in zip(self.XYZ,gradient_list_cart)}
-            def get_gradient(kp_reduced):
-                return kp_reduced_to_gradient[f'({kp_reduced[0]},{kp_reduced[1]},{kp_reduced[2]})']
-            
-            gradient_mesh = list(fermi_velocity_meshgrid_mapping(mesh_list))
-            change_in_energy_gradient = list(map(np.gradient,gradient_mesh))
-            
-            
-            
-            grad_xx_list = [change_in_energy_gradient[0][0][kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][0],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][1],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][2]
-                                                            ]
-                            for kp in self.XYZ]
-            grad_xy_list = [change_in_energy_gradient[0][1][kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][0],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][1],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][2]
-                                                            ]
-                            for kp in self.XYZ]
-            grad_xz_list = [change_in_energy_gradient[0][2][kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][0],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][1],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][2]
-                                                            ]
-                            for kp in self.XYZ]
-            
-            grad_yx_list = [change_in_energy_gradient[1][0][kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][0],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][1],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][2]
-                                                            ]
-                            for kp in self.XYZ]
-            grad_yy_list = [change_in_energy_gradient[1][1][kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][0],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][1],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][2]
-                                                            ]
-                            for kp in self.XYZ]
-            grad_yz_list = [change_in_energy_gradient[1][2][kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][0],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][1],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][2]
-                                                            ]
-                            for kp in self.XYZ]
-            
-            grad_zx_list = [change_in_energy_gradient[2][0][kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][0],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][1],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][2]
-                                                            ]
-                            for kp in self.XYZ]
-            grad_zy_list = [change_in_energy_gradient[2][1][kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][0],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][1],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][2]
-                                                            ]
-                            for kp in self.XYZ]
-            grad_zz_list = [change_in_energy_gradient[2][2][kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][0],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][1],
-                                                            kp_reduced_to_mesh_index[f'({kp[0]},{kp[1]},{kp[2]})'][2]
-                                                            ]
-                            for kp in self.XYZ]
-            
-            energy_second_derivative_list = np.array([[grad_xx_list,grad_xy_list,grad_xz_list],
-                                             [grad_yx_list,grad_yy_list,grad_yz_list],
-                                             [grad_zx_list,grad_zy_list,grad_zz_list],
-                                             ])
-            
-            energy_second_derivative_list = np.swapaxes(energy_second_derivative_list,axis1=0,axis2=2)
-            energy_second_derivative_list = np.swapaxes(energy_second_derivative_list,axis1=1,axis2=2)
-            energy_second_derivative_list = energy_second_derivative_list/(2*math.pi)
-            energy_second_derivative_list = np.multiply(energy_second_derivative_list, np.array([np.linalg.norm(lattice[:,0])*METER_ANGSTROM * len(np.unique(self.XYZ[:,0])),
-                                                                                                           np.linalg.norm(lattice[:,1])*METER_ANGSTROM * len(np.unique(self.XYZ[:,1])),
-                                                                                                           np.linalg.norm(lattice[:,2])*METER_ANGSTROM * len(np.unique(self.XYZ[:,2]))])
-                                                        )
-            self.energy_second_derivative_list_cart = energy_second_derivative_list_cart = np.array([ [ np.matmul(lattice,gradient) for gradient in gradient_tensor ] for gradient_tensor in energy_second_derivative_list ])
-            
+            self.energy_second_derivative_list_cart = self.derivatives.hessian[iband]
             self.inverse_effective_mass_tensor_list = self.energy_second_derivative_list_cart * EV_TO_J/ HBAR_J**2
-            self.effective_mass_tensor_list = effective_mass_tensor_list = np.array([ np.linalg.inv(inverse_effective_mass_tensor) for inverse_effective_mass_tensor in self.inverse_effective_mass_tensor_list])
-            self.effective_mass_list = np.array([ (3*(1/effective_mass_tensor_list[ikp,0,0] + 
-                                                      1/effective_mass_tensor_list[ikp,1,1] +
-                                                      1/effective_mass_tensor_list[ikp,2,2])**-1)/FREE_ELECTRON_MASS for ikp in range(len(self.XYZ))])
-            
+            self.effective_mass_tensor_list = self.derivatives.effective_mass_tensor[iband]
+            self.effective_mass_list = self.derivatives.effective_mass[iband]
+
     def _get_brilloin_zone(self, supercell):
         return BrillouinZone(self.reciprocal_lattice, supercell)
 
@@ -661,6 +300,7 @@ class FermiSurface3D:
         kpoints=None,
         bands=None,
         band_numbers=None,
+        band_labels=None,
         spd=None,
         spd_spin=None,
         fermi_velocity = False,
@@ -679,6 +319,11 @@ class FermiSurface3D:
         vmin=0,
         vmax=1,
         supercell=[1, 1, 1],
+        nthreads=1,
+        matrix_cache=None,
+        projector=None,
+        band_matrices=None,
+        band_derivatives=None,
     ):
         """
 
@@ -694,6 +339,14 @@ class FermiSurface3D:
             An array of energies cooresponding to the
             kpoints and bands.
 
+        band_numbers : list int
+            Columns of ``bands`` of which the surfaces are extracted.
+
+        band_labels : list int, optional
+            Numbers shown for the bands in ``band_numbers``, e.g. the
+            bands requested from a PROCAR read with only those bands.
+            The default is None, ``band_numbers`` are shown.
+
         spd :
             numpy array containing the information about ptojection of atoms,
             orbitals and spin on each band (check procarparser)
@@ -735,12 +388,38 @@ class FermiSurface3D:
         vmax : TYPE, float
             DESCRIPTION. The default is 1.
 
+        nthreads : int
+            The default is 1. Number of threads used to extract the
+            isosurfaces of the different bands at the same time.
+
+        matrix_cache : dict
+            The default is None. Band number to the ``matrix_cache`` of the
+            surface of that band, to reuse the padded and interpolated
+            grids between surfaces at different energies.
+
+        projector : PeriodicProjector
+            The default is None. Projector of the kpoints to the surfaces,
+            created here when not given.
+
+        band_matrices : (nx,ny,nz,nband) float
+            The default is None. The bands in ``band_numbers`` mapped on
+            the grid of the kpoints (see ``map2matrix``), mapped here when
+            not given.
+
+        band_derivatives : BandDerivatives
+            The default is None. Derivatives of the bands in
+            ``band_numbers``, computed here when they are needed and not
+            given.
+
         """
 
         self.kpoints = kpoints
         self.bands = bands
 
         self.band_numbers = band_numbers
+        if band_labels is None:
+            band_labels = band_numbers
+        self.band_labels = band_labels
         self.spd = spd
         self.reciprocal_lattice = reciprocal_lattice
         self.supercell = np.array(supercell)
@@ -769,33 +448,75 @@ class FermiSurface3D:
 
         self.fermi_surface_curvature = None
 
-        counter = 0
-        for iband in self.band_numbers:
-            print("Trying to extract isosurface for band %d" % iband)
+        # the derivatives of all the bands are computed at once and shared
+        # by the surfaces
+        self.band_derivatives = band_derivatives
+        if self.band_derivatives is None and (
+            self.fermi_velocity or self.fermi_velocity_vector or self.effective_mass
+        ):
+            self.band_derivatives = BandDerivatives(
+                self.kpoints, self.bands[:, self.band_numbers], self.reciprocal_lattice
+            )
+
+        # one projector (and KD-tree) for the kpoints, shared by the bands
+        if projector is None:
+            projector = PeriodicProjector(self.kpoints, self.reciprocal_lattice)
+        self.projector = projector
+
+        # all the bands are mapped to the grid at once, and the ones that
+        # do not cross the isovalue are skipped before any marching cubes
+        isovalue = self.fermi + self.fermi_shift
+        if band_matrices is None:
+            band_matrices = map2matrix(
+                np.array(self.kpoints), self.bands[:, self.band_numbers]
+            )
+        crossing = crossing_bands(band_matrices, isovalue)
 
-            surface = FermiSurfaceBand3D(
+        def extract_surface(counter):
+            iband = self.band_numbers[counter]
+            print(
+                "Trying to extract isosurface for band %d" % self.band_labels[counter]
+            )
+            if not crossing[counter]:
+                print("No isosurface for this band")
+                return None
+            return FermiSurfaceBand3D(
                 kpoints=self.kpoints,
                 band=self.bands[:, iband],
+                band_matrix=band_matrices[..., counter],
                 spd=self.spd[counter],
                 fermi_velocity = self.fermi_velocity,
                 fermi_velocity_vector=self.fermi_velocity_vector,
                 effective_mass = self.effective_mass,
                 spd_spin=self.spd_spin[counter],
-                fermi=self.fermi + self.fermi_shift,
+                fermi=isovalue,
                 reciprocal_lattice=self.reciprocal_lattice,
                 interpolation_factor=self.interpolation_factor,
                 projection_accuracy=self.projection_accuracy,
                 supercell=self.supercell,
+                derivatives=self.band_derivatives,
+                derivatives_index=counter,
+                projector=self.projector,
+                matrix_cache=(
+                    None if matrix_cache is None else matrix_cache.setdefault(iband, {})
+                ),
             )
 
+        counters = range(len(self.band_numbers))
+        if nthreads > 1:
+            with ThreadPoolExecutor(max_workers=nthreads) as executor:
+                surfaces = list(executor.map(extract_surface, counters))
+        else:
+            surfaces = [extract_surface(counter) for counter in counters]
+
+        for surface in surfaces:
             # if surface.verts is not None:
             #     self.band_surfaces.append(surface)
-            if surface.verts is not None:
+            if surface is not None and surface.verts is not None:
                 self.band_surfaces_obj.append(surface)
                 self.band_surfaces_area.append(surface.pyvista_obj.area)
                 self.band_surfaces.append(surface.pyvista_obj)
                 self.band_surfaces_curvature.append(surface.pyvista_obj.curvature(curv_type=curvature_type))
-            counter += 1
 
         nsurface = len(self.band_surfaces)
         norm = mpcolors.Normalize(vmin=vmin, vmax=vmax)
@@ -836,6 +557,7 @@ class FermiSurface3D:
     def _get_brilloin_zone(self, supercell):
         return BrillouinZone(self.reciprocal_lattice, supercell)
 
+
     # def ibz2fbz(self):
     #     """
     #     Converts the irreducible Brilluoin zone to the full Brillouin zone.
@@ -870,3 +592,78 @@ class FermiSurface3D:
     #     self.kpoints = np.array(klist)
     #     self.band = np.array(bandlist)
     #     self.spd = np.array(spdlist)
+
+
+class FermiSurfaceSweep:
+    def __init__(self, nthreads=1, **kwargs):
+        """
+        Fermi surfaces of the same bands at many energies, e.g. for an
+        energy slider. The grids of the bands are padded and interpolated
+        only once, every energy then only needs the marching cubes and the
+        clipping. The surfaces are kept, so asking again for an energy
+        returns the same FermiSurface3D at no cost.
+
+        Parameters
+        ----------
+        nthreads : int
+            The default is 1. Number of energies computed at the same time
+            by ``sweep``.
+        **kwargs :
+            Arguments of ``FermiSurface3D`` other than ``fermi``.
+
+        """
+        self.nthreads = nthreads
+        self.kwargs = kwargs
+        self.matrix_cache = {}
+        self.projector = PeriodicProjector(
+            kwargs["kpoints"], kwargs["reciprocal_lattice"]
+        )
+        # the grids and the derivatives of the bands do not depend on the
+        # energy, they are computed once for all the surfaces
+        bands = kwargs["bands"][:, kwargs["band_numbers"]]
+        self.band_matrices = map2matrix(np.array(kwargs["kpoints"]), bands)
+        self.band_derivatives = None
+        if (
+            kwargs.get("fermi_velocity", False)
+            or kwargs.get("fermi_velocity_vector", False)
+            or kwargs.get("effective_mass", False)
+        ):
+            self.band_derivatives = BandDerivatives(
+                kwargs["kpoints"], bands, kwargs["reciprocal_lattice"]
+            )
+        self.surfaces = {}
+
+    def __getitem__(self, energy):
+        """
+        FermiSurface3D at an energy, computed if it is not cached.
+        """
+        if energy not in self.surfaces:
+            self.surfaces[energy] = FermiSurface3D(
+                fermi=energy,
+                matrix_cache=self.matrix_cache,
+                projector=self.projector,
+                band_matrices=self.band_matrices,
+                band_derivatives=self.band_derivatives,
+                **self.kwargs
+            )
+        return self.surfaces[energy]
+
+    def sweep(self, energies):
+        """
+        FermiSurface3D at each energy, the ones not cached yet are computed
+        in ``nthreads`` threads.
+
+        Returns
+        -------
+        list of FermiSurface3D
+        """
+        missing = [energy for energy in energies if energy not in self.surfaces]
+        if self.nthreads > 1 and len(missing) > 1:
+            # the first energy fills the grid cache the others share
+            self[missing[0]]
+            with ThreadPoolExecutor(max_workers=self.nthreads) as executor:
+                list(executor.map(self.__getitem__, missing[1:]))
+        else:
+            for energy in missing:
+                self[energy]
+        return [self[energy] for energy in energies]
@@ -0,0 +1,159 @@
+"""
+Projection of quantities known at the k-points onto Fermi surfaces.
+
+The k-points form a regular mesh of the Brillouin zone, so the periodic
+images of a k-point are found with modular arithmetic in reduced
+coordinates instead of copying the mesh to the neighbouring zones. A
+PeriodicProjector is built once per k-mesh and reused for every band and
+every projected quantity (projections, spin texture, velocities, ...).
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class PeriodicProjector:
+    """
+    Projects values given at the kpoints onto arbitrary cartesian points,
+    taking into account the periodic images of the kpoints.
+
+    The nearest kpoint is found with a KD-tree on the periodic cell, the
+    reduced coordinates being scaled by the length of the reciprocal
+    lattice vectors. For orthogonal lattices this is the cartesian
+    distance, for the others the ``candidates`` closest kpoints in the
+    tree are compared with their cartesian distance. The linear
+    interpolation is trilinear on the periodic mesh.
+
+    Parameters
+    ----------
+    kpoints : (n,3) float
+        The kpoints of a full regular mesh of the Brillouin zone, in
+        reduced coordinates and in any order.
+    reciprocal_lattice : (3,3) float
+        Reciprocal lattice used to go from cartesian to reduced
+        coordinates.
+    candidates : int, optional
+        The default is 12. Number of kpoints compared for the nearest
+        kpoint of non orthogonal lattices.
+
+    Example
+    -------
+    >>> projector = PeriodicProjector(kpoints, reciprocal_lattice)
+    >>> colors = projector.project(scalars, surface.centers)
+    """
+
+    def __init__(self, kpoints, reciprocal_lattice, candidates=12):
+        self.kpoints = np.asarray(kpoints, dtype=float)
+        self.reciprocal_lattice = np.asarray(reciprocal_lattice, dtype=float)
+        axes = [np.unique(self.kpoints[:, i], return_inverse=True) for i in range(3)]
+        self.origin = np.array([values[0] for values, _ in axes])
+        self.shape = tuple(len(values) for values, _ in axes)
+        self.mesh_index = tuple(index.ravel() for _, index in axes)
+        self.lengths = np.linalg.norm(self.reciprocal_lattice, axis=1)
+        metric = np.dot(self.reciprocal_lattice, self.reciprocal_lattice.T)
+        self.orthogonal = np.allclose(metric, np.diag(np.diag(metric)))
+        self.candidates = candidates
+        self._tree = None
+
+    @property
+    def tree(self):
+        """
+        KD-tree of the kpoints on the periodic cell, built when first
+        needed
+        """
+        if self._tree is None:
+            self._tree = cKDTree(
+                self._wrap(self.kpoints), boxsize=self.lengths
+            )
+        return self._tree
+
+    def _wrap(self, reduced):
+        """
+        Reduced coordinates to the scaled coordinates inside the periodic
+        cell used by the KD-tree
+        """
+        wrapped = np.mod(reduced * self.lengths, self.lengths)
+        # np.mod of tiny negative numbers rounds to the box size
+        wrapped[wrapped >= self.lengths] = 0
+        return wrapped
+
+    def reduced(self, points):
+        """
+        Cartesian points to reduced coordinates
+        """
+        return np.dot(points, np.linalg.inv(self.reciprocal_lattice))
+
+    def nearest(self, values, points):
+        """
+        Value of the nearest kpoint (considering all the periodic images)
+        at each of the cartesian points.
+
+        Parameters
+        ----------
+        values : (n,...) float
+            Values at the kpoints.
+        points : (m,3) float
+
+        Returns
+        -------
+        (m,...) float
+        """
+        reduced = self.reduced(points)
+        if self.orthogonal:
+            _, index = self.tree.query(self._wrap(reduced))
+            return np.asarray(values)[index]
+
+        # small meshes have fewer kpoints than candidates
+        candidates = min(self.candidates, len(self.kpoints))
+        _, index = self.tree.query(self._wrap(reduced), k=candidates)
+        index = index.reshape(len(reduced), candidates)
+        # closest periodic image of every candidate, in cartesian coordinates
+        displacement = self.kpoints[index] - reduced[:, None, :]
+        displacement -= np.round(displacement)
+        distance = np.linalg.norm(
+            np.dot(displacement, self.reciprocal_lattice), axis=2
+        )
+        index = index[np.arange(len(index)), np.argmin(distance, axis=1)]
+        return np.asarray(values)[index]
+
+    def linear(self, values, points):
+        """
+        Trilinear interpolation of the values on the periodic mesh at each
+        of the cartesian points.
+
+        Parameters
+        ----------
+        values : (n,...) float
+            Values at the kpoints.
+        points : (m,3) float
+
+        Returns
+        -------
+        (m,...) float
+        """
+        values = np.asarray(values)
+        grid = np.zeros(self.shape + values.shape[1:], dtype=values.dtype)
+        grid[self.mesh_index] = values
+
+        position = (self.reduced(points) - self.origin) * self.shape
+        lower = np.floor(position).astype(int)
+        weight = position - lower
+        shape = np.array(self.shape)
+        result = 0
+        for corner in np.ndindex(2, 2, 2):
+            index = np.mod(lower + corner, shape)
+            corner_weight = np.prod(
+                np.where(corner, weight, 1 - weight), axis=1
+            ).reshape((-1,) + (1,) * (values.ndim - 1))
+            result = result + corner_weight * grid[index[:, 0], index[:, 1], index[:, 2]]
+        return result
+
+    def project(self, values, points, projection_accuracy="Normal"):
+        """
+        Projects the values at the kpoints to the cartesian points,
+        ``projection_accuracy`` 'High' interpolates linearly, otherwise the
+        value of the nearest kpoint is used.
+        """
+        if projection_accuracy.lower()[0] == "h":
+            return self.linear(values, points)
+        return self.nearest(values, points)
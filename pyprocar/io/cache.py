@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Binary on-disk cache of parsed data.
+
+Parsing a large PROCAR or vasprun.xml from text can take minutes, while
+the same calculation is usually plotted many times. The parsed arrays are
+stored in a `.npz` file next to the input (`PROCAR` ->
+`PROCAR.procar.cache.npz`) together with a signature of the input file.
+The cache is invalidated as soon as the input changes (size, modification
+time or content of its first and last megabyte).
+
+Writing the cache is best effort: if the directory is not writable the
+data is simply not cached.
+
+Only plain arrays (numbers, booleans and strings) are stored and the
+files are loaded with `allow_pickle=False`, so a cache file dropped next
+to an input can not run code. Parsed trees (dictionaries and lists) are
+stored with `pack_tree`.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Bump this number whenever the layout of the cached data changes
+CACHE_VERSION = 3
+
+# Bytes of the head and tail of the input used for the content signature
+_SAMPLE_SIZE = 1 << 20
+
+# Marker of the arrays in the JSON skeleton of a packed tree
+_ARRAY = "__array__"
+
+
+def cache_filename(filename, kind):
+    """Name of the cache file of `filename`. `kind` tells apart the data
+    of the different parsers (e.g. 'procar', 'vasprun')"""
+    return "{}.{}.cache.npz".format(filename, kind)
+
+
+def file_signature(filename):
+    """Returns a hash of the size, modification time and a sample of the
+    content of a file. Hashing the whole file would defeat the purpose of
+    the cache for multi-GB files."""
+    stat = os.stat(filename)
+    signature = hashlib.sha1()
+    signature.update(
+        "{} {} {}".format(CACHE_VERSION, stat.st_size, stat.st_mtime_ns).encode()
+    )
+    with open(filename, "rb") as rf:
+        signature.update(rf.read(_SAMPLE_SIZE))
+        if stat.st_size > 2 * _SAMPLE_SIZE:
+            rf.seek(-_SAMPLE_SIZE, os.SEEK_END)
+            signature.update(rf.read(_SAMPLE_SIZE))
+    return signature.hexdigest()
+
+
+def load_cache(filename, kind):
+    """Loads the cached data of `filename`.
+
+    Returns:
+        a dictionary with the cached arrays, or None if there is no valid
+        cache for the current version of the file.
+    """
+    path = cache_filename(filename, kind)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["signature"]) != file_signature(filename):
+                return None
+            return {key: data[key] for key in data.files if key != "signature"}
+    except (OSError, ValueError, KeyError, EOFError):
+        return None
+
+
+def save_cache(filename, kind, arrays):
+    """Stores a dictionary of arrays as the cache of `filename`. Nothing
+    is stored if an array would need pickling (object arrays)."""
+    arrays = {key: np.asarray(value) for key, value in arrays.items()}
+    if any(value.dtype.hasobject for value in arrays.values()):
+        return
+    path = cache_filename(filename, kind)
+    # written under a temporary name first, so an interrupted run never
+    # leaves a truncated cache behind
+    tmp_path = path + ".tmp.npz"
+    try:
+        np.savez(tmp_path, signature=file_signature(filename), **arrays)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+    return
+
+
+def pack_tree(tree, prefix="tree"):
+    """Converts a parsed tree (dictionaries, lists, strings, numbers and
+    arrays) into a flat dictionary of plain arrays for `save_cache`.
+
+    The arrays and the rectangular numeric nested lists of the tree are
+    stored as raw binary data under the key `prefix` + their path in the
+    tree (e.g. 'tree/general/dos/total/array/data'). The rest of the tree
+    is stored as a JSON string under `prefix`. `unpack_tree` reverses it.
+    """
+    arrays = {}
+
+    def encode(node, path):
+        if isinstance(node, dict):
+            return {
+                key: encode(value, path + "/" + str(key)) for key, value in node.items()
+            }
+        if isinstance(node, (list, tuple)):
+            try:
+                array = np.asarray(node)
+                if array.dtype.kind in "fi" and array.ndim >= 2:
+                    node = array
+            except ValueError:
+                pass
+        if isinstance(node, np.ndarray):
+            if node.dtype.kind in "biufcU":
+                arrays[path] = node
+                return {_ARRAY: path}
+            node = node.tolist()
+        if isinstance(node, (list, tuple)):
+            return [encode(x, path + "/" + str(i)) for i, x in enumerate(node)]
+        if isinstance(node, np.generic):
+            return node.item()
+        return node
+
+    arrays[prefix] = np.array(json.dumps(encode(tree, prefix)))
+    return arrays
+
+
+def unpack_tree(arrays, prefix="tree"):
+    """Rebuilds the tree stored by `pack_tree` from the cached arrays"""
+
+    def decode(node):
+        if isinstance(node, dict):
+            if list(node) == [_ARRAY]:
+                return arrays[node[_ARRAY]]
+            return {key: decode(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [decode(x) for x in node]
+        return node
+
+    return decode(json.loads(str(arrays[prefix])))
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Random access to the k-points and bands of a PROCAR.
+
+The byte offset of every `k-point` and `band` header of the file is
+found once with a regular expression over the memory-mapped file and
+stored next to it (`PROCAR.index.cache.npz`, see `pyprocar.io.cache`).
+With the index, only the blocks of the requested bands and k-points are
+read from the map and parsed, which is what Fermi surfaces and band
+selections need from multi-GB PROCARs.
+
+Only plain (not gzipped) files can be indexed.
+"""
+
+import mmap
+import re
+
+import numpy as np
+
+from .cache import load_cache, save_cache
+from .procar_reader import ProcarReader
+
+# Start of the k-point headers, band headers and spin blocks
+_HEADER = re.compile(rb"^[ \t]*(k-point|band|# of k-points)[ \t:]", re.M)
+_META = re.compile(r"#[^:]+:([^#]+)")
+
+
+class ProcarIndex:
+    """Byte-offset index of a PROCAR.
+
+    Members:
+
+    kpoint_offsets : (nsets, nkpoints) offset of each k-point header
+    band_offsets   : (nsets, nkpoints, nbands) offset of each band header
+    band_ends      : (nsets, nkpoints, nbands) offset where the block of
+                     each band (projections and phases) ends
+
+    Args:
+        filename: path of an uncompressed PROCAR
+        cache: reuse the index stored next to the file if it is up to
+          date, otherwise build it and store it.
+
+    Example:
+    >>> index = ProcarIndex("PROCAR")
+    >>> reader = index.read(bands=[14, 15, 16])
+    """
+
+    def __init__(self, filename, cache=True):
+        if filename[-2:] == "gz":
+            raise ValueError("Gzipped PROCARs can not be indexed")
+        self.filename = filename
+        arrays = load_cache(filename, "index") if cache else None
+        if arrays is None:
+            arrays = self._build()
+            if cache:
+                save_cache(filename, "index", arrays)
+        self.title = str(arrays["title"])
+        self.meta_line = str(arrays["meta_line"])
+        self.kpoint_offsets = arrays["kpoint_offsets"]
+        self.band_offsets = arrays["band_offsets"]
+        self.band_ends = arrays["band_ends"]
+        self.kpointsCount, self.bandsCount, self.ionsNumber = map(
+            int, _META.findall(self.meta_line)
+        )
+
+    @property
+    def nsets(self):
+        """Number of spin blocks of the file"""
+        return self.kpoint_offsets.shape[0]
+
+    def _open(self):
+        with open(self.filename, "rb") as rf:
+            return mmap.mmap(rf.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def _line(mm, offset):
+        end = mm.find(b"\n", offset)
+        if end == -1:
+            end = len(mm)
+        return mm[offset:end].decode() + "\n"
+
+    def _build(self):
+        mm = self._open()
+        try:
+            title = self._line(mm, 0)
+            kinds = []
+            offsets = []
+            for match in _HEADER.finditer(mm):
+                kinds.append(match.group(1)[:1])
+                offsets.append(match.start())
+            offsets.append(len(mm))
+            if not kinds or kinds[0] != b"#":
+                raise RuntimeError("Incompatible file.")
+            meta_line = self._line(mm, offsets[0])
+        finally:
+            mm.close()
+
+        nk, nb = list(map(int, _META.findall(meta_line)))[:2]
+        nsets = kinds.count(b"#")
+        kpoint_offsets = np.zeros(shape=(nsets, nk), dtype=np.int64)
+        band_offsets = np.zeros(shape=(nsets, nk, nb), dtype=np.int64)
+        band_ends = np.zeros(shape=(nsets, nk, nb), dtype=np.int64)
+        iset = ik = ib = -1
+        try:
+            for i, kind in enumerate(kinds):
+                if kind == b"#":
+                    iset += 1
+                    ik = -1
+                elif kind == b"k":
+                    ik += 1
+                    ib = -1
+                    kpoint_offsets[iset, ik] = offsets[i]
+                else:
+                    ib += 1
+                    band_offsets[iset, ik, ib] = offsets[i]
+                    band_ends[iset, ik, ib] = offsets[i + 1]
+        except IndexError:
+            raise RuntimeError(
+                "Kpoints number do not match with metadata (header of PROCAR)"
+            )
+        if ik + 1 != nk or ib + 1 != nb:
+            raise RuntimeError("Incompatible file.")
+        return {
+            "title": np.array(title),
+            "meta_line": np.array(meta_line),
+            "kpoint_offsets": kpoint_offsets,
+            "band_offsets": band_offsets,
+            "band_ends": band_ends,
+        }
+
+    def _lines(self, mm, kpoints, bands):
+        """Lines of a PROCAR holding only the selected k-points and bands"""
+        yield self.title
+        meta_line = "# of k-points:  {}         # of bands:  {}         # of ions:  {}\n"
+        for iset in range(self.nsets):
+            yield meta_line.format(len(kpoints), len(bands), self.ionsNumber)
+            for ik in kpoints:
+                yield self._line(mm, self.kpoint_offsets[iset, ik])
+                for ib in bands:
+                    start = self.band_offsets[iset, ik, ib]
+                    end = self.band_ends[iset, ik, ib]
+                    for line in mm[start:end].decode().splitlines(True):
+                        yield line
+
+    def read(self, bands=None, kpoints=None, atoms=None, repair=False):
+        """Parses only a selection of the PROCAR.
+
+        Args:
+            bands: indices (0-based) of the bands to read, for each spin
+              block. Default all.
+            kpoints: indices (0-based) of the k-points to read. Default all.
+            atoms: indices of the rows of the projections to keep, the
+              last one is `tot` (see `ProcarReader.ionsCount`). Default all.
+            repair: see `ProcarReader`
+
+        Returns:
+            ProcarReader, with the selection in the order requested.
+        """
+        if bands is None:
+            bands = range(self.bandsCount)
+        if kpoints is None:
+            kpoints = range(self.kpointsCount)
+        bands = np.atleast_1d(np.arange(self.bandsCount)[bands])
+        kpoints = np.atleast_1d(np.arange(self.kpointsCount)[kpoints])
+
+        mm = self._open()
+        try:
+            reader = ProcarReader(repair=repair).read(self._lines(mm, kpoints, bands))
+        finally:
+            mm.close()
+
+        if atoms is not None:
+            atoms = np.atleast_1d(np.arange(reader.ionsCount)[atoms])
+            reader.spd = [x[:, :, :, atoms] for x in reader.spd]
+            reader.spd_phase = [x[:, :, atoms] for x in reader.spd_phase]
+            reader.ionsCount = len(atoms)
+        return reader
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming concatenation of PROCARs.
+
+Band structures calculated in several runs (or split by k-point ranges)
+give one PROCAR per run. Merging them only needs the `k-point` headers
+to be renumbered and the `# of k-points` lines to be updated, so the
+files are copied in large binary blocks and only the header lines are
+rewritten. The memory used does not depend on the size of the files.
+
+The spin down channel of every file is written to a temporary file and
+appended after the spin up channel of all the files. A gzipped output is
+compressed by a background thread while the next block is read.
+"""
+
+import gzip
+import queue
+import re
+import shutil
+import tempfile
+import threading
+
+# Size of the blocks read from the input files
+_BLOCK_SIZE = 1 << 24
+# Number of blocks waiting to be compressed
+_QUEUE_SIZE = 4
+
+_KPOINT = re.compile(rb"^([ \t]*k-point)([ \t]*\d+)", re.M)
+_SPIN_DOWN = re.compile(rb"^#[ \t]*of k-points:", re.M)
+_META = re.compile(rb"#[^:]+:([^#]+)")
+_NKPOINTS = re.compile(rb"(k-points:[ \t]*)(\d+)")
+
+
+def open_procar(filename):
+    """Opens a (possibly gzipped) PROCAR in binary mode"""
+    if filename[-2:] == "gz":
+        return gzip.open(filename, "rb")
+    return open(filename, "rb")
+
+
+class GzipWriter:
+    """File-like object writing a gzipped file from a background thread.
+
+    `write` only queues the data, the compression (which releases the
+    GIL) runs while the caller prepares the next block. Errors of the
+    thread are raised by `close`.
+
+    Args:
+        filename: path of the output file
+        compresslevel: see `gzip.open`
+
+    Example:
+    >>> with GzipWriter("PROCAR.gz") as out:
+    ...     out.write(data)
+    """
+
+    def __init__(self, filename, compresslevel=6):
+        self._file = gzip.open(filename, "wb", compresslevel=compresslevel)
+        self._queue = queue.Queue(maxsize=_QUEUE_SIZE)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            if self._error is None:
+                try:
+                    self._file.write(data)
+                except Exception as error:
+                    self._error = error
+
+    def write(self, data):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(data)
+        return len(data)
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _Renumber:
+    """Callback of `re.sub` giving consecutive indexes to the k-point
+    headers, the width of the index field is kept when possible"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, match):
+        self.count += 1
+        return match.group(1) + b"%*d" % (len(match.group(2)), self.count)
+
+
+def _blocks(infile):
+    """Yields blocks of about `_BLOCK_SIZE` bytes ending at a line end"""
+    while True:
+        block = infile.read(_BLOCK_SIZE)
+        if not block:
+            return
+        if block[-1:] != b"\n":
+            block += infile.readline()
+        yield block
+
+
+def parse_meta(line):
+    """(kpoints, bands, ions) from the `# of k-points` line of a PROCAR"""
+    return tuple(int(x) for x in _META.findall(line)[:3])
+
+
+def merge_procars(infiles, outfile, gzip_out=False):
+    """Concatenates PROCARs, renumbering their k-points.
+
+    The title line is taken from the first file and the number of
+    k-points of the `# of k-points` lines is the total of all the
+    files. Spin polarized files are supported, the spin down k-points
+    of all the files follow the spin up ones.
+
+    Args:
+        infiles: names of the PROCARs (gzipped or not), in order
+        outfile: name of the merged PROCAR
+        gzip_out: whether to gzip the output
+
+    Returns:
+        (kpoints, bands, ions) of the merged PROCAR
+
+    Raises:
+        RuntimeError if the number of bands or ions of the files differ
+    """
+    handles = [open_procar(x) for x in infiles]
+    try:
+        titles = [x.readline() for x in handles]
+        metas = [x.readline() for x in handles]
+        parsed = [parse_meta(x) for x in metas]
+        if len(set(x[1:] for x in parsed)) != 1:
+            raise RuntimeError(
+                "Files are incompatible, number of bands/ions do not match"
+            )
+        nkpoints = sum(x[0] for x in parsed)
+        meta = _NKPOINTS.sub(
+            lambda match: match.group(1) + b"%d" % nkpoints, metas[0], count=1
+        )
+
+        if gzip_out:
+            out = GzipWriter(outfile)
+        else:
+            out = open(outfile, "wb", buffering=_BLOCK_SIZE)
+        with out, tempfile.TemporaryFile() as down:
+            out.write(titles[0])
+            out.write(meta)
+            up_numbers = _Renumber()
+            down_numbers = _Renumber()
+            has_down = False
+            for handle in handles:
+                target, numbers = out, up_numbers
+                for block in _blocks(handle):
+                    if target is out:
+                        match = _SPIN_DOWN.search(block)
+                        if match is not None:
+                            # the meta line of the spin down channel is
+                            # replaced by the merged one
+                            out.write(_KPOINT.sub(numbers, block[: match.start()]))
+                            end = block.find(b"\n", match.start()) + 1
+                            block = block[end:] if end else b""
+                            target, numbers = down, down_numbers
+                            has_down = True
+                    target.write(_KPOINT.sub(numbers, block))
+                handle.close()
+            if has_down:
+                out.write(meta)
+                down.seek(0)
+                shutil.copyfileobj(down, out, _BLOCK_SIZE)
+    finally:
+        for handle in handles:
+            handle.close()
+    return (nkpoints,) + parsed[0][1:]
+
+
+def concatenate(items, outfile):
+    """Copies files one after the other into `outfile` in large blocks.
+
+    Args:
+        items: names of the files, `bytes` items are written as they are
+        outfile: name of the output file
+    """
+    with open(outfile, "wb") as out:
+        for item in items:
+            if isinstance(item, bytes):
+                out.write(item)
+                continue
+            with open(item, "rb") as infile:
+                shutil.copyfileobj(infile, out, _BLOCK_SIZE)
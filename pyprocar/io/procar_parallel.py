@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel PROCAR parsing.
+
+The k-points of a PROCAR are independent, so the file is split at the
+k-point headers found by `ProcarIndex` and every chunk is parsed by a
+worker process with the same `ProcarReader` used by the serial parser.
+The workers write straight into arrays in shared memory, which are
+copied once into regular arrays at the end. The result is identical to
+the one of the serial parser.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .procar_index import ProcarIndex
+from .procar_reader import ProcarReader
+
+# Set in every worker by `_init_worker`
+_index = None
+_buffers = None
+
+
+def _attach(specs):
+    """Maps the shared memory blocks described by `specs` to arrays"""
+    buffers = {}
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        buffers[name] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+    return buffers
+
+
+def _init_worker(index, specs):
+    global _index, _buffers
+    _index = index
+    _buffers = _attach(specs)
+
+
+def _read_chunk(start, stop, repair):
+    """Parses the k-points [start, stop) and stores them in the shared
+    arrays. Returns the counters of the reader."""
+    reader = _index.read(kpoints=slice(start, stop), repair=repair)
+    for name, (shm, array) in _buffers.items():
+        for iset, value in enumerate(getattr(reader, name)):
+            array[iset, start:stop] = value
+    return reader.repaired_lines, reader.bad_kpoints
+
+
+def read_procar_parallel(filename, nprocs, repair=False, cache=True):
+    """Parses an uncompressed PROCAR with `nprocs` worker processes.
+
+    Args:
+        filename: path of the PROCAR
+        nprocs: number of worker processes
+        repair: see `ProcarReader`
+        cache: reuse (or store) the byte-offset index of the file
+
+    Returns:
+        ProcarReader, the same one `ProcarReader.read` would return.
+    """
+    index = ProcarIndex(filename, cache=cache)
+    nk = index.kpointsCount
+    # the first k-point gives the shapes of the projections
+    first = index.read(kpoints=[0], repair=repair)
+
+    specs = {}
+    shms = []
+    views = {}
+    try:
+        for name in ProcarReader._arrays:
+            values = getattr(first, name)
+            if len(values) == 0:
+                continue
+            shape = (len(values), nk) + values[0].shape[1:]
+            dtype = values[0].dtype
+            shm = shared_memory.SharedMemory(
+                create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1)
+            )
+            shms.append(shm)
+            specs[name] = (shm.name, shape, dtype.str)
+            views[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+        bounds = np.linspace(0, nk, min(nprocs * 4, nk) + 1).astype(int)
+        with ProcessPoolExecutor(
+            max_workers=nprocs, initializer=_init_worker, initargs=(index, specs)
+        ) as executor:
+            futures = [
+                executor.submit(_read_chunk, start, stop, repair)
+                for start, stop in zip(bounds[:-1], bounds[1:])
+                if stop > start
+            ]
+            counters = np.array([future.result() for future in futures])
+
+        reader = first
+        reader.meta_lines = [index.title, index.meta_line]
+        reader.kpointsCount = nk
+        reader.repaired_lines = int(counters[:, 0].sum())
+        reader.bad_kpoints = int(counters[:, 1].sum())
+        for name in views:
+            setattr(reader, name, [x.copy() for x in views[name]])
+    finally:
+        # the views must be released before the memory is freed
+        views.clear()
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+    return reader
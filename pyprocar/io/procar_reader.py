@@ -0,0 +1,454 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming reader for VASP PROCAR files.
+
+The PROCAR is walked once, line by line, and every k-point, band and
+projection block is written straight into preallocated numpy arrays.
+Only the header lines are split in python, the projection rows of each
+k-point are converted in bulk by numpy.
+The whole file is never held in memory as a string, so the peak memory
+is roughly the size of the final arrays.
+
+The arrays are kept in the order they appear in the file, one entry per
+spin block (2 for a collinear spin-polarized calculation). Reshaping
+them into the layout expected by each parser is left to the caller
+(see `pyprocar.io.vasp.Procar` and `pyprocar.procarparser.ProcarParser`).
+"""
+
+import gzip
+import re
+
+import numpy as np
+
+from .cache import load_cache, save_cache
+
+# Any of the known problems of the fixed format of the Fortran output:
+# overflown fields (***), numbers glued together by a minus sign and
+# numbers glued together by their decimals.
+BROKEN_LINE = re.compile(r"\*|\d-\d|\.\d{8}\d{2}\.")
+_BROKEN_BYTES = re.compile(BROKEN_LINE.pattern.encode())
+
+# Size of the chunks read by `needs_repair`
+_SCAN_CHUNK = 1 << 24
+
+# First character of the data rows: ion index, `tot` or `charge`
+_DATA_START = frozenset("0123456789tc")
+
+
+def repair_line(line):
+    """Fixes a single PROCAR line. The substitutions are the same ones
+    that used to be applied to the whole file.
+
+    band *** # energy    6.49554019 # occ.  0.00000000
+    to
+    band  1000 # energy    6.49554019 # occ.  0.00000000
+
+    k-point    61 :    0.00000000-0.50000000 0.00000000 ...
+    to
+    k-point    61 :    0.00000000 -0.50000000 0.00000000 ...
+    """
+    # Fixing bands issues (when there are more than 999 bands)
+    line = re.sub(r"(band\s)(\*\*\*)", r"\1 1000", line)
+    # Fixing k-point issues
+    line = re.sub(r"(\.\d{8})(\d{2}\.)", r"\1 \2", line)
+    line = re.sub(r"(\d)-(\d)", r"\1 -\2", line)
+    line = re.sub(r"\*+", r" -10.0000 ", line)
+    return line
+
+
+def needs_repair(filename):
+    """Fast scan of a PROCAR (plain or gzipped) looking for any of the
+    known Fortran formatting problems. The file is read in large binary
+    chunks and the scan stops at the first problem found.
+
+    Returns:
+        bool
+    """
+    if filename[-2:] == "gz":
+        rf = gzip.open(filename, mode="rb")
+    else:
+        rf = open(filename, "rb")
+    tail = b""
+    with rf:
+        while True:
+            chunk = rf.read(_SCAN_CHUNK)
+            if not chunk:
+                return False
+            # a problem may be split between two chunks, the boundary is
+            # checked separately
+            if _BROKEN_BYTES.search(chunk) or _BROKEN_BYTES.search(tail + chunk[:16]):
+                return True
+            tail = chunk[-16:]
+
+
+class ProcarReader:
+    """Single pass, block oriented PROCAR reader.
+
+    After `read` the following members are available, all of them are
+    lists with one entry per spin block found in the file:
+
+    kpoints      : (nkpoints, 3) reduced coordinates
+    weights      : (nkpoints,)
+    bands        : (nkpoints, nbands) energies
+    band_indices : (nkpoints, nbands) band index written in the file
+    occupancies  : (nkpoints, nbands)
+    spd          : (nkpoints, nbands, nblocks, ionsCount, orbitalCount + 1)
+                   the first column is the ion index (`tot` -> 0)
+    spd_phase    : (nkpoints, nbands, ionsCount, 2 * orbitalCount) only
+                   for PROCARs with phases (LORBIT=12)
+
+    `nblocks` is 4 for a non-collinear calculation and 1 otherwise.
+
+    Args:
+        repair: Fix the known Fortran formatting problems of the lines
+          that need it while reading. The number of fixed lines is
+          stored in `repaired_lines`.
+
+    K-point headers that can not be parsed are stored as `nan` and
+    counted in `bad_kpoints`, it is up to the caller to accept them.
+    """
+
+    def __init__(self, repair=False):
+        self.repair = repair
+        self.repaired_lines = 0
+        self.bad_kpoints = 0
+
+        self.meta_lines = []
+        self.has_phase = False
+        self.kpointsCount = None
+        self.bandsCount = None
+        # Number of ions+1, the +1 is the 'tot' row (except for one atom)
+        self.ionsCount = None
+        self.orbitalCount = None
+        self.orbitalNames = None
+        self.nblocks = None
+
+        self.kpoints = []
+        self.weights = []
+        self.bands = []
+        self.band_indices = []
+        self.occupancies = []
+        self.spd = []
+        self.spd_phase = []
+
+    _scalars = (
+        "has_phase",
+        "kpointsCount",
+        "bandsCount",
+        "ionsCount",
+        "orbitalCount",
+        "nblocks",
+        "repaired_lines",
+        "bad_kpoints",
+    )
+    _arrays = (
+        "kpoints",
+        "weights",
+        "bands",
+        "band_indices",
+        "occupancies",
+        "spd",
+        "spd_phase",
+    )
+
+    @property
+    def nsets(self):
+        """Number of spin blocks found in the file"""
+        return len(self.kpoints)
+
+    def _parse_meta(self, line):
+        # Line 2: # of k-points:  816   # of bands:  52   # of ions:   8
+        kpointsCount, bandsCount, ionsCount = map(
+            int, re.findall(r"#[^:]+:([^#]+)", line)
+        )
+        if self.kpointsCount is None:
+            self.meta_lines.append(line)
+            self.kpointsCount = kpointsCount
+            self.bandsCount = bandsCount
+            self.ionsCount = ionsCount if ionsCount == 1 else ionsCount + 1
+        elif (kpointsCount, bandsCount) != (self.kpointsCount, self.bandsCount):
+            raise RuntimeError("Spin blocks of the PROCAR do not match")
+
+        nk, nb = self.kpointsCount, self.bandsCount
+        self.kpoints.append(np.zeros(shape=(nk, 3)))
+        self.weights.append(np.zeros(shape=(nk,)))
+        self.bands.append(np.zeros(shape=(nk, nb)))
+        self.band_indices.append(np.zeros(shape=(nk, nb), dtype=int))
+        self.occupancies.append(np.zeros(shape=(nk, nb)))
+        if self.nblocks is not None:
+            self._allocate_projections()
+
+    def _allocate_projections(self):
+        nk, nb = self.kpointsCount, self.bandsCount
+        while len(self.spd) < self.nsets:
+            self.spd.append(
+                np.zeros(
+                    shape=(
+                        nk,
+                        nb,
+                        self.nblocks,
+                        self.ionsCount,
+                        self.orbitalCount + 1,
+                    )
+                )
+            )
+            if self.has_phase:
+                self.spd_phase.append(
+                    np.zeros(shape=(nk, nb, self.ionsCount, 2 * self.orbitalCount))
+                )
+
+    def _to_array(self, rows, ncols):
+        """Converts the raw data rows of a block to a (nrows, ncols) array
+        with a single call to the C tokenizer of numpy, instead of
+        splitting and checking every line in python."""
+        text = " ".join(rows)
+        if self.repair and BROKEN_LINE.search(text):
+            # only the (rare) blocks with problems are fixed line by line
+            fixed = []
+            for row in rows:
+                if BROKEN_LINE.search(row):
+                    row = repair_line(row)
+                    self.repaired_lines += 1
+                fixed.append(row)
+            text = " ".join(fixed)
+        if "tot" in text:
+            text = text.replace("tot", "0")
+        try:
+            values = np.fromstring(text, sep=" ")
+        except ValueError:
+            values = None
+        # a malformed number stops the tokenizer early, so any problem
+        # shows up as a wrong number of values
+        if values is None or values.size != len(rows) * ncols:
+            raise RuntimeError("Flats happens")
+        return values.reshape(len(rows), ncols)
+
+    def _flush_kpoint(self, iset, ik, nbands, spd_rows, phase_rows):
+        """Stores the projections of a whole k-point"""
+        if nbands != self.bandsCount:
+            raise RuntimeError("Number of bands don't match")
+        if self.nblocks is None:
+            # The number of projection blocks per band (1 or 4) is only
+            # known once the first k-point has been read
+            nrows = len(spd_rows)
+            if nrows == 0 or nrows % (nbands * self.ionsCount) != 0:
+                raise RuntimeError("Incompatible file.")
+            self.nblocks = nrows // (nbands * self.ionsCount)
+            self._allocate_projections()
+        if len(spd_rows) != nbands * self.nblocks * self.ionsCount:
+            raise RuntimeError("Incompatible file.")
+        self.spd[iset][ik] = self._to_array(spd_rows, self.orbitalCount + 1).reshape(
+            nbands, self.nblocks, self.ionsCount, self.orbitalCount + 1
+        )
+        if self.has_phase:
+            if len(phase_rows) != nbands * self.ionsCount:
+                raise RuntimeError("Incompatible file.")
+            self.spd_phase[iset][ik] = self._to_array(
+                phase_rows, 2 * self.orbitalCount
+            ).reshape(nbands, self.ionsCount, 2 * self.orbitalCount)
+
+    def _charge_row(self, line):
+        # charge  v1 v2 ... tot -> 0 v1 0 v2 0 ... 0 tot
+        # zeros are added as the imaginary part, the leading zero
+        # takes the place of the ion index
+        if self.repair and BROKEN_LINE.search(line):
+            line = repair_line(line)
+            self.repaired_lines += 1
+        tokens = line.split()
+        row = ["0"]
+        for x in tokens[1:-1]:
+            row.append(x)
+            row.append("0")
+        row.append(tokens[-1])
+        return " ".join(row)
+
+    def read(self, rf):
+        """Reads an already opened PROCAR (text mode, plain or gzipped)
+
+        The data rows are only classified by their first character and
+        kept as raw text; the numbers of a whole k-point are converted at
+        once when the next k-point (or spin block) starts.
+
+        Args:
+            rf: file object or any iterable of lines
+
+        Returns:
+            self
+        """
+        iset = -1
+        ik = -1
+        ib = -1
+        section = None
+        irow = 0
+        spd_rows = []
+        phase_rows = []
+
+        for line in rf:
+            stripped = line.lstrip()
+            if not stripped:
+                continue
+
+            if stripped[0] in _DATA_START:
+                if section == "spd":
+                    if self.ionsCount == 1 and stripped[0] == "t":
+                        continue
+                    spd_rows.append(line)
+                elif section == "phase" and self.has_phase:
+                    if irow < self.ionsCount:
+                        if stripped[0] == "c":
+                            line = self._charge_row(line)
+                        phase_rows.append(line)
+                    irow += 1
+                continue
+
+            if self.repair and BROKEN_LINE.search(line):
+                line = repair_line(line)
+                self.repaired_lines += 1
+            tokens = line.split()
+            key = tokens[0]
+
+            if key in ("k-point", "#") and ik >= 0 and self.orbitalNames is not None:
+                self._flush_kpoint(iset, ik, ib + 1, spd_rows, phase_rows)
+                spd_rows = []
+                phase_rows = []
+
+            if key == "k-point":
+                # k-point    1 :    0.00000000 0.00000000 0.00000000  weight = 0.00003704
+                ik += 1
+                ib = -1
+                section = None
+                coordinates = line.split(":", 1)[1].split("weight")
+                try:
+                    self.kpoints[iset][ik] = coordinates[0].split()[:3]
+                    if len(coordinates) > 1:
+                        self.weights[iset][ik] = coordinates[1].split("=")[-1]
+                except IndexError:
+                    raise RuntimeError(
+                        "Kpoints number do not match with metadata (header of PROCAR)"
+                    )
+                except ValueError:
+                    self.kpoints[iset][ik] = np.nan
+                    self.bad_kpoints += 1
+
+            elif key == "band":
+                # band   1 # energy   -7.11986315 # occ.  1.00000000
+                ib += 1
+                section = None
+                fields = line.split("#")
+                try:
+                    try:
+                        self.band_indices[iset][ik, ib] = int(fields[0].split()[1])
+                    except ValueError:
+                        self.band_indices[iset][ik, ib] = ib + 1
+                    self.bands[iset][ik, ib] = fields[1].split()[1]
+                    if len(fields) > 2:
+                        self.occupancies[iset][ik, ib] = fields[2].split()[1]
+                except IndexError:
+                    raise RuntimeError("Number of bands don't match")
+
+            elif key == "ion":
+                # The first header of a band belongs to the projections,
+                # the second one (if any) to the phases.
+                irow = 0
+                if section is None:
+                    section = "spd"
+                    if self.orbitalNames is None:
+                        self.orbitalNames = tokens[1:]
+                        self.orbitalCount = len(self.orbitalNames)
+                else:
+                    section = "phase"
+
+            elif key == "#":
+                if iset >= 0 and ik + 1 != self.kpointsCount:
+                    raise RuntimeError(
+                        "Kpoints number do not match with metadata (header of PROCAR)"
+                    )
+                self._parse_meta(line)
+                iset += 1
+                ik = -1
+                section = None
+
+            elif key == "PROCAR":
+                # Line 1: PROCAR lm decomposed
+                self.meta_lines.append(line)
+                self.has_phase = "phase" in line
+
+        if self.kpointsCount is None or self.orbitalNames is None:
+            raise RuntimeError("Incompatible file.")
+        self._flush_kpoint(iset, ik, ib + 1, spd_rows, phase_rows)
+        if ik + 1 != self.kpointsCount:
+            raise RuntimeError(
+                "Kpoints number do not match with metadata (header of PROCAR)"
+            )
+        return self
+
+    def to_arrays(self):
+        """Returns the parsed data as a flat dictionary of arrays (the
+        spin blocks are stored as `spd_0`, `spd_1`, ...)"""
+        arrays = {
+            "repair": np.array(self.repair),
+            "meta_lines": np.array(self.meta_lines),
+            "orbitalNames": np.array(self.orbitalNames),
+        }
+        for name in self._scalars:
+            arrays[name] = np.array(getattr(self, name))
+        for name in self._arrays:
+            for iset, value in enumerate(getattr(self, name)):
+                arrays["{}_{}".format(name, iset)] = value
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Builds a reader from the output of `to_arrays`"""
+        reader = cls(repair=bool(arrays["repair"]))
+        reader.meta_lines = [str(x) for x in arrays["meta_lines"]]
+        reader.orbitalNames = [str(x) for x in arrays["orbitalNames"]]
+        for name in cls._scalars:
+            setattr(reader, name, arrays[name].item())
+        nsets = len([key for key in arrays if key.startswith("kpoints_")])
+        for name in cls._arrays:
+            setattr(
+                reader,
+                name,
+                [
+                    arrays["{}_{}".format(name, iset)]
+                    for iset in range(nsets)
+                    if "{}_{}".format(name, iset) in arrays
+                ],
+            )
+        return reader
+
+
+def read_procar(rf, repair=False, cache=True, nprocs=1):
+    """Reads an opened PROCAR with a `ProcarReader`, going through the
+    on-disk cache (see `pyprocar.io.cache`).
+
+    Args:
+        rf: opened PROCAR file (plain or gzipped). If there is a valid
+          cache it is not read at all.
+        repair: see `ProcarReader`
+        cache: load the parsed data from the cache if it is up to date,
+          otherwise parse the file and store it.
+        nprocs: number of processes used to parse an uncompressed file
+          (see `pyprocar.io.procar_parallel`).
+
+    Returns:
+        ProcarReader
+    """
+    filename = getattr(rf, "name", None)
+    if not isinstance(filename, str):
+        cache = False
+    if cache:
+        arrays = load_cache(filename, "procar")
+        if arrays is not None and bool(arrays["repair"]) == repair:
+            return ProcarReader.from_arrays(arrays)
+    if nprocs > 1 and isinstance(filename, str) and filename[-2:] != "gz":
+        # imported here, the parallel parser is built on top of this module
+        from .procar_parallel import read_procar_parallel
+
+        reader = read_procar_parallel(filename, nprocs, repair=repair, cache=cache)
+    else:
+        reader = ProcarReader(repair=repair).read(rf)
+    if cache:
+        save_cache(filename, "procar", reader.to_arrays())
+    return reader
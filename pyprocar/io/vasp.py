@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 
 from ..core import Structure, DensityOfStates, ElectronicBandStructure, KPath
+from .procar_reader import read_procar, BROKEN_LINE, repair_line
+from .cache import load_cache, save_cache, pack_tree, unpack_tree
+from ..utils import mathematics
 import numpy as np
 from numpy import array
 import os
 import re
 import xml.etree.ElementTree as ET
+from xml.parsers import expat
 import collections
 import gzip
 
@@ -374,9 +378,13 @@ class Procar(collections.abc.Mapping):
         kpath=None,
         efermi=None,
         interpolation_factor=1,
+        cache=True,
+        nprocs=1,
     ):
         self.variables = {}
         self.filename = filename
+        self.cache = cache
+        self.nprocs = nprocs
         self.meta_lines = []
 
         self.reciprocal_lattice = reciprocal_lattice
@@ -453,24 +461,21 @@ class Procar(collections.abc.Mapping):
         k-point    61 :    0.00000000 -0.50000000 0.00000000 ...
 
         But as I found new stupid errors they should be fixed here.
+
+        The broken lines are already fixed while parsing, this only writes
+        a repaired copy of the file (`PROCAR-repaired`), streaming it line
+        by line. It is never called while reading.
         """
 
         print("PROCAR needs repairing")
-        # Fixing bands issues (when there are more than 999 bands)
-        # band *** # energy    6.49554019 # occ.  0.00000000
-        self.file_str = re.sub(r"(band\s)(\*\*\*)", r"\1 1000", self.file_str)
-        # Fixing k-point issues
-
-        self.file_str = re.sub(r"(\.\d{8})(\d{2}\.)", r"\1 \2", self.file_str)
-        self.file_str = re.sub(r"(\d)-(\d)", r"\1 -\2", self.file_str)
-
-        self.file_str = re.sub(r"\*+", r" -10.0000 ", self.file_str)
-
+        rf = self._open_file()
         outfile = open(self.filename + "-repaired", "w")
-        for iline in self.meta_lines:
-            outfile.write(iline)
-        outfile.write(self.file_str)
+        for line in rf:
+            if BROKEN_LINE.search(line):
+                line = repair_line(line)
+            outfile.write(line)
         outfile.close()
+        rf.close()
         print("Repaired PROCAR is written at {}-repaired".format(self.filename))
         print(
             "Please use {}-repaired next time for better efficiency".format(
@@ -527,106 +532,67 @@ class Procar(collections.abc.Mapping):
     def _read(self):
 
         rf = self._open_file()
+        # The file is parsed in a single pass, the broken lines (stupid
+        # fortran) are repaired on the fly. If the file was already parsed
+        # the arrays are loaded from the cache instead.
+        # With nprocs > 1 the k-points are split among worker processes.
+        reader = read_procar(rf, repair=True, cache=self.cache, nprocs=self.nprocs)
+        rf.close()
+
         # Line 1: PROCAR lm decomposed
-        self.meta_lines.append(rf.readline())
-        if "phase" in self.meta_lines[-1]:
-            self.has_phase = True
-        else:
-            self.has_phase = False
         # Line 2: # of k-points:  816   # of bands:  52   # of ions:   8
-        self.meta_lines.append(rf.readline())
-        self.kpointsCount, self.bandsCount, self.ionsCount = map(
-            int, re.findall(r"#[^:]+:([^#]+)", self.meta_lines[-1])
-        )
+        self.meta_lines = reader.meta_lines
+        self.has_phase = reader.has_phase
+        self.kpointsCount = reader.kpointsCount
+        self.bandsCount = reader.bandsCount
+        self.ionsCount = reader.ionsCount
         if self.ionsCount == 1:
             print(
                 "Special case: only one atom found. The program may not work as expected"
             )
-        else:
-            self.ionsCount = self.ionsCount + 1
-
-        # reading all the rest of the file to be parsed below
-
-        self.file_str = rf.read()
-        if (
-            len(re.findall(r"(band\s)(\*\*\*)", self.file_str)) != 0
-            or len(re.findall(r"(\.\d{8})(\d{2}\.)", self.file_str)) != 0
-            or len(re.findall(r"(\d)-(\d)", self.file_str)) != 0
-            or len(re.findall(r"\*+", self.file_str)) != 0
-        ):
-            self.repair()
+        if reader.repaired_lines != 0:
+            # the lines are only fixed in memory, a repaired copy of the
+            # file is written by `repair` on request
+            print(
+                "{} broken lines of the PROCAR were repaired while reading".format(
+                    reader.repaired_lines
+                )
+            )
 
-        self._read_kpoints()
-        self._read_bands()
-        self._read_orbitals()
+        self._read_kpoints(reader)
+        self._read_bands(reader)
+        self._read_orbitals(reader)
         if self.has_phase:
-            self._read_phases()
-        rf.close()
+            self._read_phases(reader)
         return
 
-    def _read_kpoints(self):
+    def _read_kpoints(self, reader):
         """Reads the k-point headers. A typical k-point line is:
         k-point    1 :    0.00000000 0.00000000 0.00000000  weight = 0.00003704\n
         fills self.kpoint[kpointsCount][3]
         The weights are discarded (are they useful?)
         """
-        if not self.file_str:
-            print("You should invoke `procar.readFile()` instead. Returning")
-            return
-
-        # finding all the K-points headers
-        self.kpoints = re.findall(
-            r"k-point\s+\d+\s*:\s+([-.\d\s]+)", self.file_str)
-
-        # trying to build an array
-        self.kpoints = [x.split() for x in self.kpoints]
-        try:
-            self.kpoints = np.array(self.kpoints, dtype=float)
-        except ValueError:
-            print("\n".join([str(x) for x in self.kpoints]))
-            if self.permissive:
-                # Discarding the kpoints list, however I need to set
-                # self.ispin beforehand.
-                if len(self.kpoints) == self.kpointsCount:
-                    self.ispin = 1
-                elif len(self.kpoints) == 2 * self.kpointsCount:
-                    self.ispin = 2
-                else:
-                    raise ValueError("Kpoints do not match with ispin=1 or 2.")
-                self.kpoints = None
-                return
-            else:
-
-                raise ValueError(
-                    "Badly formated Kpoints headers, try `--permissive`")
-        # if successful, go on
+        if reader.bad_kpoints != 0:
+            raise ValueError("Badly formated Kpoints headers")
 
         # trying to identify an non-polarized or non-collinear case, a
         # polarized case or a defective file
-
-        if len(self.kpoints) != self.kpointsCount:
-            # if they do not match, may means two things a spin polarized
-            # case or a bad file, lets check
+        if reader.nsets == 2:
             # lets start testing if it is spin polarized, if so, there
             # should be 2 identical blocks of kpoints.
-            up, down = np.vsplit(self.kpoints, 2)
+            up, down = reader.kpoints
             if (up == down).all():
                 self.ispin = 2
-                # just keeping one set of kpoints (the other will be
-                # discarded)
-                self.kpoints = up
             else:
                 raise RuntimeError("Bad Kpoints list.")
         # if ISPIN != 2 setting ISPIN=1 (later for the non-collinear case 1->4)
         # It is unknown until parsing the projected data
-        else:
+        elif reader.nsets == 1:
             self.ispin = 1
-
-        # checking again, for compatibility,
-        if len(self.kpoints) != self.kpointsCount:
-            raise RuntimeError(
-                "Kpoints number do not match with metadata (header of PROCAR)"
-            )
+        else:
+            raise RuntimeError("Bad Kpoints list.")
+        # just keeping one set of kpoints (the other will be discarded)
+        self.kpoints = reader.kpoints[0]
         return
 
     @property
@@ -643,69 +609,26 @@ class Procar(collections.abc.Mapping):
     def kpoints_reduced(self):
         return self.kpoints
 
-    def _read_bands(self):
+    def _read_bands(self, reader):
         """Reads the bands header. A typical bands is:
         band   1 # energy   -7.11986315 # occ.  1.00000000
 
         fills self.bands[kpointsCount][bandsCount]
 
         The occupation numbers are discarded (are they useful?)"""
-        if not self.file_str:
-            print("You should invoke `procar.read()` instead. Returning")
-            return
-
-        # finding all bands
-        self.bands = re.findall(
-            r"band\s*(\d+)\s*#\s*energy\s*([-.\d\s]+)", self.file_str
-        )
-
-        # checking if the number of bands match
-
-        if len(self.bands) != self.bandsCount * self.kpointsCount * self.ispin:
-            raise RuntimeError("Number of bands don't match")
-
-        # casting to array to manipulate the bands
-        self.bands = np.array(self.bands, dtype=float)[:,1]
 
         # Now I will deal with the spin polarized case. The goal is join
         # them like for a non-magnetic case
         # new version of pyprocar will have an (nkpoints, nbands, 2) dimensions
         if self.ispin == 2:
-            # up and down are along the first axis
-
-            up, down = np.split(self.bands,2)
-
-            # reshapping (the 2  means both band index and energy)
-            up = up.reshape(self.kpointsCount, self.bandsCount)
-            down = down.reshape(self.kpointsCount, self.bandsCount)
-
-            # setting the correct number of bands (up+down)
-            # self.bandsCount *= 2
-
-            # and joining along the second axis (axis=1), ie: bands-like
-            # self.bands = np.concatenate((up, down), axis=1)
-            self.bands = np.stack(
-                (up, down), axis=-1)
-        else :
-            self.bands = self.bands.reshape(self.kpointsCount, self.bandsCount, 1)
-
-        # otherwise just reshaping is needed
-        # else:
-        #     self.bands.shape = (self.kpointsCount, self.bandsCount, 2)
-
-        # Making a test if the broadcast is rigth, otherwise just print
-        # test = [x.max() - x.min() for x in self.bands[:, :, 0].transpose()]
-        # if np.array(test).any():
-        #     print(
-        #         "The indexes of bands do not match. CHECK IT. "
-        #         "Likely the data was wrongly broadcasted"
-        #     )
-        #     print(str(self.bands[:, :, 0]))
-        # # Now safely removing the band index
-        # self.bands = self.bands[:, :, 1]
+            # up and down are stacked along the last axis
+            self.bands = np.stack(reader.bands, axis=-1)
+        else:
+            self.bands = reader.bands[0].reshape(
+                self.kpointsCount, self.bandsCount, 1)
         return
 
-    def _read_orbitals(self):
+    def _read_orbitals(self, reader):
         """Reads all the spd-projected data. A typical/expected block is:
             ion      s     py     pz     px    dxy    dyz    dz2    dxz    dx2    tot
             1  0.079  0.000  0.001  0.000  0.000  0.000  0.000  0.000  0.000  0.079
@@ -721,15 +644,8 @@ class Procar(collections.abc.Mapping):
 
         Undefined behavior in case of phase factors (LORBIT = 12).
         """
-        # if not self.file_str:
-        #     print("You should invoke `procar.readFile()` instead. Returning")
-        #     return
-
-        # finding all orbital headers
-        self.spd = re.findall(r"ion(.+)", self.file_str)
-
         # testing if the orbital names are known (the standard ones)
-        FoundOrbs = self.spd[0].split()
+        FoundOrbs = reader.orbitalNames
         size = len(FoundOrbs)
         # only the first 'size' orbital
         StdOrbs = self.orbitalName[: size - 1] + self.orbitalName[-1:]
@@ -747,35 +663,16 @@ class Procar(collections.abc.Mapping):
                 "you did 'filter' them it is OK)."
             )
         self.orbitalCount = size
-        self.orbitalNames = self.spd[0].split()
-
-        # Now reading the bulk of data
-        # The case of just one atom is handled differently since the VASP
-        # output is a little different
-        if self.ionsCount == 1:
-            self.spd = re.findall(
-                r"^(\s*1\s+.+)$", self.file_str, re.MULTILINE)
-        else:
-            # Added by Francisco to speed up filtering on June 4th, 2019
-            # get rid of phase factors
-            self.spd = re.findall(r"ion.+tot\n([-.\d\seto]+)", self.file_str)
-            self.spd = "".join(self.spd)
-            self.spd = re.findall(r"([-.\d\se]+tot.+)\n", self.spd)
-        # free the memory (could be a lot)
-        if not self.has_phase:
-            self.file_str = None
+        self.orbitalNames = list(reader.orbitalNames)
 
         # Now the method will try to find the value of self.ispin,
         # previously it was set to either 1 or 2. If "1", it could be 1 or
         # 4, but previously it was impossible to find the rigth value. If
         # "2" it has to macth with the number of entries of spd data.
-
-        expected = self.bandsCount * self.kpointsCount * self.ispin
-        
-        if expected == len(self.spd):
+        if reader.nblocks == 1:
             pass
         # catching a non-collinear calc.
-        elif expected * 4 == len(self.spd):
+        elif reader.nblocks == 4:
             # testing if previous ispin value is ok
             if self.ispin != 1:
                 print(
@@ -786,38 +683,11 @@ class Procar(collections.abc.Mapping):
         else:
             raise RuntimeError("Incompatible file.")
 
-        # checking for consistency
-        for line in self.spd:
-            if len(line.split()) != (self.ionsCount) * (self.orbitalCount + 1):
-                raise RuntimeError("Flats happens")
-
-        # replacing the "tot" string by a number, to allows a conversion
-        # to numpy
-        self.spd = [x.replace("tot", "0").split() for x in self.spd]
-        # self.spd = [x.split() for x in self.spd]
-        self.spd = np.array(self.spd, dtype=float)
-
         # handling collinear polarized case
         if self.ispin == 2:
-            # splitting both spin components, now they are along k-points
-            # axis (1st axis) but, then should be concatenated along the
-            # bands.
-            up, down = np.vsplit(self.spd, 2)
-            # ispin = 1 for a while, we will made the distinction
-            up = up.reshape(
-                self.kpointsCount,
-                self.bandsCount ,
-                1,
-                self.ionsCount,
-                self.orbitalCount + 1,
-            )
-            down = down.reshape(
-                self.kpointsCount,
-                self.bandsCount ,
-                1,
-                self.ionsCount,
-                self.orbitalCount + 1,
-            )
+            # both spin components are (kpoints, bands, 1, ions, orbitals)
+            # blocks, they should be concatenated along the bands.
+            up, down = reader.spd
             # concatenating bandwise. Density and magntization, their
             # meaning is obvious, and do uses 2 times more memory than
             # required, but I *WANT* to keep it as close as possible to the
@@ -827,73 +697,20 @@ class Procar(collections.abc.Mapping):
             # concatenated along 'ispin axis'
             self.spd = np.concatenate((density, magnet), axis=2)
 
-        # otherwise, just a reshaping suffices
+        # otherwise, the array already has the right shape
         else:
-            self.spd = self.spd.reshape(
-                self.kpointsCount,
-                self.bandsCount,
-                self.ispin,
-                self.ionsCount,
-                self.orbitalCount + 1,
-            )
+            self.spd = reader.spd[0]
         return
 
-    def _read_phases(self):
-
-        if self.ionsCount == 1:
-            self.spd_phase = re.findall(
-                r"^(\s*1\s+.+)$", self.file_str, re.MULTILINE)
-        else:
-            # Added by Francisco to speed up filtering on June 4th, 2019
-            # get rid of phase factors
-            self.spd_phase = re.findall(
-                r"ion.+\n([-.\d\se]+charge[-.\d\se]+)", self.file_str
-            )
-            self.spd_phase = "".join(self.spd_phase)
-            self.spd_phase = re.findall(
-                r"([-.\d\se]+charge.+)\n", self.spd_phase)
-        # free the memory (could be a lot)
-        self.file_str = None
-
-        # replacing the "charge" string by a number, to allows a conversion
-        # to numpy, adding columns of zeros next to charge row to be able to
-        # convert to imaginary
-
-        self.spd_phase = [
-            x.replace(
-                re.findall("charge.*", x)[0],
-                (
-                    " 0.000 ".join(re.findall("charge.*", x)[0].split()).replace(
-                        "charge", ""
-                    )
-                ),
-            )
-            for x in self.spd_phase
-        ]
-        self.spd_phase = [x.split() for x in self.spd_phase]
-        self.spd_phase = np.array(self.spd_phase, dtype=float)
+    def _read_phases(self, reader):
 
+        # The "charge" rows were already padded with zeros as imaginary
+        # part, each row is (ion, re, im, re, im, ..., tot)
         # handling collinear polarized case
         if self.ispin == 2:
-            # splitting both spin components, now they are along k-points
-            # axis (1st axis) but, then should be concatenated along the
-            # bands.
-            up, down = np.vsplit(self.spd_phase, 2)
-            # ispin = 1 for a while, we will made the distinction
-            up = up.reshape(
-                self.kpointsCount,
-                int(self.bandsCount / 2),
-                1,
-                self.ionsCount,
-                self.orbitalCount * 2,
-            )
-            down = down.reshape(
-                self.kpointsCount,
-                int(self.bandsCount / 2),
-                1,
-                self.ionsCount,
-                self.orbitalCount * 2,
-            )
+            # splitting both spin components, then they should be
+            # concatenated along the bands.
+            up, down = [x[:, :, np.newaxis] for x in reader.spd_phase]
             # concatenating bandwise. Density and magntization, their
             # meaning is obvious, and do uses 2 times more memory than
             # required, but I *WANT* to keep it as close as possible to the
@@ -904,22 +721,8 @@ class Procar(collections.abc.Mapping):
             self.spd_phase = np.concatenate((density, magnet), axis=2)
 
         # otherwise, just a reshaping suffices
-        elif self.ispin == 4:
-            self.spd_phase = self.spd_phase.reshape(
-                self.kpointsCount,
-                self.bandsCount,
-                1,
-                self.ionsCount,
-                self.orbitalCount * 2,
-            )
         else:
-            self.spd_phase = self.spd_phase.reshape(
-                self.kpointsCount,
-                self.bandsCount,
-                self.ispin,
-                self.ionsCount,
-                self.orbitalCount * 2,
-            )
+            self.spd_phase = reader.spd_phase[0][:, :, np.newaxis]
         temp = np.zeros(
             shape=(
                 self.spd_phase.shape[0],
@@ -928,7 +731,7 @@ class Procar(collections.abc.Mapping):
                 self.spd_phase.shape[3],
                 int(self.spd_phase.shape[4] / 2) + 1,
             ),
-            dtype=np.complex_,
+            dtype=np.complex128,
         )
 
         for i in range(1, (self.orbitalCount) * 2 - 2, 2):
@@ -986,7 +789,17 @@ class Procar(collections.abc.Mapping):
             projected[:, :, :, 0, :, :] = temp_spd[:, :, :-1, 1:-1, :]
         return projected
 
-    def symmetrize(self, symprec=1e-5, outcar=None, structure=None, spglib=True):
+    def symmetrize(
+        self,
+        symprec=1e-5,
+        outcar=None,
+        structure=None,
+        spglib=True,
+        kpoint_tolerance=1e-5,
+    ):
+        """Unfolds the kpoints to the full Brillouin zone. `symprec` is the
+        tolerance of spglib on the atomic positions, the unfolded kpoints
+        closer than `kpoint_tolerance` are the same."""
         if outcar is not None:
             with open(outcar) as f:
                 txt = f.readlines()
@@ -1046,35 +859,29 @@ class Procar(collections.abc.Mapping):
                     np.dot(np.linalg.inv(structure.reciprocal_lattice), R),
                     structure.reciprocal_lattice,
                 )
-                R = np.round_(R, decimals=3)
+                R = np.round(R, decimals=3)
                 rotations.append(R)
         elif structure is not None:
-            rotations = structure.get_spglib_symmetry_dataset(symprec)
-
-        klist = []
-        bandlist = []
-        spdlist = []
-        # for each symmetry operation
-
-        for i, _ in enumerate(rotations):
-            # for each point
-            for j, _ in enumerate(self.kpoints):
-                # apply symmetry operation to kpoint
-                sympoint_vector = np.dot(rotations[i], self.kpoints[j])
-                sympoint = sympoint_vector.tolist()
-
-                if sympoint not in klist:
-                    klist.append(sympoint)
-
-                    band = self.bands[j].tolist()
-                    bandlist.append(band)
-                    spd = self.spd[j].tolist()
-                    spdlist.append(spd)
-
-        self.kpoints = np.array(klist)
-        self.bands = np.array(bandlist)
-        self.spd = np.array(spdlist)
-        self.spd = self._spd2projected(spd)
+            # spglib rotations act on the direct coordinates, their
+            # transposes (the group of the inverse transposes) on the
+            # reduced kpoints
+            dataset = structure.get_spglib_symmetry_dataset(symprec)
+            try:
+                rotations = dataset.rotations
+            except AttributeError:
+                # spglib < 2.5 returns a dictionary
+                rotations = dataset["rotations"]
+            rotations = np.transpose(rotations, (0, 2, 1))
+
+        self.kpoints, index = mathematics.unfold_kpoints(
+            self.kpoints, rotations, kpoint_tolerance
+        )
+        self.bands = self.bands[index]
+        self.spd = self.spd[index]
+        if self.has_phase:
+            self.spd_phase = self.spd_phase[index]
+            self.carray = self.carray[index]
+        self.ebs.ibz2fbz(rotations, kpoint_tolerance)
 
     def __contains__(self, x):
         return x in self.variables
@@ -1089,13 +896,276 @@ class Procar(collections.abc.Mapping):
         return self.variables.__len__()
 
 
+# Optional blocks of a vasprun.xml (see `VaspXML(sections=...)`) and the
+# tag of the children of <calculation> holding them
+# The legacy parser (pyprocar.vaspxml) caches a different layout of the
+# same file under the kind "vasprun"
+_CACHE_KIND = "vasprun-iterparse"
+
+VASPRUN_SECTIONS = {
+    "eigenvalues": "eigenvalues",
+    "projected": "projected",
+    "dos": "dos",
+    "structures": "structure",
+    "scsteps": "scstep",
+    "forces": "varray",
+}
+
+
+class _ArrayDecoder:
+    """Decodes an <array> of a vasprun.xml while it is being read by
+    `VaspXML._iterparse`.
+
+    The rows (<r>) of every innermost <set> are converted to numbers as
+    soon as the set is closed and the elements are cleared, so the text
+    of the rows never piles up in memory. The result is a single array
+    with one axis per level of nested <set> (e.g. spin, kpoint, band)
+    followed by the rows and the columns of the innermost sets.
+    """
+
+    def __init__(self):
+        self.fields = []
+        self.dimensions = []
+        # number of <set> opened at each nesting level
+        self.starts = []
+        self.level = 0
+        self.rows = []
+        self.blocks = []
+
+    def start(self, element):
+        if element.tag == "set":
+            if len(self.starts) == self.level:
+                self.starts.append(0)
+            self.starts[self.level] += 1
+            self.level += 1
+
+    def end(self, element):
+        if element.tag == "r":
+            self.rows.append(element.text)
+            element.clear()
+        elif element.tag == "set":
+            self.level -= 1
+            if len(self.rows) != 0:
+                self.blocks.append(self._decode(self.rows))
+                self.rows = []
+            element.clear()
+        elif element.tag == "field":
+            self.fields.append(element.text.strip(" "))
+        elif element.tag == "dimension":
+            self.dimensions.append(element.text)
+
+    @staticmethod
+    def _decode(rows):
+        text = " ".join(rows)
+        if "*" in text:
+            # overflown fields of the fixed format
+            text = re.sub(r"\*+", " nan ", text)
+        values = np.fromstring(text, sep=" ")
+        return values.reshape(len(rows), -1)
+
+    def result(self):
+        """Returns the array as a dictionary like the one of
+        `VaspXML.get_general`, `data` being a numpy array"""
+        if len(self.blocks) == 0:
+            return {"info": self.fields, "dimensions": self.dimensions, "data": None}
+        blocks = np.array(self.blocks)
+        # the outermost <set> is only a container
+        shape = [
+            self.starts[i] // self.starts[i - 1] for i in range(1, len(self.starts))
+        ]
+        return {
+            "info": self.fields,
+            "dimensions": self.dimensions,
+            "data": blocks.reshape(shape + list(blocks.shape[1:])),
+        }
+
+
+_READ_SIZE = 1 << 20
+
+
+def _iterparse_skipping(source, skip, blocks):
+    """Yields the events of ``ET.iterparse(source, events=("start",
+    "end"))`` for a vasprun.xml, leaving out the children of the
+    <calculation>s with a tag in `skip`. No element is built and no text
+    is kept for them, which is much faster than dropping them afterwards.
+
+    `blocks` is filled with the tag of the root element, its byte offset
+    (the XML declaration comes before) and the [icalculation, tag, start,
+    end] byte offsets of each child left out. `end` is the offset of the
+    closing tag, or the one right after ``/>`` for an empty element.
+    """
+    builder = ET.TreeBuilder()
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    events = []
+    blocks["children"] = []
+    # the child left out ("skipped", "offset") ends when the elements
+    # with its tag opened inside it ("level") are closed
+    state = {"depth": 0, "calculation": False, "ncalculations": 0}
+
+    def start(tag, attrib):
+        depth = state["depth"]
+        if depth == 0:
+            blocks["root"] = tag
+            blocks["prolog"] = parser.CurrentByteIndex
+        elif depth == 1:
+            state["calculation"] = tag == "calculation"
+            state["ncalculations"] += state["calculation"]
+        elif depth == 2 and state["calculation"] and tag in skip:
+            state["skipped"] = tag
+            state["offset"] = parser.CurrentByteIndex
+            state["level"] = 1
+            parser.StartElementHandler = skipped_start
+            parser.EndElementHandler = skipped_end
+            parser.CharacterDataHandler = None
+            return
+        state["depth"] = depth + 1
+        events.append(("start", builder.start(tag, attrib)))
+
+    def end(tag):
+        state["depth"] -= 1
+        events.append(("end", builder.end(tag)))
+
+    def skipped_start(tag, attrib):
+        if tag == state["skipped"]:
+            state["level"] += 1
+
+    def skipped_end(tag):
+        if tag != state["skipped"]:
+            return
+        state["level"] -= 1
+        if state["level"] == 0:
+            blocks["children"].append(
+                [
+                    state["ncalculations"] - 1,
+                    tag,
+                    state["offset"],
+                    parser.CurrentByteIndex,
+                ]
+            )
+            parser.StartElementHandler = start
+            parser.EndElementHandler = end
+            parser.CharacterDataHandler = builder.data
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = builder.data
+    rf = open(source, "rb") if isinstance(source, str) else source
+    try:
+        while True:
+            data = rf.read(_READ_SIZE)
+            parser.Parse(data, len(data) == 0)
+            yield from events
+            events.clear()
+            if len(data) == 0:
+                break
+    finally:
+        if rf is not source:
+            rf.close()
+
+
+class _BlockReader:
+    """Read-only file holding some children of the <calculation>s of a
+    vasprun.xml, copied from the byte offsets recorded by
+    `_iterparse_skipping`. They are wrapped in the XML declaration, the
+    root element and their <calculation>s, so the result is parsed like
+    a vasprun.xml with only these children.
+    """
+
+    def __init__(self, filename, blocks, tags):
+        self.rf = open(filename, "rb")
+        self.pieces = self._pieces(blocks, tags)
+        self.buffer = b""
+
+    def _pieces(self, blocks, tags):
+        root = blocks["root"].encode()
+        yield self.rf.read(blocks["prolog"])
+        yield b"<" + root + b">"
+        current = None
+        for icalculation, tag, start, end in blocks["children"]:
+            if tag not in tags:
+                continue
+            if icalculation != current:
+                if current is not None:
+                    yield b"</calculation>"
+                yield b"<calculation>"
+                current = icalculation
+            self.rf.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                data = self.rf.read(min(remaining, _READ_SIZE))
+                if len(data) == 0:
+                    raise ValueError("vasprun.xml changed while it was read")
+                remaining -= len(data)
+                yield data
+            # `end` is the offset of the closing tag, unless the element
+            # is empty (<tag/>)
+            data = self.rf.read(len(tag) + 16)
+            if data.startswith(b"</"):
+                yield data[: data.index(b">") + 1]
+        if current is not None:
+            yield b"</calculation>"
+        yield b"</" + root + b">"
+
+    def read(self, size=-1):
+        if size < 0:
+            data = self.buffer + b"".join(self.pieces)
+            self.buffer = b""
+            return data
+        while len(self.buffer) == 0:
+            self.buffer = next(self.pieces, None)
+            if self.buffer is None:
+                self.buffer = b""
+                return b""
+        data = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return data
+
+    def close(self):
+        self.rf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 class VaspXML(collections.abc.Mapping):
-    """contains."""
+    """Parser of vasprun.xml
+
+    Args:
+        filename: path of the vasprun.xml
+        dos_interpolation_factor: see `DensityOfStates`
+        cache: see `pyprocar.io.cache`
+        sections: optional blocks to read right away, any of
+          `VASPRUN_SECTIONS` ('eigenvalues', 'projected', 'dos',
+          'structures', 'scsteps', 'forces'). The general information
+          (incar, kpoints, parameters, atoms, ...) is always read. The
+          blocks left out are only read the first time a property needs
+          them, e.g. `sections=['dos', 'structures']` is enough to plot
+          the density of states. Default None (everything). The blocks
+          read so far are cached, a later run only reads the blocks that
+          are not in the cache yet.
+    """
 
-    def __init__(self, filename="vasprun.xml", dos_interpolation_factor=None):
+    def __init__(
+        self,
+        filename="vasprun.xml",
+        dos_interpolation_factor=None,
+        cache=True,
+        sections=None,
+    ):
 
         self.variables = {}
         self.dos_interpolation_factor = dos_interpolation_factor
+        self.cache = cache
+        if sections is None:
+            sections = list(VASPRUN_SECTIONS)
+        for section in sections:
+            if section not in VASPRUN_SECTIONS:
+                raise ValueError("Unknown section of vasprun.xml " + str(section))
+        self.sections = list(sections)
 
         if not os.path.isfile(filename):
             raise ValueError("File not found " + filename)
@@ -1103,6 +1173,10 @@ class VaspXML(collections.abc.Mapping):
             self.filename = filename
 
         self.spins_dict = {"spin 1": "Spin-up", "spin 2": "Spin-down"}
+        # arrays decoded while reading, see `_iterparse`
+        self._decoded = {}
+        # offsets of the blocks left out, see `_iterparse`
+        self._blocks = None
         # self.positions = None
         # self.stress = None
         # self.array_sizes = {}
@@ -1110,7 +1184,8 @@ class VaspXML(collections.abc.Mapping):
 
     def read(self):
         """
-        Read and parse vasprun.xml.
+        Read and parse vasprun.xml. If the file was already parsed, the
+        data is loaded from the on-disk cache (see `pyprocar.io.cache`).
 
         Returns
         -------
@@ -1118,131 +1193,133 @@ class VaspXML(collections.abc.Mapping):
             DESCRIPTION.
 
         """
-        return self.parse_vasprun(self.filename)
+        sections = self.sections
+        if self.cache:
+            cached = load_cache(self.filename, _CACHE_KIND)
+            if cached is not None and "sections" in cached:
+                # the cache may hold only some of the optional blocks, the
+                # missing ones are read in a single pass
+                self.sections = [str(x) for x in cached["sections"]]
+                self.data = unpack_tree(cached)
+                if "blocks" in cached:
+                    self._blocks = unpack_tree(cached, prefix="blocks")
+                self._load_sections(sections)
+                return self.data
+        self.data = self.parse_vasprun(self.filename, sections=sections)
+        self._save_cache()
+        return self.data
+
+    def _save_cache(self):
+        """Stores the data read so far in the on-disk cache, together with
+        the list of the optional blocks it holds"""
+        if not self.cache:
+            return
+        arrays = pack_tree(self.data)
+        arrays["sections"] = np.array(self.sections, dtype=str)
+        if self._blocks is not None:
+            arrays.update(pack_tree(self._blocks, prefix="blocks"))
+        save_cache(self.filename, _CACHE_KIND, arrays)
+        # the data is used as it is loaded from the cache
+        self.data = unpack_tree(arrays)
+
+    def _load_sections(self, sections):
+        """Reads the optional blocks (see `VASPRUN_SECTIONS`) in `sections`
+        that were left out when the file was read. Only their blocks are
+        read, from the byte offsets recorded by `_iterparse`, all of them
+        in one pass."""
+        missing = [x for x in sections if x not in self.sections]
+        if len(missing) == 0:
+            return
+        if self._blocks is None:
+            # e.g. caches written before the offsets were recorded
+            data = self.parse_vasprun(self.filename, sections=missing)
+        else:
+            tags = [VASPRUN_SECTIONS[x] for x in missing]
+            # nothing to leave out, the source only holds these blocks
+            with _BlockReader(self.filename, self._blocks, tags) as source:
+                data = self.parse_vasprun(source)
+        for section in missing:
+            if section == "structures":
+                self.data["structures"] = data["structures"]
+            elif section == "scsteps":
+                self.data["calculation"] = data["calculation"]
+            elif section == "forces":
+                self.data["forces"] = data["forces"]
+            elif section in data["general"]:
+                self.data["general"][section] = data["general"][section]
+            self.sections.append(section)
+        self._save_cache()
 
     @property
     def bands(self):
-        spins = list(self.data["general"]["eigenvalues"]
-                     ["array"]["data"].keys())
-        kpoints_list = list(
-            self.data["general"]["eigenvalues"]["array"]["data"]["spin 1"].keys()
-        )
+        # the fermi energy is in the dos block
+        self._load_sections(["eigenvalues", "dos"])
+        # eigenvalues[ispin][ikpoint][iband][energy, occupancy]
+        data = self.data["general"]["eigenvalues"]["array"]["data"]
+        nspins = data.shape[0]
         eigen_values = {}
-        nbands = len(
-            self.data["general"]["eigenvalues"]["array"]["data"][spins[0]][
-                kpoints_list[0]
-            ][kpoints_list[0]]
-        )
-        nkpoints = len(kpoints_list)
-        for ispin in spins:
-            eigen_values[ispin] = {}
-            eigen_values[ispin]["eigen_values"] = np.zeros(
-                shape=(nbands, nkpoints))
-            eigen_values[ispin]["occupancies"] = np.zeros(
-                shape=(nbands, nkpoints))
-            for ikpoint, kpt in enumerate(kpoints_list):
-                temp = np.array(
-                    self.data["general"]["eigenvalues"]["array"]["data"][ispin][kpt][
-                        kpt
-                    ]
-                )
-                eigen_values[ispin]["eigen_values"][:, ikpoint] = (
-                    temp[:, 0] - self.fermi
-                )
-                eigen_values[ispin]["occupancies"][:, ikpoint] = temp[:, 1]
+        for ispin in range(nspins):
+            spn = "spin " + str(ispin + 1)
+            eigen_values[spn] = {}
+            eigen_values[spn]["eigen_values"] = data[ispin, :, :, 0].T - self.fermi
+            eigen_values[spn]["occupancies"] = data[ispin, :, :, 1].T
         return eigen_values
 
+    @property
+    def projected(self):
+        """
+        Returns the projections of the bands in the layout of
+        `ElectronicBandStructure.projected`,
+        projected[ikpoint][iband][iatom][iprincipal][iorbital][ispin].
+        It is a view of the parsed array, no data is copied.
+        """
+        self._load_sections(["projected"])
+        # ispin, ikpoint, iband, iatom, iorbital
+        data = self.data["general"]["projected"]["array"]["data"]
+        # ikpoint, iband, iatom, iorbital, ispin
+        return np.moveaxis(data, 0, -1)[:, :, :, np.newaxis]
+
     @property
     def bands_projected(self):
-        # projected[iatom][ikpoint][iband][iprincipal][iorbital][ispin]
+        self._load_sections(["projected"])
         labels = self.data["general"]["projected"]["array"]["info"]
-        spins = list(self.data["general"]["projected"]["array"]["data"].keys())
-        kpoints_list = list(
-            self.data["general"]["projected"]["array"]["data"][spins[0]].keys()
-        )
-        bands_list = list(
-            self.data["general"]["projected"]["array"]["data"][spins[0]][
-                kpoints_list[0]
-            ][kpoints_list[0]].keys()
-        )
         bands_projected = {"labels": labels}
-
-        nspins = len(spins)
-        nkpoints = len(kpoints_list)
-        nbands = len(bands_list)
-        norbitals = len(labels)
-        natoms = self.initial_structure.natoms
-        bands_projected["projection"] = np.zeros(
-            shape=(nspins, nkpoints, nbands, natoms, norbitals)
-        )
-        for ispin, spn in enumerate(spins):
-            for ikpoint, kpt in enumerate(kpoints_list):
-                for iband, bnd in enumerate(bands_list):
-                    bands_projected["projection"][
-                        ispin, ikpoint, iband, :, :
-                    ] = np.array(
-                        self.data["general"]["projected"]["array"]["data"][spn][kpt][
-                            kpt
-                        ][bnd][bnd]
-                    )
-        # ispin, ikpoint, iband, iatom, iorbital
-        bands_projected["projection"] = np.swapaxes(
-            bands_projected["projection"], 0, 3)
-        # iatom, ikpoint, iband, ispin, iorbital
-        bands_projected["projection"] = np.swapaxes(
-            bands_projected["projection"], 3, 4)
-        # iatom, ikpoint, iband, iorbital, ispin
-        bands_projected["projection"] = bands_projected["projection"].reshape(
-            natoms, nkpoints, nbands, 1, norbitals, nspins
-        )
-
+        # iatom, ikpoint, iband, iprincipal, iorbital, ispin
+        bands_projected["projection"] = np.moveaxis(self.projected, 2, 0)
         return bands_projected
 
     def _get_dos_total(self):
-
-        spins = list(self.data["general"]["dos"]
-                     ["total"]["array"]["data"].keys())
-        energies = np.array(
-            self.data["general"]["dos"]["total"]["array"]["data"][spins[0]]
-        )[:, 0]
+        self._load_sections(["dos"])
+        # total[ispin][ienergy][energy, total, integrated]
+        data = self.data["general"]["dos"]["total"]["array"]["data"]
+        # copies, the parsed data must not be changed by the callers
+        energies = data[0, :, 0].copy()
         dos_total = {"energies": energies}
-        for ispin in spins:
-            dos_total[self.spins_dict[ispin]] = np.array(
-                self.data["general"]["dos"]["total"]["array"]["data"][ispin]
-            )[:, 1]
+        for ispin in range(data.shape[0]):
+            dos_total[self.spins_dict["spin " + str(ispin + 1)]] = data[
+                ispin, :, 1
+            ].copy()
 
         return dos_total, list(dos_total.keys())
 
     def _get_dos_projected(self, atoms=[]):
+        self._load_sections(["dos"])
 
         if len(atoms) == 0:
             atoms = np.arange(self.initial_structure.natoms)
 
         if "partial" in self.data["general"]["dos"]:
+            # partial[iatom][ispin][ienergy][energy, orbitals...]
+            data = self.data["general"]["dos"]["partial"]["array"]["data"]
             dos_projected = {}
-            ion_list = [
-                "ion %s" % str(x + 1) for x in atoms
-            ]  # using this name as vasrun.xml uses ion #
-            for i in range(len(ion_list)):
-                iatom = ion_list[i]
-                name = self.initial_structure.atoms[atoms[i]] + str(atoms[i])
-                spins = list(
-                    self.data["general"]["dos"]["partial"]["array"]["data"][
-                        iatom
-                    ].keys()
-                )
-                energies = np.array(
-                    self.data["general"]["dos"]["partial"]["array"]["data"][iatom][
-                        spins[0]
-                    ][spins[0]]
-                )[:, 0]
+            for iatom in atoms:
+                name = self.initial_structure.atoms[iatom] + str(iatom)
+                energies = data[iatom, 0, :, 0]
                 dos_projected[name] = {"energies": energies}
-                for ispin in spins:
-                    dos_projected[name][self.spins_dict[ispin]] = np.array(
-                        self.data["general"]["dos"]["partial"]["array"]["data"][iatom][
-                            ispin
-                        ][ispin]
-                    )[:, 1:]
+                for ispin in range(data.shape[1]):
+                    dos_projected[name][
+                        self.spins_dict["spin " + str(ispin + 1)]
+                    ] = data[iatom, ispin, :, 1:]
             return (
                 dos_projected,
                 self.data["general"]["dos"]["partial"]["array"]["info"],
@@ -1253,12 +1330,13 @@ class VaspXML(collections.abc.Mapping):
 
     @property
     def dos(self):
-        energies = self.dos_total["energies"]
+        dos_total = self.dos_total
+        energies = dos_total["energies"]
         total = []
-        for ispin in self.dos_total:
+        for ispin in dos_total:
             if ispin == "energies":
                 continue
-            total.append(self.dos_total[ispin])
+            total.append(dos_total[ispin])
         # total = np.array(total).T
         return DensityOfStates(
             energies=energies,
@@ -1280,7 +1358,7 @@ class VaspXML(collections.abc.Mapping):
         Returns the total density of states as a pychemia.visual.DensityOfSates object
         """
         dos_total, labels = self._get_dos_total()
-        dos_total["energies"] -= self.fermi
+        dos_total["energies"] = dos_total["energies"] - self.fermi
 
         return dos_total
 
@@ -1366,6 +1444,7 @@ class VaspXML(collections.abc.Mapping):
         """
         Returns the fermi energy
         """
+        self._load_sections(["dos"])
         return self.data["general"]["dos"]["efermi"]
 
     @property
@@ -1380,6 +1459,7 @@ class VaspXML(collections.abc.Mapping):
         """
         Returns a list of pychemia.core.Structure representing all the ionic step structures
         """
+        self._load_sections(["structures"])
         symbols = [x.strip() for x in self.data["atom_info"]["symbols"]]
         structures = []
         for ist in self.data["structures"]:
@@ -1404,6 +1484,7 @@ class VaspXML(collections.abc.Mapping):
         """
         Returns all the forces in ionic steps
         """
+        self._load_sections(["forces"])
         return self.data["forces"]
 
     @property
@@ -1426,6 +1507,7 @@ class VaspXML(collections.abc.Mapping):
         """
         Returns a list of information in each electronic and ionic step of calculation
         """
+        self._load_sections(["scsteps"])
         return self.data["calculation"]
 
     @property
@@ -1433,6 +1515,7 @@ class VaspXML(collections.abc.Mapping):
         """
         Returns a list of energies in each electronic and ionic step [ionic step,electronic step, energy]
         """
+        self._load_sections(["scsteps"])
         scf_step = 0
         ion_step = 0
         double_counter = 1
@@ -1634,7 +1717,11 @@ class VaspXML(collections.abc.Mapping):
 
     def get_general(self, xml_tree, ret):
         """ This function will parse any element in calculatio other than the structures, scsteps"""
-        if "dimension" in [x.tag for x in xml_tree]:
+        if xml_tree in self._decoded:
+            # <array> already decoded while reading (see `_iterparse`)
+            ret.update(self._decoded.pop(xml_tree))
+            return ret
+        elif "dimension" in [x.tag for x in xml_tree]:
             ret["info"] = []
             ret["data"] = {}
             for ielement in xml_tree:
@@ -1656,9 +1743,66 @@ class VaspXML(collections.abc.Mapping):
                     ielement, ret[ielement.tag])
             return ret
 
-    def parse_vasprun(self, vasprun):
-        tree = ET.parse(vasprun)
-        root = tree.getroot()
+    def _iterparse(self, vasprun, skip=()):
+        """Reads vasprun.xml incrementally, yielding the children of the
+        root element once they are complete. They are cleared as soon as
+        the caller is done with them, so the whole tree is never held
+        in memory.
+
+        The <array>s inside a <calculation> (eigenvalues, projected, dos,
+        ...) are decoded into numpy arrays while reading and emptied, the
+        result is picked up by `get_general`.
+
+        The children of the <calculation>s with a tag in `skip` are
+        dropped while reading. When `vasprun` is a file name, their byte
+        offsets are kept in `self._blocks`, so `_load_sections` can read
+        them later without going through the whole file again.
+        """
+        self._decoded = {}
+        if len(skip) == 0:
+            context = ET.iterparse(vasprun, events=("start", "end"))
+        else:
+            blocks = {}
+            context = _iterparse_skipping(vasprun, skip, blocks)
+        _, root = next(context)
+        depth = 0
+        in_calculation = False
+        array = None
+        decoder = None
+        for event, element in context:
+            if event == "start":
+                depth += 1
+                if decoder is not None:
+                    decoder.start(element)
+                elif in_calculation and element.tag == "array":
+                    array = element
+                    decoder = _ArrayDecoder()
+                elif depth == 1 and element.tag == "calculation":
+                    in_calculation = True
+                continue
+
+            depth -= 1
+            if decoder is not None:
+                if element is array:
+                    self._decoded[array] = decoder.result()
+                    array.clear()
+                    array = None
+                    decoder = None
+                else:
+                    decoder.end(element)
+            elif depth == 0:
+                in_calculation = False
+                yield element
+                root.clear()
+        if len(skip) != 0 and isinstance(vasprun, str):
+            self._blocks = blocks
+
+    def parse_vasprun(self, vasprun, sections=None):
+        """Parses vasprun.xml, only the optional blocks (see
+        `VASPRUN_SECTIONS`) in `sections` are read (default all)."""
+        if sections is None:
+            sections = VASPRUN_SECTIONS
+        skip = [tag for name, tag in VASPRUN_SECTIONS.items() if name not in sections]
 
         calculation = []
         structures = []
@@ -1673,7 +1817,7 @@ class VaspXML(collections.abc.Mapping):
         kpoints_list = []
         k_weights = []
         atom_info = {}
-        for ichild in root:
+        for ichild in self._iterparse(vasprun, skip=skip):
 
             if ichild.tag == "generator":
                 for ielement in ichild:
@@ -1,2 +1,3 @@
 from .procarfilefilter import ProcarFileFilter
 from ..utilsprocar import UtilsProcar
+from .pipeline import ProcarFilterPipeline
@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+"""
+Single pass filter of PROCAR files.
+
+`ProcarFilterPipeline` chains the reductions of `ProcarFileFilter`
+(atoms, orbitals, bands, k-points and spin) and applies all of them
+while the input is read once. Only the header lines are looked at in
+python: the projection rows of a band are kept as raw text, converted
+at once with numpy when the band ends, grouped with a matrix product
+(see `reduction_matrix`) and written back with a single fixed-width
+format. Bands, k-points or spin blocks that are filtered out are
+skipped without converting them.
+"""
+
+import re
+
+import numpy as np
+
+from ..utilsprocar import UtilsProcar
+
+# First character of the data rows: ion index, `tot` or `charge`
+_DATA_START = frozenset("0123456789tc")
+
+# Same layout as the PROCAR written by VASP, the explicit space keeps
+# large values apart
+_ION_FORMAT = "%5d"
+_TOT_FORMAT = "tot  "
+_VALUE_FORMAT = " %6.3f"
+_NAME_FORMAT = " %6s"
+_META_FORMAT = "# of k-points: %5d         # of bands: %4d         # of ions: %4d\n"
+
+
+def _fixed_width(values):
+    """The text of every value with 3 decimals and a leading space, as an
+    (..., width) array of characters built with integer arithmetic
+    instead of formatting every number. The integer part is 2 characters
+    wide (as " %6.3f") unless some value needs more, then all of them are
+    widened so the columns stay aligned. Returns None if any value is not
+    finite."""
+    scaled = np.rint(values * 1000)
+    if not np.isfinite(scaled).all():
+        return None
+    digits = np.abs(scaled).astype(np.int64)
+    integer = digits // 1000
+    negative = np.signbit(values)
+
+    # characters of the integer part of every value, sign included
+    ndigits = np.ones(integer.shape, dtype=np.int64)
+    power = 10
+    largest = integer.max() if integer.size else 0
+    while power <= largest:
+        ndigits += integer >= power
+        power *= 10
+    width = max(2, int((ndigits + negative).max()) if integer.size else 2)
+
+    fields = np.full(values.shape + (width + 5,), ord(" "), dtype=np.uint8)
+    for position in range(width):
+        # digits of the integer part from the right, then the sign
+        digit = ord("0") + integer // 10 ** position % 10
+        sign = np.where(negative & (ndigits == position), ord("-"), ord(" "))
+        fields[..., width - position] = np.where(position < ndigits, digit, sign)
+    fields[..., width + 1] = ord(".")
+    fields[..., width + 2] = ord("0") + digits // 100 % 10
+    fields[..., width + 3] = ord("0") + digits // 10 % 10
+    fields[..., width + 4] = ord("0") + digits % 10
+    return fields.reshape(values.shape[:-1] + (-1,))
+
+
+def reduction_matrix(groups, size):
+    """0/1 matrix grouping (adding) the elements of a vector.
+
+    Args:
+        groups: nested list of indexes, one list per group
+        size: length of the vectors to be reduced
+
+    Returns:
+        (size, len(groups)) array, `vector @ matrix` are the sums of the
+        groups. An index repeated in a group is added as many times.
+    """
+    matrix = np.zeros((size, len(groups)))
+    for igroup, group in enumerate(groups):
+        np.add.at(matrix[:, igroup], group, 1)
+    return matrix
+
+
+class ProcarFilterPipeline:
+    """Chain of PROCAR reductions applied in a single pass.
+
+    Every method adds one reduction and returns the pipeline, `run`
+    reads the input and writes the result:
+
+    >>> pipeline = ProcarFilterPipeline("PROCAR")
+    >>> pipeline.atoms([[0, 1], [2]]).orbitals(
+    ...     [[0], [1, 2, 3], [4, 5, 6, 7, 8]], ["s", "p", "d"]
+    ... ).bands(40, 60)
+    >>> pipeline.run("PROCAR-new")
+
+    The reductions behave as the corresponding `ProcarFileFilter`
+    methods. The phases of a PROCAR with phases are kept as long as the
+    atoms and orbitals are not grouped, otherwise they are dropped.
+
+    Args:
+        infile: PROCAR (plain or gzipped) to be filtered
+    """
+
+    def __init__(self, infile="PROCAR"):
+        self.infile = infile
+        self.atom_groups = None
+        self.orbital_groups = None
+        self.orbital_names = None
+        self.band_range = None
+        self.kpoint_range = None
+        self.spin_components = None
+
+        # layout of the input, found by `_probe`
+        self.has_phase = False
+        self.ionsCount = None
+        self.orbitalCount = None
+        self.nblocks = None
+
+        # reduction matrices of the layout, built by `run`
+        self._orbital_matrix = None
+        self._atom_matrix = None
+
+    def atoms(self, groups):
+        """Groups (adds) the atoms, `groups` is a nested list of 0-based
+        atom indexes, e.g. [[0, 1], [2]]. The `tot` rows are kept."""
+        self.atom_groups = [list(group) for group in groups]
+        return self
+
+    def orbitals(self, groups, names=None):
+        """Groups (adds) the orbitals, `groups` is a nested list of
+        orbital indexes, e.g. [[0], [1, 2, 3]]. The `tot` column is
+        kept."""
+        self.orbital_groups = [list(group) for group in groups]
+        if names is None:
+            names = ["o" + str(x) for x in range(len(groups))]
+        if len(names) != len(groups):
+            raise RuntimeError("length of orbitals and orbitals names do not match")
+        self.orbital_names = list(names)
+        return self
+
+    def bands(self, Min, Max):
+        """Keeps the bands from `Min` to `Max`, as numbered in the file"""
+        self.band_range = (min(Min, Max), max(Min, Max))
+        return self
+
+    def kpoints(self, Min, Max):
+        """Keeps the k-points from `Min` to `Max`, as numbered in the
+        file"""
+        self.kpoint_range = (min(Min, Max), max(Min, Max))
+        return self
+
+    def spin(self, components):
+        """Keeps the spin components: the blocks of every band for a non
+        collinear calculation (0=density, 1,2,3=Sx,Sy,Sz), otherwise the
+        spin blocks of the file (0=up, 1=down)"""
+        self.spin_components = list(components)
+        return self
+
+    @property
+    def _groups_projections(self):
+        return self.atom_groups is not None or self.orbital_groups is not None
+
+    @property
+    def _splits_blocks(self):
+        return self.spin_components is not None and self.nblocks == 4
+
+    def _open(self):
+        return UtilsProcar().OpenFile(self.infile)
+
+    def _probe(self):
+        """Reads the first band of the file to learn its layout"""
+        rows = 0
+        with self._open() as fin:
+            for line in fin:
+                stripped = line.lstrip()
+                if self.orbitalCount is not None:
+                    if not stripped or stripped[0] not in _DATA_START:
+                        break
+                    if stripped[0] != "c":
+                        rows += 1
+                elif stripped.startswith("PROCAR"):
+                    self.has_phase = "phase" in stripped
+                elif stripped.startswith("#"):
+                    self.ionsCount = int(re.findall(r"#[^:]+:([^#]+)", line)[2])
+                elif stripped.startswith("ion"):
+                    self.orbitalCount = len(stripped.split()) - 2
+        if self.orbitalCount is None or self.ionsCount is None:
+            raise RuntimeError("Incompatible file.")
+        self.nblocks = rows // (self.ionsCount + 1)
+
+    def _meta_line(self, line):
+        kpointsCount, bandsCount, ionsCount = map(
+            int, re.findall(r"#[^:]+:([^#]+)", line)
+        )
+        if self.kpoint_range is not None:
+            kmin, kmax = self.kpoint_range
+            kpointsCount = max(0, min(kmax, kpointsCount) - max(kmin, 1) + 1)
+        if self.band_range is not None:
+            bmin, bmax = self.band_range
+            bandsCount = max(0, min(bmax, bandsCount) - max(bmin, 1) + 1)
+        if self.atom_groups is not None:
+            ionsCount = len(self.atom_groups)
+        return _META_FORMAT % (kpointsCount, bandsCount, ionsCount)
+
+    def _orbital_header(self):
+        return (
+            "ion"
+            + "".join(_NAME_FORMAT % name for name in self.orbital_names + ["tot"])
+            + "\n"
+        )
+
+    def _projections(self, rows, nbands):
+        """Reduces the projection rows of `nbands` bands (usually all the
+        bands of a k-point), returns the new text of every band"""
+        ncols = self.orbitalCount + 2
+        values = np.fromstring(" ".join(rows).replace("tot", "0"), sep=" ")
+        if values.size != len(rows) * ncols or len(rows) % (
+            nbands * (self.ionsCount + 1)
+        ):
+            raise RuntimeError("Incompatible file.")
+        # (nbands, nblocks, ions + tot, ion index + orbitals + tot)
+        values = values.reshape(nbands, -1, self.ionsCount + 1, ncols)
+        if self._splits_blocks:
+            values = values[:, self.spin_components]
+        ions = values[:, :, :-1, 1:]
+        tot = values[:, :, -1:, 1:]
+
+        if self._orbital_matrix is not None:
+            ions = np.matmul(ions, self._orbital_matrix)
+            tot = np.matmul(tot, self._orbital_matrix)
+        if self._atom_matrix is not None:
+            ions = np.matmul(self._atom_matrix, ions)
+
+        # (nbands, nblocks, rows, values), the last row is `tot`
+        block = np.concatenate((ions, tot), axis=2)
+        nblocks, nrows, nvalues = block.shape[1:]
+
+        fields = _fixed_width(block)
+        if fields is not None:
+            labels = [_ION_FORMAT % (i + 1) for i in range(nrows - 1)] + [_TOT_FORMAT]
+            lines = np.empty(
+                (nbands, nblocks, nrows, len(_TOT_FORMAT) + fields.shape[-1] + 1),
+                dtype=np.uint8,
+            )
+            lines[..., : len(_TOT_FORMAT)] = np.array(
+                [list(label.encode()) for label in labels], dtype=np.uint8
+            )
+            lines[..., len(_TOT_FORMAT) : -1] = fields
+            lines[..., -1] = ord("\n")
+            text = lines.tobytes().decode("ascii")
+            size = len(text) // nbands
+            return [text[i * size : (i + 1) * size] for i in range(nbands)]
+
+        # some value is not a number
+        index = np.broadcast_to(
+            np.arange(1, nrows + 1)[:, None], (nbands, nblocks, nrows, 1)
+        )
+        data = np.concatenate((index, block), axis=-1)
+        keep = np.ones(data.shape[1:], dtype=bool)
+        keep[:, -1, 0] = False
+        data = data[:, keep]
+        row_format = _ION_FORMAT + _VALUE_FORMAT * nvalues + "\n"
+        tot_format = _TOT_FORMAT + _VALUE_FORMAT * nvalues + "\n"
+        band_format = (row_format * (nrows - 1) + tot_format) * nblocks
+        return [band_format % tuple(band) for band in data]
+
+    def run(self, outfile):
+        """Reads the input once and writes the filtered PROCAR in
+        `outfile`"""
+        self._probe()
+        if self.orbital_groups is not None:
+            # the `tot` column is kept as the last group
+            self._orbital_matrix = reduction_matrix(
+                self.orbital_groups + [[self.orbitalCount]], self.orbitalCount + 1
+            )
+        if self.atom_groups is not None:
+            self._atom_matrix = reduction_matrix(self.atom_groups, self.ionsCount).T
+        rewrite = self._groups_projections or self._splits_blocks
+        keep_phase = not self._groups_projections
+
+        iset = -1
+        ik = 0
+        ib = 0
+        keep_set = keep_kpoint = keep_band = True
+        section = None
+        header = None
+        rows = []
+
+        # the text of a k-point is kept until it ends, with a None in
+        # place of the projections of each band, so all the projections
+        # of the k-point are reduced at once
+        segments = []
+        band_rows = []
+        write = segments.append
+
+        with self._open() as fin, open(outfile, "w") as fout:
+
+            def flush():
+                if not rows:
+                    return
+                if section == "spd":
+                    if rewrite:
+                        if self.orbital_groups is not None:
+                            write(self._orbital_header())
+                        else:
+                            write(header)
+                        write(None)
+                        band_rows.extend(rows)
+                        return
+                elif not keep_phase:
+                    return
+                write(header)
+                write("".join(rows))
+
+            def emit():
+                if band_rows:
+                    texts = iter(self._projections(band_rows, segments.count(None)))
+                    segments[:] = [
+                        next(texts) if segment is None else segment
+                        for segment in segments
+                    ]
+                fout.write("".join(segments))
+                segments.clear()
+                band_rows.clear()
+
+            for line in fin:
+                stripped = line.lstrip()
+                if stripped and stripped[0] in _DATA_START:
+                    if section is not None and keep_set and keep_kpoint and keep_band:
+                        rows.append(line)
+                    continue
+
+                # any other line ends the current projections
+                if section is not None:
+                    flush()
+                    if stripped.startswith("ion"):
+                        section, header, rows = "phase", line, []
+                        continue
+                    section, header, rows = None, None, []
+
+                tokens = stripped.split()
+                key = tokens[0] if tokens else None
+
+                if key == "ion":
+                    section, header, rows = "spd", line, []
+                    continue
+
+                elif key == "band":
+                    ib += 1
+                    try:
+                        ib = int(tokens[1])
+                    except ValueError:
+                        pass
+                    if self.band_range is not None:
+                        keep_band = self.band_range[0] <= ib <= self.band_range[1]
+
+                elif key == "k-point":
+                    emit()
+                    ik += 1
+                    ib = 0
+                    keep_band = True
+                    try:
+                        ik = int(tokens[1])
+                    except ValueError:
+                        pass
+                    if self.kpoint_range is not None:
+                        keep_kpoint = self.kpoint_range[0] <= ik <= self.kpoint_range[1]
+
+                elif key == "#":
+                    emit()
+                    iset += 1
+                    ik = 0
+                    keep_kpoint = keep_band = True
+                    if self.spin_components is not None and not self._splits_blocks:
+                        keep_set = iset in self.spin_components
+                    if keep_set:
+                        write(self._meta_line(line))
+                    continue
+
+                elif key == "PROCAR":
+                    if not keep_phase:
+                        line = line.replace(" + phase", "")
+                    write(line)
+                    continue
+
+                if keep_set and keep_kpoint and keep_band:
+                    write(line)
+
+            if section is not None:
+                flush()
+            emit()
+        return
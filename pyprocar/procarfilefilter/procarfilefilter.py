@@ -3,9 +3,9 @@ import re
 import sys
 
 import matplotlib.pyplot as plt
-import numpy as np
 
 from ..utilsprocar import UtilsProcar
+from .pipeline import ProcarFilterPipeline
 
 
 class ProcarFileFilter:
@@ -175,31 +175,11 @@ class ProcarFileFilter:
         # checking about IO, that is the job of the caller
         self.log.info("In File: " + self.infile)
         self.log.info("Out File: " + self.outfile)
-        # open the files
-        fout = open(self.outfile, "w")
-        fopener = UtilsProcar()
-        fin = fopener.OpenFile(self.infile)
-        for line in fin:
-            if re.match(r"\s*ion\s*", line):
-                # self.log.debug("orbital line found: " + line)
-                line = " ".join(["ion"] + orbitalsNames + ["tot"]) + "\n"
-
-            elif re.match(r"\s*\d+\s*", line) or re.match(r"\s*tot\s*", line):
-                # self.log.debug("data line found: " + line)
-                line = line.split()
-                # all floats to an array
-                data = np.array(line[1:], dtype=float)
-                # setting a new line, keeping just the first value
-                line = line[:1]
-                for orbset in orbitals:
-                    line.append(data[orbset].sum())
-                # the last value ("tot") always  should be written
-                line.append(data[-1])
-                # converting to str
-                line = [str(x) for x in line]
-                line = " ".join(line) + "\n"
-            fout.write(line)
-
+        # every band is read as a block and the orbitals are grouped
+        # with a single matrix product
+        ProcarFilterPipeline(self.infile).orbitals(orbitals, orbitalsNames).run(
+            self.outfile
+        )
         return
 
     def FilterAtoms(self, atomsGroups):
@@ -224,54 +204,9 @@ class ProcarFileFilter:
         # checking about IO, that is the job of the caller
         self.log.info("In File: " + self.infile)
         self.log.info("Out File: " + self.outfile)
-        # open the files
-        fout = open(self.outfile, "w")
-        fopener = UtilsProcar()
-        with fopener.OpenFile(self.infile) as fin:
-            # I need to change the numbers of ions, it will needs the second
-            # line. The first one is not needed
-            fout.write(fin.readline())
-            line = fin.readline()
-            line = line.split()
-            # the very last value needs to be changed
-            line[-1] = str(len(atomsGroups))
-            line = " ".join(line)
-            fout.write(line + "\n")
-
-            # now parsing the rest of the file
-            data = []
-            for line in fin:
-                # if line has data just capture it
-                if re.match(r"\s*\d+\s*", line):
-                    # self.log.debug("atoms line found: " + line)
-                    data.append(line)
-                # if `line` is a end of th block (begins with 'tot'), do the
-                # work. And clean up data then
-                elif re.match(r"\s*tot\s*", line):
-                    # self.log.debug("tot line found: " + line)
-                    # making an array
-                    data = [x.split() for x in data]
-                    data = np.array(data, dtype=float)
-                    # iterating on the atoms groups
-                    for index in range(len(atomsGroups)):
-                        atoms = atomsGroups[index]
-                        # summing colum-wise
-                        atomLine = data[atoms].sum(axis=0)
-                        atomLine = [str(x) for x in atomLine]
-                        # the atom index should not be averaged (anyway now is
-                        # meaningless)
-                        atomLine[0] = str(index + 1)
-                        atomLine = " ".join(atomLine)
-                        fout.write(atomLine + "\n")
-
-                    # clean the buffer
-                    data = []
-                    # and write the `tot` line
-                    fout.write(line)
-                # otherwise just write this line
-                else:
-                    fout.write(line)
-
+        # every band is read as a block and the atoms are grouped with a
+        # single matrix product
+        ProcarFilterPipeline(self.infile).atoms(atomsGroups).run(self.outfile)
         return
 
     def FilterBands(self, Min, Max):
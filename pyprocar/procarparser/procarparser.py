@@ -4,6 +4,8 @@ import logging
 import matplotlib.pyplot as plt
 import sys
 from ..utilsprocar import UtilsProcar
+from ..io.procar_reader import read_procar
+from ..io.procar_index import ProcarIndex
 
 
 class ProcarParser:
@@ -140,36 +142,25 @@ class ProcarParser:
         # remove indices and total from iorb.
         return self.spd[:, :, :, 1:-1]
 
-    def _readKpoints(self, permissive=False):
+    def _readKpoints(self, reader, permissive=False):
         """Reads the k-point headers. A typical k-point line is:
         k-point    1 :    0.00000000 0.00000000 0.00000000  weight = 0.00003704\n
         fills self.kpoint[kpointsCount][3]
         The weights are discarded (are they useful?)
         """
         self.log.debug("readKpoints")
-        if not self.fileStr:
-            self.log.warning("You should invoke `procar.readFile()` instead. Returning")
-            return
-
-        # finding all the K-points headers
-        self.kpoints = re.findall(r"k-point\s+\d+\s*:\s+([-.\d\s]+)", self.fileStr)
-        self.log.debug(str(len(self.kpoints)) + " K-point headers found")
-        self.log.debug("The first match found is: " + str(self.kpoints[0]))
-
-        # trying to build an array
-        self.kpoints = [x.split() for x in self.kpoints]
-        try:
-            self.kpoints = np.array(self.kpoints, dtype=float)
-        except ValueError:
-            self.log.error("Ill-formatted data:")
-            print("\n".join([str(x) for x in self.kpoints]))
+        self.log.debug(
+            str(reader.nsets * self.kpointsCount) + " K-point headers found"
+        )
+
+        if reader.bad_kpoints != 0:
+            self.log.error("Ill-formatted data: " + str(reader.bad_kpoints)
+                           + " K-point headers")
             if permissive is True:
                 # Discarding the kpoints list, however I need to set
                 # self.ispin beforehand.
-                if len(self.kpoints) == self.kpointsCount:
-                    self.ispin = 1
-                elif len(self.kpoints) == 2 * self.kpointsCount:
-                    self.ispin = 2
+                if reader.nsets in (1, 2):
+                    self.ispin = reader.nsets
                 else:
                     raise ValueError("Kpoints do not match with ispin=1 or 2.")
                 self.kpoints = None
@@ -182,34 +173,30 @@ class ProcarParser:
         # trying to identify an non-polarized or non-collinear case, a
         # polarized case or a defective file
 
-        if len(self.kpoints) != self.kpointsCount:
-            # if they do not match, may means two things a spin polarized
+        if reader.nsets == 2:
+            # two blocks of kpoints, may means two things a spin polarized
             # case or a bad file, lets check
             self.log.debug(
-                "Number of kpoints do not match, looking for a " "spin-polarized case"
+                "Two blocks of kpoints, looking for a " "spin-polarized case"
             )
             # lets start testing if it is spin polarized, if so, there
             # should be 2 identical blocks of kpoints.
-            up, down = np.vsplit(self.kpoints, 2)
+            up, down = reader.kpoints
             if (up == down).all():
                 self.log.info("Spin-polarized calculation found")
                 self.ispin = 2
-                # just keeping one set of kpoints (the other will be
-                # discarded)
-                self.kpoints = up
             else:
                 self.log.error("Number of K-points do not match! check them.")
                 raise RuntimeError("Bad Kpoints list.")
         # if ISPIN != 2 setting ISPIN=1 (later for the non-collinear case 1->4)
         # It is unknown until parsing the projected data
-        else:
+        elif reader.nsets == 1:
             self.ispin = 1
+        else:
+            raise RuntimeError("Bad Kpoints list.")
 
-        # checking again, for compatibility,
-        if len(self.kpoints) != self.kpointsCount:
-            raise RuntimeError(
-                "Kpoints number do not match with metadata (header of PROCAR)"
-            )
+        # just keeping one set of kpoints (the other will be discarded)
+        self.kpoints = reader.kpoints[0]
 
         self.log.debug(str(self.kpoints))
         self.log.info("The kpoints shape is " + str(self.kpoints.shape))
@@ -220,7 +207,7 @@ class ProcarParser:
             self.log.debug("New kpoints: \n" + str(self.kpoints))
         return
 
-    def _readBands(self):
+    def _readBands(self, reader):
         """Reads the bands header. A typical bands is:
         band   1 # energy   -7.11986315 # occ.  1.00000000
 
@@ -228,68 +215,44 @@ class ProcarParser:
 
         The occupation numbers are discarded (are they useful?)"""
         self.log.debug("readBands")
-        if not self.fileStr:
-            log.warning("You should invoke `procar.read()` instead. Returning")
-            return
-
-        # finding all bands
-        self.bands = re.findall(
-            r"band\s*(\d+)\s*#\s*energy\s*([-.\d\s]+)", self.fileStr
-        )
         self.log.debug(
-            str(len(self.bands))
+            str(reader.nsets * self.bandsCount * self.kpointsCount)
             + " bands headers found, bands*Kpoints = "
             + str(self.bandsCount * self.kpointsCount)
         )
-        self.log.debug("The first match found is: " + str(self.bands[0]))
-
-        # checking if the number of bands match
-
-        if len(self.bands) != self.bandsCount * self.kpointsCount * self.ispin:
-            self.log.error("Number of bands headers do not match")
-            raise RuntimeError("Number of bands don't match")
-
-        # casting to array to manipulate the bands
-        self.bands = np.array(self.bands, dtype=float)
-        self.log.debug(str(self.bands))
 
         # Now I will deal with the spin polarized case. The goal is join
         # them like for a non-magnetic case
         if self.ispin == 2:
-            # up and down are along the first axis
-            up, down = np.vsplit(self.bands, 2)
+            # up and down are the two blocks of the file
+            up, down = reader.bands
             self.log.debug("up   , " + str(up.shape))
             self.log.debug("down , " + str(down.shape))
 
-            # reshapping (the 2  means both band index and energy)
-            up.shape = (self.kpointsCount, self.bandsCount, 2)
-            down.shape = (self.kpointsCount, self.bandsCount, 2)
-
             # setting the correct number of bands (up+down)
             self.bandsCount *= 2
             self.log.debug("New number of bands : " + str(self.bandsCount))
 
             # and joining along the second axis (axis=1), ie: bands-like
             self.bands = np.concatenate((up, down), axis=1)
+            indices = np.concatenate(reader.band_indices, axis=1)
 
-        # otherwise just reshaping is needed
+        # otherwise nothing has to be done
         else:
-            self.bands.shape = (self.kpointsCount, self.bandsCount, 2)
+            self.bands = reader.bands[0]
+            indices = reader.band_indices[0]
 
         # Making a test if the broadcast is rigth, otherwise just print
-        test = [x.max() - x.min() for x in self.bands[:, :, 0].transpose()]
-        if np.array(test).any():
+        if (indices.max(axis=0) - indices.min(axis=0)).any():
             self.log.warning(
                 "The indexes of bands do not match. CHECK IT. "
                 "Likely the data was wrongly broadcasted"
             )
-            self.log.warning(str(self.bands[:, :, 0]))
-        # Now safely removing the band index
-        self.bands = self.bands[:, :, 1]
+            self.log.warning(str(indices))
         self.log.info("The bands shape is " + str(self.bands.shape))
         return
 
-    def _readOrbital(self):
+    def _readOrbital(self, reader):
         """Reads all the spd-projected data. A typical/expected block is:
     ion      s     py     pz     px    dxy    dyz    dz2    dxz    dx2    tot
       1  0.079  0.000  0.001  0.000  0.000  0.000  0.000  0.000  0.000  0.079
@@ -306,17 +269,10 @@ class ProcarParser:
     Undefined behavior in case of phase factors (LORBIT = 12).
     """
         self.log.debug("readOrbital")
-        if not self.fileStr:
-            log.warning("You should invoke `procar.readFile()` instead. Returning")
-            return
-
-        # finding all orbital headers
-        self.spd = re.findall(r"ion(.+)", self.fileStr)
-        self.log.info("the first orbital match reads: " + self.spd[0])
-        self.log.debug("And I found " + str(len(self.spd)) + " orbitals headers")
+        self.log.info("the orbital header reads: " + " ".join(reader.orbitalNames))
 
         # testing if the orbital names are known (the standard ones)
-        FoundOrbs = self.spd[0].split()
+        FoundOrbs = reader.orbitalNames
         size = len(FoundOrbs)
         # only the first 'size' orbital
         StdOrbs = self.orbitalName[: size - 1] + self.orbitalName[-1:]
@@ -332,42 +288,22 @@ class ProcarParser:
                 "you did 'filter' them it is OK)."
             )
         self.orbitalCount = size
-        self.orbitalNames = self.spd[0].split()
+        self.orbitalNames = list(reader.orbitalNames)
         self.log.debug(
             "Anyway, I will use the following set of orbitals: "
             + str(self.orbitalNames)
         )
 
-        # Now reading the bulk of data
-        self.log.debug("Now searching the values")
-        # The case of just one atom is handled differently since the VASP
-        # output is a little different
-        if self.ionsCount == 1:
-            self.spd = re.findall(r"^(\s*1\s+.+)$", self.fileStr, re.MULTILINE)
-        else:
-            # Added by Francisco to speed up filtering on June 4th, 2019
-            # get rid of phase factors
-            self.spd = re.findall(r"ion.+tot\n([-.\d\seto]+)", self.fileStr)
-            self.spd = "".join(self.spd)
-            self.spd = re.findall(r"([-.\d\se]+tot.+)\n", self.spd)
-        # free the memory (could be a lot)
-        self.fileStr = None
-        self.log.debug("the first entry is \n" + self.spd[0])
-
         # Now the method will try to find the value of self.ispin,
         # previously it was set to either 1 or 2. If "1", it could be 1 or
         # 4, but previously it was impossible to find the rigth value. If
         # "2" it has to macth with the number of entries of spd data.
 
-        self.log.debug("Number of entries found: " + str(len(self.spd)))
-        expected = self.bandsCount * self.kpointsCount
-        self.log.debug(
-            "The number of entries for a non magnetic calc. is: " + str(expected)
-        )
-        if expected == len(self.spd):
-            self.log.info("Both numbers match, ok, going ahead")
+        self.log.debug("Number of blocks per band found: " + str(reader.nblocks))
+        if reader.nblocks == 1:
+            self.log.info("One block per band, ok, going ahead")
         # catching a non-collinear calc.
-        elif expected * 4 == len(self.spd):
+        elif reader.nblocks == 4:
             self.log.info("non-collinear calculation found")
             # testing if previous ispin value is ok
             if self.ispin != 1:
@@ -381,50 +317,12 @@ class ProcarParser:
             self.log.info("KpointsCount: " + str(self.kpointsCount))
             raise RuntimeError("Shit happens")
 
-        # checking for consistency
-        for line in self.spd:
-            if len(line.split()) != (self.ionsCount) * (self.orbitalCount + 1):
-                self.log.error(
-                    "Expected: "
-                    + str(self.ionsCount)
-                    + "*"
-                    + str(self.orbitalCount + 1)
-                    + " = "
-                    + str((self.ionsCount) * (self.orbitalCount + 1))
-                    + " Fields. Present block: "
-                    + str(len(line.split()))
-                )
-                raise RuntimeError("Flats happens")
-
-        # replacing the "tot" string by a number, to allows a conversion
-        # to numpy
-        self.spd = [x.replace("tot", "0") for x in self.spd]
-        self.spd = [x.split() for x in self.spd]
-        self.spd = np.array(self.spd, dtype=float)
-        self.log.debug("The spd (old) array shape is:" + str(self.spd.shape))
-
         # handling collinear polarized case
         if self.ispin == 2:
             self.log.debug("Handling spin-polarized collinear case...")
-            # splitting both spin components, now they are along k-points
-            # axis (1st axis) but, then should be concatenated along the
-            # bands.
-            up, down = np.vsplit(self.spd, 2)
-            # ispin = 1 for a while, we will made the distinction
-            up.shape = (
-                self.kpointsCount,
-                int(self.bandsCount / 2),
-                1,
-                self.ionsCount,
-                self.orbitalCount + 1,
-            )
-            down.shape = (
-                self.kpointsCount,
-                int(self.bandsCount / 2),
-                1,
-                self.ionsCount,
-                self.orbitalCount + 1,
-            )
+            # both spin components are (kpoints, bands, 1, ions, orbitals)
+            # blocks, they should be concatenated along the bands.
+            up, down = reader.spd
             # concatenating bandwise. Density and magntization, their
             # meaning is obvious, and do uses 2 times more memory than
             # required, but I *WANT* to keep it as close as possible to the
@@ -435,25 +333,31 @@ class ProcarParser:
             self.spd = np.concatenate((density, magnet), axis=2)
             self.log.debug("polarized collinear spd.shape= " + str(self.spd.shape))
 
-        # otherwise, just a reshaping suffices
+        # otherwise, the array already has the right shape
         else:
-            self.spd.shape = (
-                self.kpointsCount,
-                self.bandsCount,
-                self.ispin,
-                self.ionsCount,
-                self.orbitalCount + 1,
-            )
+            self.spd = reader.spd[0]
 
         self.log.info("spd array ready. Its shape is:" + str(self.spd.shape))
         return
 
-    def readFile(self, procar=None, phase=False, permissive=False, recLattice=None):
+    def readFile(
+        self,
+        procar=None,
+        phase=False,
+        permissive=False,
+        recLattice=None,
+        cache=True,
+        repair=False,
+        bands=None,
+    ):
         """Reads and parses the whole PROCAR file. This method is a sort
     of metamethod: it opens the file, reads the meta data and call the
     respective functions for parsing kpoints, bands, and projected
     data.
 
+    The file is read in a single streaming pass, it is never loaded
+    in memory as a whole.
+
     Args:
 
     -procar: The file name, if `None` or a directory, a suitable set
@@ -471,6 +375,22 @@ class ProcarParser:
      kpoints will be converted from direct coordinates to cartesian
      ones. Default=None
 
+    -cache: load the parsed data from a binary cache stored next to the
+     PROCAR (`PROCAR.procar.cache.npz`) if it is up to date with the
+     file, otherwise the PROCAR is parsed and the cache written.
+     Default=True
+
+    -repair: fix the known problems of the fixed format of the PROCAR
+     (stupid fortran) while reading. Only the broken lines are modified
+     and the file itself is never rewritten. Default=False
+
+    -bands: list of bands (0-based, spin down bands follow the spin up
+     ones as in `self.bands`) to read, the rest of the file is
+     skipped. `self.bands` and `self.spd` only hold these bands, in
+     the given order. For uncompressed files only the blocks of these
+     bands are read, using a byte-offset index of the file stored
+     next to it (`PROCAR.index.cache.npz`). Default=None (all bands)
+
     """
         self.log.debug("readFile...")
 
@@ -478,15 +398,39 @@ class ProcarParser:
 
         self.log.debug("Opening file: '" + str(procar) + "'")
         f = self.utils.OpenFile(procar)
-        # Line 1: PROCAR lm decomposed
-        f.readline()  # throwaway
+        columns = None
+        reader = None
+        if bands is not None:
+            try:
+                index = ProcarIndex(f.name, cache=cache)
+            except (ValueError, RuntimeError, OSError) as e:
+                self.log.info("Reading the whole file: " + str(e))
+            else:
+                # the same bands are read from every spin block, the
+                # requested ones are picked once they are joined
+                nbands = index.bandsCount
+                if max(bands) >= index.nsets * nbands:
+                    raise ValueError("Band index out of range: " + str(max(bands)))
+                selected = sorted(set(x % nbands for x in bands))
+                columns = [
+                    (x // nbands) * len(selected) + selected.index(x % nbands)
+                    for x in bands
+                ]
+                reader = index.read(bands=selected, repair=repair)
+        if reader is None:
+            reader = read_procar(f, repair=repair, cache=cache)
+            columns = bands
+        f.close()
+        if reader.repaired_lines != 0:
+            self.log.warning(
+                str(reader.repaired_lines) + " broken lines repaired while reading"
+            )
+
         # Line 2: # of k-points:  816   # of bands:  52   # of ions:   8
-        metaLine = f.readline()  # metadata
-        self.log.debug("The metadata line is: " + metaLine)
-        re.findall(r"#[^:]+:([^#]+)", metaLine)
-        self.kpointsCount, self.bandsCount, self.ionsCount = map(
-            int, re.findall(r"#[^:]+:([^#]+)", metaLine)
-        )
+        self.log.debug("The metadata line is: " + reader.meta_lines[-1])
+        self.kpointsCount = reader.kpointsCount
+        self.bandsCount = reader.bandsCount
+        self.ionsCount = reader.ionsCount
         self.log.info("kpointsCount = " + str(self.kpointsCount))
         self.log.info("bandsCount = " + str(self.bandsCount))
         self.log.info("ionsCount = " + str(self.ionsCount))
@@ -495,14 +439,16 @@ class ProcarParser:
                 "Special case: only one atom found. The program may not work as expected"
             )
         else:
-            self.log.debug("An extra ion representing the  total value will be added")
-            self.ionsCount = self.ionsCount + 1
-
-        # reading all the rest of the file to be parsed below
-        self.fileStr = f.read()
-        self._readKpoints(permissive)
-        self._readBands()
-        self._readOrbital()
+            self.log.debug("An extra ion representing the  total value was added")
+
+        self._readKpoints(reader, permissive)
+        self._readBands(reader)
+        self._readOrbital(reader)
+        if columns is not None:
+            self.bands = self.bands[:, columns]
+            self.spd = self.spd[:, columns]
+            self.bandsCount = len(columns)
+            self.log.info("Bands selected, bands shape: " + str(self.bands.shape))
         self.log.debug("readfile...done")
         return
 
@@ -10,14 +10,31 @@ Created on Sunday, May 24th
 @author: Logan Lang
 """
 
-from re import findall
+from concurrent.futures import ThreadPoolExecutor
+from re import compile, findall
 
-from numpy import array, dot, zeros, add, delete, append, arange, pi
+from numpy import array, dot, zeros, add, delete, append, arange, pi, loadtxt
 from pyprocar.core import DensityOfStates, Structure
 
 import logging
 import os
 
+# Columns of the projected arrays (see project_labels) of the orbitals of
+# a pdos file, in the order of the file: pz, px, py for p and dz2, dzx,
+# dzy, dx2-y2, dxy for d
+_PDOS_COLUMNS = {"s": [1], "p": [3, 4, 2], "d": [7, 8, 6, 9, 5]}
+# Atom number and orbital of a pdos file, e.g. prefix.pdos_atm#1(Si)_wfc#2(p)
+_PDOS_ATOM = compile(r"#(\d*)")
+_PDOS_ORBITAL = compile(r"wfc#\d*\((\S)\)")
+
+
+def _read_pdos(filename):
+    """
+    Reads the numeric table of a projwfc dos file (pdos_tot or
+    pdos_atm#..), the header line is a comment
+    """
+    return loadtxt(filename, ndmin=2)
+
 
 class QEDOSParser:
     def __init__(
@@ -206,30 +223,15 @@ class QEDOSParser:
         Returns the projected DOS as a multi-dimentional array, to be used in the
         pyprocar.core.dos object
         """
-        ret = []
-        dos_projected, info = self._get_dos_projected()
-        if dos_projected is None:
+        if 'projected' not in self.data:
+            print(
+                "This calculation does not include partial density of states")
             return None
-        norbitals = len(info) - 1
-        info[0] = info[0].capitalize()
-        labels = []
-        labels.append(info[0])
-        ret = []
-     
-        for iatom in dos_projected:
-            temp_atom = []
-            for iorbital in range(norbitals):
-                temp_spin = []
-                for key in dos_projected[iatom]:
-                    
-                    if key == 'energies':
-                        continue
-                    temp_spin.append(dos_projected[iatom][key][:, iorbital])
-                temp_atom.append(temp_spin)
-            ret.append([temp_atom])
-        return ret   
-    
-    
+        nspin = 2 if self.is_spin_polarized else 1
+        # [iatom][ienergy][icolumn][ispin] -> [iatom][iorbital][ispin][ienergy]
+        projected = self.data['projected'][:, :, 1:, :nspin].transpose(0, 2, 3, 1)
+        return projected[:, None].copy()
+
 #     ###########################################################################
 #     # This section parses for the projected density of states and puts it in a 
 #     # Pychemia Density of States Object
@@ -402,6 +404,9 @@ class QEDOSParser:
         # )[0]
         
         raw_ions = findall( "\s*Cartesian\saxes.*\n.*\n.*\n" + self.ionsCount * "(.*)\n", self.scfOut)[0]
+        if self.ionsCount == 1:
+            # findall returns the only group as a string
+            raw_ions = [raw_ions]
         self.ions = [x.split()[1] for x in raw_ions]
         
         
@@ -496,10 +501,8 @@ class QEDOSParser:
     def parse_pdos(self):
         
         
-        rf = open(self.filpdos+'.pdos_tot')
-        data = rf.readlines()
-        rf.close()
-        
+        total_dos = _read_pdos(self.filpdos + ".pdos_tot")
+
         ###################################################################
         # Getting k point weights
         ###################################################################
@@ -511,132 +514,39 @@ class QEDOSParser:
 
         ###################################################################   
         ####################################################################
-        
-        iline = 0
-        header = [str(x) for x in data[iline].split()[2:]]
-
-        if(self.spinCalc == True):
-            header.pop(1)
-            header.pop(1)
-
-        else:
-            header.pop(1)
-        header[0] = "Energy"
-        if(self.spinCalc == True):
-            header[1] = "Dos-up"
-            header[2] = "Dos-down"
-        else:
-            header[1] = "Dos"
-            
-        iline += 1
-        
-        ndos= len(data)-1
 
-        total_dos = [[float(x) for x in y.split()[0:]] for y in data[iline:iline + ndos]]
-
-        # self.test = total_dos
-        # total_dos = delete(total_dos,1,1)
-        # total_dos = delete(total_dos,1,1)
         if(self.spinCalc == True):
-             total_dos = delete(total_dos,1,1)
-             total_dos = delete(total_dos,1,1)
+             total_dos = delete(total_dos,[1,2],1)
         else:
              total_dos = delete(total_dos,1,1)
         # ###################################################################################
-        tmp_dict ={}        
-       
         for filename in self.file_names:
             if not os.path.isfile(filename):
                 raise ValueError('ERROR: DOSCAR file not found')
-                
-            rf = open(filename)
-            data = rf.readlines()
-            rf.close()
-    
-    
-
-    
-            atmNum = findall("#(\d*)",filename)[0]
-            atmName = findall("atm#\d*\(([a-zA-Z0-9]*)\)",filename)[0]
-            orbitalName = findall("wfc#\d*\((\S)\)",filename)[0]
-            
-            atmNumName = 'ion' + atmNum
-            if atmNumName not in list(tmp_dict.keys()):
-                tmp_dict[atmNumName] = zeros(shape=[len(total_dos[:,0]),10,2])
-            # if atmName not in list(tmp_dict.keys()):
-            #     tmp_dict[atmName] = zeros(shape=[len(total_dos[:,0]),10,2])
-    
-            iline = 0
-            
-              # Skipping the first lines of header
-            iline += 1
-         
-           
-            
-            final_dos = [[float(x) for x in y.split()[0:]] for y in data[iline:iline + ndos]]
-            iline += 1 
-            iline += ndos
-
-            final_labels = data[0].split()
 
-            final_labels.pop(0)
-
-            final_labels.pop(1)
-            final_labels.pop(1)
-            final_labels.pop(1)
-
-            # final_dos = delete(final_dos,1,1)
-            # final_dos = delete(final_dos,1,1)
-            
-            
-            # dos = zeros(shape=[len(final_dos[:,0]),10,2])
-            
-            if self.is_spin_polarized == False:
-                final_dos = delete(final_dos,1,1)
-                dos = zeros(shape=[len(final_dos[:,0]),10,2])
-            
-                
-                dos[:,0,0] = final_dos[:,0]
-                if 's' == orbitalName:
-                    dos[:,1,0] = final_dos[:,1]
-                elif 'p' == orbitalName:
-                    dos[:,2:5,0] = final_dos[:,1:]
-                elif 'd' == orbitalName:
-                    dos[:,5:10,0] = final_dos[:,1:]
-            else:
-                final_dos = delete(final_dos,1,1)
-                final_dos = delete(final_dos,1,1)
-                dos = zeros(shape=[len(final_dos[:,0]),10,2])
-            
-           
-                dos[:,0,0] = final_dos[:,0]
-                dos[:,0,1] = final_dos[:,0]
-                if 's' == orbitalName:
-                    dos[:,1,0] = final_dos[:,1]
-                    dos[:,1,1] = final_dos[:,2]
-                elif 'p' == orbitalName:
-                    dos[:,2:5,0] = final_dos[:,1::2]
-                    dos[:,2:5,1] = final_dos[:,2::2]
-                elif 'd' == orbitalName:
-                    dos[:,5:10,0] = final_dos[:,1::2]
-                    dos[:,5:10,1] = final_dos[:,2::2]
-            # tmp_dict[atmName] += dos
-            tmp_dict[atmNumName] += dos
-           
-        projected_dos = []
-        for name in list(tmp_dict.keys()):
-            for ispin in range(2):
-                tmp_dict[name][:,0,ispin] = final_dos[:,0]
-                tmp_dict[name][:,[2,3],ispin] = tmp_dict[name][:,[3,2],ispin]
-                tmp_dict[name][:,[2,4],ispin] = tmp_dict[name][:,[4,2],ispin]
-                
-                tmp_dict[name][:,[5,9],ispin] = tmp_dict[name][:,[9,5],ispin]
-                tmp_dict[name][:,[6,7],ispin] = tmp_dict[name][:,[7,6],ispin]
-                tmp_dict[name][:,[7,9],ispin] = tmp_dict[name][:,[9,7],ispin]
-                tmp_dict[name][:,[8,9],ispin] = tmp_dict[name][:,[9,8],ispin]
-
-            projected_dos.append(tmp_dict[name])
-            
+        # The pdos files are read concurrently and added to one array
+        # projected[iatom, ienergy, icolumn, ispin], the column 0 being the
+        # energies. There are no columns for the f orbitals.
+        nspin = 2 if self.is_spin_polarized else 1
+        file_names = [
+            x for x in self.file_names
+            if _PDOS_ORBITAL.findall(x)[0] in _PDOS_COLUMNS
+        ]
+        projected_dos = zeros(shape=(self.ionsCount, len(total_dos), 10, 2))
+        with ThreadPoolExecutor() as executor:
+            tables = executor.map(_read_pdos, file_names)
+            for filename, final_dos in zip(file_names, tables):
+                atmNum = int(_PDOS_ATOM.findall(filename)[0])
+                orbitalName = _PDOS_ORBITAL.findall(filename)[0]
+                # skipping the energies and ldos columns, up and down
+                # alternate in spin polarized calculations
+                final_dos = final_dos[:len(total_dos), 1 + nspin:]
+                columns = _PDOS_COLUMNS[orbitalName]
+                for ispin in range(nspin):
+                    projected_dos[atmNum - 1][:, columns, ispin] += final_dos[
+                        :, ispin::nspin
+                    ]
+        projected_dos[:, :, 0, :] = total_dos[:, 0, None]
 
         project_labels = ['energies','s','p_y', 'p_z','p_x', 'd_xy', 'd_zy', 'd_z^2', 'd_zx','d_x^2-y^2']
         return {'total': total_dos,'projected': projected_dos, 'projected_labels_info':project_labels, 'ions': self.species_list}
@@ -5,9 +5,23 @@ Created on Sunday, May 24th
 
 from re import findall, search, match, DOTALL, MULTILINE, finditer, compile
 
-from numpy import array, dot, linspace, sum, where, zeros, pi
+from numpy import add, array, dot, full, linspace, sum, where, zeros, pi
 import logging
 
+# Tokens of the projwfc output (kpdos.out) in the order they appear: the
+# atomic states, then for every k-point its header and for every band its
+# energy and the terms of psi. The last group of each alternative tells
+# which one matched.
+_KPDOS_TOKENS = compile(
+    r"state #\s*(\d+): atom\s*(\d+) \(([^)]*)\), wfc\s*(\d+) \(l=\s*(\d+) m=\s*(\d+)\)"
+    r"|^\s*k =(.*)$"
+    r"|==== e\(\s*(\d+)\) =\s*([-.\d]+)"
+    r"|([-.\d]+)\*\[#\s*(\d+)\]"
+    r"|(Lowdin Charges)",
+    MULTILINE,
+)
+_STATE, _KPOINT, _ENERGY, _TERM, _END = 6, 7, 9, 11, 12
+
 
 class QEParser:
     def __init__(
@@ -207,299 +221,19 @@ class QEParser:
                         self.composition[raw_ions[ions].split()[0]] += 1
 
         #######################################################################
-        # Reading the kpdos.out for outputfile labels
+        # Reading the kpdos.out
         #######################################################################
         rf = open(self.kfin.split(".")[0] + ".out", "r")
         kpdosout = rf.read()
         rf.close()
 
-        # The following lines get the number of states in kpdos.out and stores them in a list, in which their information is stored in a dictionary
-        raw_natomwfc = findall(
-            r"(?<=\(read from pseudopotential files\)\:)[\s\S]*?(?=k)", kpdosout
-        )[0]
-
-        natomwfc = len(findall("state[\s#]*(\d*)", raw_natomwfc))
-
-        raw_wfc = findall(
-            "\(read from pseudopotential files\)\:.*\n\n\s*" + natomwfc * "(.*)\n",
-            kpdosout,
-        )[0]
-
-        raw_states = []
-
-        states_list = []
-        state_dict = {}
-
-        # Read in raw states
-        for state in raw_wfc:
-            # print(state)
-
-            state_index = int(state.split("#")[1].split(":")[0])
-            atom_index = int(state.split("atom")[1].split("(")[0])
-            atom_name = str(state.split("(")[1].split(")")[0])
-            wfc_index = int(state.split("wfc")[1].split("(")[0])
-            l_index = int(state.split("wfc")[1].split("l=")[1].split("m=")[0])
-            m_index = int(state.split("wfc")[1].split("m=")[1].split(")")[0])
-
-            append = [state_index, atom_index, atom_name, wfc_index, l_index, m_index]
-            # append = (findall("state #\s*([0-9]+):\s*atom\s*([0-9]+)\s*\((.*)\s\),\s*wfc\s*([0-9]+)\s\(l=\s*([0-9]+)\s*m=\s*([0-9]+)\)", state)[0])
-            # print(append)
-            raw_states.append(append)
-            # int(state.split('#')[1].split(':')[0])
-            # findall("state #\s*([0-9]*):\s*atom\s*([0-9]*)\s*\((.*)\s\),\s*wfc\s*([0-9]*)\s\(l=\s*([0-9])\s*m=\s*([0-9])\)", state)[0])
-        # )
-
-        # print(raw_states)
-        for state in raw_states:
-            state_dict = {}
-            state_dict = {
-                "state_num": int(state[0]),
-                "species_num": int(state[1]),
-                "specie": state[2],
-                "atm_wfc": int(state[3]),
-                "l": int(state[4]),
-                "m": int(state[5]),
-            }
-            states_list.append(state_dict)
-
-        self.states = states_list
-
-        """
-        This section was used to parse those extra files we discussed. It is not needed, I kept it just incase
-        output_prefix = findall("filpdos\s*=\s*'(.*)'", self.kpdosIn)[0]
-         kpdos_files=[]
-        atmNum = list(range(1, self.ionsCount+1))
-        wfc_file_label = []
-        atm_file_label = []
-        states_dict ={}
-        #Find unique raw file labels
-        for state1 in raw_states:
-            wfc_file_label.append((state1[3],state1[4])) if (state1[3],state1[4]) not in wfc_file_label else None
-            atm_file_label.append((state1[1],state1[2])) if (state1[1],state1[2]) not in atm_file_label else None
-        #Combine raw file labels inside a tuple
-        for atm in atm_file_label:
-            for wfc in wfc_file_label:
-                file = (int(atm[0]),atm[1],int(wfc[0]),int(wfc[1]))
-                kpdos_files.append(file)
-                file = None
-        #Convert raw file labels to final file string
-        for file in kpdos_files:
-            if(file[3] == 0 ):
-                self.file_names.append(output_prefix + ".pdos_atm#" + str(file[0]) + "(" + file[1] + ")_wfc#" + str(file[2]) +  "(s)")
-            elif (file[3] == 1 ):
-                self.file_names.append(output_prefix + ".pdos_atm#" + str(file[0]) + "(" + file[1] + ")_wfc#" + str(file[2]) +  "(p)")
-            elif (file[3] == 2 ):
-                self.file_names.append(output_prefix + ".pdos_atm#" + str(file[0]) + "(" + file[1] + ")_wfc#" + str(file[2]) +  "(d)")
-            elif (file[3] == 3 ):
-                self.file_names.append(output_prefix + ".pdos_atm#" + str(file[0]) + "(" + file[1] + ")_wfc#" + str(file[2]) +  "(f)")"""
-
-        #######################################################################
-        # Finds kpoints in kpdosout file. They are the k points in the reciprocal space
-        #######################################################################
-
-        raw_kpoints = []
-        if spinCalc == True:
-
-            self.kpointsCount = int(
-                len(findall("k\s*=\s*(.*)\s*(.*)\s*(.*)", kpdosout)) / 2
-            )
-            for k in range(len(findall("k\s*=\s*(.*)\s*(.*)\s*(.*)", kpdosout))):
-                if k < self.kpointsCount:
-                    raw_kpoints.append(
-                        findall("k\s*=\s*(.*)\s*(.*)\s*(.*)", kpdosout)[k][0]
-                    )
-            totK = len(findall("k\s*=\s*(.*)\s*(.*)\s*(.*)", kpdosout))
-        else:
-            for k in range(len(findall("k\s*=\s*(.*)\s*(.*)\s*(.*)", kpdosout))):
-                raw_kpoints.append(
-                    findall("k\s*=\s*(.*)\s*(.*)\s*(.*)", kpdosout)[k][0]
-                )
-            self.kpointsCount = len(raw_kpoints)
-
-        self.kpoints = zeros(shape=(self.kpointsCount, 3))
-        for ik in range(len(raw_kpoints)):
-            for coord in range(3):
-                self.kpoints[ik][coord] = raw_kpoints[ik].split()[coord]
+        self._readKpdosOut(kpdosout, spinCalc)
 
         # If kdirect=False, then the kgrid will be in cartesian coordinates.
         # Requires the reciprocal lattice vectors to be parsed from the output.
         if not self.kdirect:
             self.kpoints = dot(self.kpoints, self.reclat)
 
-        #######################################################################
-        # Finds the band count and makes a band array
-        #######################################################################
-
-        band_info = findall(r"====\se\(\s*(\d+)\)\s=\s*([-.\d]+)", kpdosout)
-
-        if spinCalc == True:
-            self.bandsCount = int(len(band_info) / totK)
-            self.bands = zeros(shape=(self.kpointsCount, self.bandsCount, 2))
-            ik = 0
-            for band in range(len(band_info)):
-                if ik < self.kpointsCount:
-                    self.bands[ik, int(band_info[band][0]) - 1, 0] = float(
-                        band_info[band][1]
-                    )
-                else:
-                    self.bands[
-                        ik - self.kpointsCount, int(band_info[band][0]) - 1, 1
-                    ] = float(band_info[band][1])
-                if int(band_info[band][0]) == self.bandsCount:
-                    ik += 1
-        else:
-            self.bandsCount = int(len(band_info) / self.kpointsCount)
-            self.bands = zeros(shape=(self.kpointsCount, self.bandsCount))
-            ik = 0
-            for band in range(len(band_info)):
-                self.bands[ik, int(band_info[band][0]) - 1] = float(band_info[band][1])
-                if int(band_info[band][0]) == self.bandsCount:
-                    ik += 1
-
-        #######################################################################
-        # Filling the spd array
-        #######################################################################
-        if spinCalc == True:
-            spinCount = 2
-        else:
-            spinCount = 1
-        k_info = None
-        self.orbitalCount = len(self.orbitals)
-        self.spd = zeros(
-            shape=(
-                self.kpointsCount,
-                self.bandsCount,
-                spinCount,
-                self.ionsCount + 1,
-                len(self.orbitals) + 2,
-            )
-        )
-
-        k_string = findall(r"\s?k =[\s-]{3}?.+", kpdosout)
-
-        """First loop goes through the kpoints and matches band information that follows the specific k point. The if else statment is used to catch unique cases, namely the end of the kpoints
-            Also sometimes there is a duplicate final k point so findall is used twice to deal with this case
-            Second loop goes through band information of a kpoint.The if else statments here again catches unique cases. This is when it hits the last the band or when it is the last band and the last kpoint
-            The other if else statement here catches the cases when there are no contributions at all and would return nothing
-            Third loop parses the projections of a band
-            The fourth loop then goes through the known possible states. The if statment ensures the there is a projection and matchs a projection to a known state.
-            The fifth loop then goes throguh the known possible orbitals. The if statment then matches the projection with a specific orbital.
-            Finally the projection is put into the spd array
-        """
-
-        for kp in range(len(k_string)):
-            if kp == len(k_string) - 1:
-                expression = "(?<=" + k_string[kp] + ")[\s\S]*?(?=Lowdin Charges:)"
-
-                expression_final_k = "(?<=" + k_string[kp - 1] + ")[\s\S]*?(?=$)"
-
-                k_info1 = findall(expression_final_k, kpdosout)[0]
-
-                k_info = findall(expression, k_info1)[0]
-            else:
-                expression = (
-                    "(?<=" + k_string[kp] + ")[\s\S]*?(?=" + k_string[kp + 1] + ")"
-                )
-                # print(expression)
-                k_info = findall(expression, kpdosout)[0]
-                # print(k_info)
-                # print(k_info)
-                # print(self.bandsCount)
-            for iband in range(self.bandsCount):
-                if iband == self.bandsCount - 1 and kp == len(k_string) - 1:
-                    # print("hi")
-                    expression2 = "==== e\(\s*" + str(iband + 1) + "\)[\s\S]*?(?=$)"
-                    # print(k_info)
-                    iband_proj = findall(expression2, k_info)[0]
-                    # print(iband_proj)
-                elif iband == self.bandsCount - 1:
-                    expression2 = "==== e\(\s*" + str(iband + 1) + "\).*\n([\s\S]*)"
-                    iband_proj = findall(expression2, k_info)[0]
-
-                else:
-                    # print("hi")
-                    expression2 = (
-                        "==== e\(\s*"
-                        + str(iband + 1)
-                        + "\)[\s\S]*?(?===== e\(\s*"
-                        + str(iband + 2)
-                        + "\))"
-                    )
-                    iband_proj = findall(expression2, k_info)[0]
-                    # print(iband_proj)
-                expression3 = "(?<=psi = )[\s\S]*?(?=\s*\|psi\|\^2)"
-                wfc = None
-
-                if len(findall(expression3, iband_proj)) == 0:
-                    pass
-                else:
-                    wfc = findall(expression3, iband_proj)[0]
-                    # print(wfc)
-                    state_proj = wfc.split("+")
-
-                    for proj in state_proj:
-                        for known_states in self.states:
-                            if (
-                                len(findall("#\s*([0-9]*)", proj)) != 0
-                                and int(findall("#\s*([0-9]*)", proj)[0])
-                                == known_states["state_num"]
-                            ):
-                                for iorbitals in range(len(self.orbitals)):
-                                    if (
-                                        known_states["l"]
-                                        == self.orbitals[iorbitals]["l"]
-                                        and known_states["m"]
-                                        == self.orbitals[iorbitals]["m"]
-                                    ):
-                                        if spinCalc == True:
-                                            if kp < self.kpointsCount:
-                                                # print(known_states["species_num"])
-                                                self.spd[
-                                                    kp,
-                                                    iband,
-                                                    0,
-                                                    known_states["species_num"] - 1,
-                                                    iorbitals + 1,
-                                                ] += float(proj.split("*")[0])
-                                                self.spd[
-                                                    kp,
-                                                    iband,
-                                                    0,
-                                                    known_states["species_num"] - 1,
-                                                    0,
-                                                ] = known_states["species_num"]
-                                            else:
-                                                self.spd[
-                                                    kp - self.kpointsCount,
-                                                    iband,
-                                                    1,
-                                                    known_states["species_num"] - 1,
-                                                    iorbitals + 1,
-                                                ] += float(proj.split("*")[0])
-                                                self.spd[
-                                                    kp - self.kpointsCount,
-                                                    iband,
-                                                    1,
-                                                    known_states["species_num"] - 1,
-                                                    0,
-                                                ] = known_states["species_num"]
-
-                                        else:
-                                            self.spd[
-                                                kp,
-                                                iband,
-                                                0,
-                                                known_states["species_num"] - 1,
-                                                iorbitals + 1,
-                                            ] += float(proj.split("*")[0])
-                                            self.spd[
-                                                kp,
-                                                iband,
-                                                0,
-                                                known_states["species_num"] - 1,
-                                                0,
-                                            ] = known_states["species_num"]
-
         for ions in range(self.ionsCount):
             self.spd[:, :, :, ions, 0] = ions + 1
 
@@ -525,7 +259,7 @@ class QEParser:
                 shape=(
                     self.kpointsCount,
                     self.bandsCount * 2,
-                    spinCount,
+                    2,
                     self.ionsCount + 1,
                     len(self.orbitals) + 2,
                 )
@@ -550,6 +284,130 @@ class QEParser:
                 self.kpointsCount, self.bandsCount * 2, order="F"
             )
 
+    def _readKpdosOut(self, kpdosout, spinCalc):
+        """
+        Reads the atomic states, kpoints, bands and projections of the
+        projwfc output with a single pass of the _KPDOS_TOKENS tokenizer.
+        The terms of psi are stored as flat arrays and added to the spd
+        array at once, every state being mapped to its (atom, orbital)
+        with index arrays.
+        """
+        self.states = []
+        raw_kpoints = []
+        # kpoint (token) index, band number and energy of every band
+        band_kpoint = []
+        band_number = []
+        band_energy = []
+        # band (index in the lists above), state number and weight of every
+        # term of psi
+        term_band = []
+        term_state = []
+        term_weight = []
+
+        for token in _KPDOS_TOKENS.finditer(kpdosout):
+            kind = token.lastindex
+            if kind == _TERM:
+                term_band.append(len(band_energy) - 1)
+                term_weight.append(token.group(10))
+                term_state.append(token.group(11))
+            elif kind == _ENERGY:
+                band_kpoint.append(len(raw_kpoints) - 1)
+                band_number.append(token.group(8))
+                band_energy.append(token.group(9))
+            elif kind == _KPOINT:
+                raw_kpoints.append(token.group(7))
+            elif kind == _STATE:
+                state = token.groups()[:6]
+                self.states.append(
+                    {
+                        "state_num": int(state[0]),
+                        "species_num": int(state[1]),
+                        "specie": state[2],
+                        "atm_wfc": int(state[3]),
+                        "l": int(state[4]),
+                        "m": int(state[5]),
+                    }
+                )
+            else:
+                break
+
+        #######################################################################
+        # Kpoints, for spin polarized calculations the spin down kpoints
+        # follow the spin up ones
+        #######################################################################
+        spinCount = 2 if spinCalc else 1
+        totK = len(raw_kpoints)
+        self.kpointsCount = int(totK / spinCount)
+        self.kpoints = zeros(shape=(self.kpointsCount, 3))
+        for ik in range(self.kpointsCount):
+            self.kpoints[ik] = [
+                float(x) for x in findall(r"-?\d+\.\d+", raw_kpoints[ik])[:3]
+            ]
+
+        #######################################################################
+        # Bands
+        #######################################################################
+        band_kpoint = array(band_kpoint, dtype=int)
+        band_number = array(band_number, dtype=int) - 1
+        band_spin = band_kpoint // self.kpointsCount
+        band_kpoint = band_kpoint % self.kpointsCount
+        self.bandsCount = int(len(band_energy) / totK)
+        if spinCalc:
+            self.bands = zeros(shape=(self.kpointsCount, self.bandsCount, 2))
+            self.bands[band_kpoint, band_number, band_spin] = array(
+                band_energy, dtype=float
+            )
+        else:
+            self.bands = zeros(shape=(self.kpointsCount, self.bandsCount))
+            self.bands[band_kpoint, band_number] = array(band_energy, dtype=float)
+
+        #######################################################################
+        # Filling the spd array
+        #######################################################################
+        self.orbitalCount = len(self.orbitals)
+        self.spd = zeros(
+            shape=(
+                self.kpointsCount,
+                self.bandsCount,
+                spinCount,
+                self.ionsCount + 1,
+                len(self.orbitals) + 2,
+            )
+        )
+
+        # atom and spd column of every state, -1 for the orbitals (f) that
+        # are not in self.orbitals
+        nstates = max([x["state_num"] for x in self.states], default=0) + 1
+        state_atom = zeros(nstates, dtype=int)
+        state_column = full(nstates, -1)
+        for state in self.states:
+            state_atom[state["state_num"]] = state["species_num"] - 1
+            for iorbital, orbital in enumerate(self.orbitals):
+                if state["l"] == orbital["l"] and state["m"] == orbital["m"]:
+                    state_column[state["state_num"]] = iorbital + 1
+
+        term_band = array(term_band, dtype=int)
+        term_state = array(term_state, dtype=int)
+        term_weight = array(term_weight, dtype=float)
+        known = (term_band >= 0) & (term_state < nstates)
+        known[known] = state_column[term_state[known]] >= 0
+        term_band, term_state, term_weight = (
+            term_band[known],
+            term_state[known],
+            term_weight[known],
+        )
+        add.at(
+            self.spd,
+            (
+                band_kpoint[term_band],
+                band_number[term_band],
+                band_spin[term_band],
+                state_atom[term_state],
+                state_column[term_state],
+            ),
+            term_weight,
+        )
+
     @property
     def fermi(self):
         """
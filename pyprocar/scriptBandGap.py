@@ -7,13 +7,13 @@ from .lobsterparser import LobsterParser
 from .utilsprocar import UtilsProcar
 
 
-def getFermi(procar, code, outcar):  # from ScriptsBandPlot made into method
+def getFermi(procar, code, outcar, repair=False):  # from ScriptsBandPlot made into method
     fermi = None
 
     if code == "vasp":
         # Parses through Bands in PROCAR
         procarFile = ProcarParser()
-        procarFile.readFile(procar=procar)
+        procarFile.readFile(procar=procar, repair=repair)
         if outcar:
             outcarparser = UtilsProcar()
             if fermi is None:
@@ -31,7 +31,7 @@ def getFermi(procar, code, outcar):  # from ScriptsBandPlot made into method
 
     elif code == "abinit":
         procarFile = ProcarParser()
-        procarFile.readFile(procar=procar)
+        procarFile.readFile(procar=procar, repair=repair)
         if fermi is None:
             abinitFile = AbinitParser(abinit_output=outcar)
             fermi = abinitFile.fermi
@@ -55,24 +55,18 @@ def getFermi(procar, code, outcar):  # from ScriptsBandPlot made into method
 
 def bandgap(procar=None, outcar=None, code="vasp", fermi=None, repair=True):
 
-    if code == "vasp" or code == "abinit":
-        if repair:
-            repairhandle = UtilsProcar()
-            repairhandle.ProcarRepair(procar, procar)
-            print("PROCAR repaired. Run with repair=False next time.")
-
     bandGap = None
 
     if fermi is None:
-        fermi = getFermi(procar, code, outcar)
+        fermi = getFermi(procar, code, outcar, repair)
 
     if code == "vasp":
         procarFile = ProcarParser()
-        procarFile.readFile(procar=procar)
+        procarFile.readFile(procar=procar, repair=repair)
 
     elif code == "abinit":
         procarFile = ProcarParser()
-        procarFile.readFile(procar=procar)
+        procarFile.readFile(procar=procar, repair=repair)
 
     elif code == "elk":
         procarFile = ElkParser()
@@ -9,7 +9,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 from .doscarplot import DosPlot
-from .vaspxml import VaspXML
+from .io.vasp import VaspXML
 from .lobsterparser import LobsterDOSParser, LobsterParser
 from .qeparser import QEDOSParser, QEParser
 
@@ -78,12 +78,6 @@ def bandsdosplot(
 
     welcome()
 
-    # Repair PROCAR
-    if code == "vasp" or code == "abinit":
-        if repair:
-            repairhandle = UtilsProcar()
-            repairhandle.ProcarRepair(bands_file, bands_file)
-
     fig = plt.figure(figsize=(13, 7), constrained_layout=False)
     widths = [13, 5]
     heights = [9]
@@ -123,8 +117,6 @@ def bandsdosplot(
     # Verbose section
 
     print("Script initiated...")
-    if repair:
-        print("PROCAR repaired. Run with repair=False next time.")
     print("code           : ", code)
     print("bands file     : ", bands_file)
     print("bands mode     : ", bands_mode)
@@ -269,7 +261,10 @@ def bandsdosplot(
     if code == "vasp":
         procarFile = ProcarParser()
         vaspxml = VaspXML(
-            filename=dos_file, dos_interpolation_factor=dos_interpolation_factor
+            filename=dos_file,
+            dos_interpolation_factor=dos_interpolation_factor,
+            # only the density of states and the structures are needed
+            sections=["dos", "structures"],
         )
         dos_plot = DosPlot(dos=vaspxml.dos, structure=vaspxml.structure)
 
@@ -319,9 +314,11 @@ def bandsdosplot(
 
     if code == "vasp":
         if kdirect:
-            procarFile.readFile(bands_file, permissive=False)
+            procarFile.readFile(bands_file, permissive=False, repair=repair)
         else:
-            procarFile.readFile(bands_file, permissive=False, recLattice=recLat)
+            procarFile.readFile(
+                bands_file, permissive=False, recLattice=recLat, repair=repair
+            )
 
     # processing the data, getting an instance of the class that reduces the data
     data = ProcarSelect(procarFile, deepCopy=True, mode=bands_mode)
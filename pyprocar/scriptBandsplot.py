@@ -75,11 +75,6 @@ def bandsplot(
     # that the input makes sense.
     # It is quite long
 
-    if code == "vasp" or code == "abinit":
-        if repair:
-            repairhandle = UtilsProcar()
-            repairhandle.ProcarRepair(procarfile, procarfile)
-
     if atoms is None:
         atoms = [-1]
         if human is True:
@@ -91,8 +86,6 @@ def bandsplot(
     if verbose:
         welcome()
         print("Script initiated...")
-        if repair:
-            print("PROCAR repaired. Run with repair=False next time.")
         print("code           : ", code)
         print("input file     : ", procarfile)
         print("mode           : ", mode)
@@ -322,15 +315,19 @@ def bandsplot(
 
     if code == "vasp":
         if kdirect:
-            procarFile.readFile(procarfile, permissive)
+            procarFile.readFile(procarfile, permissive, repair=repair)
         else:
-            procarFile.readFile(procarfile, permissive, recLattice=recLat)
+            procarFile.readFile(
+                procarfile, permissive, recLattice=recLat, repair=repair
+            )
 
     elif code == "abinit":
         if kdirect:
-            procarFile.readFile(procarfile, permissive)
+            procarFile.readFile(procarfile, permissive, repair=repair)
         else:
-            procarFile.readFile(procarfile, permissive, recLattice=recLat)
+            procarFile.readFile(
+                procarfile, permissive, recLattice=recLat, repair=repair
+            )
 
     # processing the data, getting an instance of the class that reduces the data
     data = ProcarSelect(procarFile, deepCopy=True, mode=mode)
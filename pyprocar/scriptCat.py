@@ -7,6 +7,7 @@ import numpy as np
 from .splash import welcome
 from .utilsprocar import UtilsProcar
 from .abinitparser import AbinitParser
+from .io.procar_merge import concatenate
 
 
 def cat(
@@ -83,11 +84,7 @@ def _mergeparallel(inputfiles=None, outputfile=None, nspin=1, abinit_output=None
         nspin = int(nspin)
 
     if nspin != 2:
-        with open(outputfile, "w") as outfile:
-            for fname in filenames:
-                with open(fname) as infile:
-                    for line in infile:
-                        outfile.write(line)
+        concatenate(filenames, outputfile)
 
     elif nspin == 2:
         # for spin polarized calculations the spin down segments are saved in the
@@ -98,28 +95,18 @@ def _mergeparallel(inputfiles=None, outputfile=None, nspin=1, abinit_output=None
 
         # reading the second line of the header to set as the separating line
         # in the colinear spin PROCAR.
-        fp = open(spinup_list[0], "r")
-        header1 = fp.readline()
-        header2 = fp.readline()
-        fp.close()
+        with open(spinup_list[0], "rb") as fp:
+            header1 = fp.readline()
+            header2 = fp.readline()
 
         # second half of PROCAR files in reverse order.
         spindown_list.reverse()
 
         # Writing new PROCAR with first spin up, header2 and then
         # spin down (reversed).
-        with open(outputfile, "w") as outfile:
-            for spinupfile in spinup_list:
-                with open(spinupfile) as infile:
-                    for line in infile:
-                        outfile.write(line)
-            outfile.write("\n")
-            outfile.write(header2)
-            outfile.write("\n")
-            for spindownfile in spindown_list:
-                with open(spindownfile) as infile:
-                    for line in infile:
-                        outfile.write(line)
+        concatenate(
+            spinup_list + [b"\n" + header2 + b"\n"] + spindown_list, outputfile
+        )
 
 
 def _fixformat(inputfile=None, outputfile=None):
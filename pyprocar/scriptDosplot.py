@@ -5,7 +5,7 @@ Created on May 17 2020
 # from .elkparser import ElkParser
 from .splash import welcome
 from .doscarplot import DosPlot
-from .vaspxml import VaspXML
+from .io.vasp import VaspXML
 from .lobsterparser import LobsterDOSParser
 from .qeparser import QEDOSParser
 
@@ -362,7 +362,10 @@ def dosplot(
 
     if code == "vasp":
         vaspxml = VaspXML(
-            filename=filename, dos_interpolation_factor=interpolation_factor
+            filename=filename,
+            dos_interpolation_factor=interpolation_factor,
+            # only the density of states and the structures are needed
+            sections=["dos", "structures"],
         )
         dos_plot = DosPlot(dos=vaspxml.dos, structure=vaspxml.structure)
         if atoms is None:
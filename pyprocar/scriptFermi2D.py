@@ -42,13 +42,6 @@ def fermi2D(
     # Turn interactive plotting off
     plt.ioff()
 
-    # Repair PROCAR
-    if code == "vasp" or code == "abinit":
-        if repair:
-            repairhandle = UtilsProcar()
-            repairhandle.ProcarRepair(file, file)
-            print("PROCAR repaired. Run with repair=False next time.")
-
     if atoms is None:
         atoms = [-1]
         if human is True:
@@ -100,7 +93,9 @@ def fermi2D(
         # parsing the file
         procarFile = ProcarParser()
         # permissive incompatible with Fermi surfaces
-        procarFile.readFile(file, permissive=False, recLattice=rec_basis)
+        procarFile.readFile(
+            file, permissive=False, recLattice=rec_basis, repair=repair
+        )
 
     elif code == "elk":
         # Reciprocal lattice is obtained from output file
@@ -138,7 +133,9 @@ def fermi2D(
         # parsing the file
         procarFile = ProcarParser()
         # permissive incompatible with Fermi surfaces
-        procarFile.readFile(file, permissive=False, recLattice=rec_basis)
+        procarFile.readFile(
+            file, permissive=False, recLattice=rec_basis, repair=repair
+        )
 
     ### End of parsing ###
 
@@ -6,7 +6,7 @@ import pyvista
 from matplotlib import colors as mpcolors
 from matplotlib import cm
 from .core.surface import boolean_add
-from .fermisurface3d import FermiSurface3D
+from .fermisurface3d import FermiSurface3D, FermiSurfaceSweep, crossing_bands
 from .splash import welcome
 from .utilsprocar import UtilsProcar
 from .procarparser import ProcarParser
@@ -70,6 +70,7 @@ def fermi3D(
     widget=False,
     show=True,
     repair=True,
+    nthreads=1,
 ):
     """
     Parameters
@@ -289,6 +290,10 @@ def fermi3D(
         .. todo::
     show : bool, optional (default ``True``)
         If set to ``False`` it will not show the 3D plot.
+    nthreads : int, optional (default ``1``)
+        Number of threads used to extract the surfaces of the different
+        bands (or, with ``iso_slider``, energies) at the same time.
+        e.g. ``nthreads=4``
     Returns
     -------
     s : pyprocar surface object
@@ -301,12 +306,6 @@ def fermi3D(
     ##########################################################################
     # Code dependencies
     ##########################################################################
-    if code == "vasp" or code == "abinit":
-        if repair:
-            repairhandle = UtilsProcar()
-            repairhandle.ProcarRepair(procar, procar)
-            print("PROCAR repaired. Run with repair=False next time.")
-
     if show:
         p = pyvista.Plotter()
 
@@ -318,12 +317,14 @@ def fermi3D(
             e_fermi = fermi
         reciprocal_lattice = outcarparser.RecLatOutcar(outcar)
         procarFile = ProcarParser()
-        procarFile.readFile(procar, False)
+        # only the requested bands are loaded
+        procarFile.readFile(procar, False, repair=repair, bands=bands)
         data = ProcarSelect(procarFile, deepCopy=True)
 
     elif code == "abinit":
         procarFile = ProcarParser()
-        procarFile.readFile(procar, False)
+        # only the requested bands are loaded
+        procarFile.readFile(procar, False, repair=repair, bands=bands)
         abinitFile = AbinitParser(abinit_output=abinit_output)
         if fermi is None:
             e_fermi = abinitFile.fermi
@@ -372,8 +373,24 @@ def fermi3D(
 
 
     band_numbers = bands
-    if band_numbers is None:
+    # PROCARs are read with only the requested bands, their columns are
+    # used for the indexing and the requested numbers as the labels
+    if band_numbers is None or code in ("vasp", "abinit"):
         band_numbers = np.arange(len(data.bands[0, :]))
+    band_labels = np.array(band_numbers if bands is None else bands)
+
+    if bands is None:
+        # only the bands crossing the Fermi energy (or any of the energies
+        # of the slider) can have a surface
+        emin = emax = e_fermi + fermi_shift
+        if iso_slider:
+            emin -= iso_range / 2
+            emax += iso_range / 2
+        crossing = crossing_bands(data.bands, emin, emax)
+        nskipped = len(band_numbers) - np.count_nonzero(crossing)
+        band_numbers = band_numbers[crossing]
+        band_labels = band_labels[crossing]
+        print("Skipping %d bands that do not cross the Fermi energy" % nskipped)
 
 
     spd = []
@@ -444,6 +461,7 @@ def fermi3D(
                                         kpoints=data.kpoints,
                                         bands=data.bands,
                                         band_numbers = band_numbers,
+                                        band_labels = band_labels,
                                         spd=spd,
                                         spd_spin=spd_spin,
                                         fermi_velocity = fermi_velocity,
@@ -460,6 +478,7 @@ def fermi3D(
                                         vmax=vmax,
                                         extended_zone_directions = extended_zone_directions,
                                         curvature_type = curvature_type,
+                                        nthreads=nthreads,
                                     )
         
         band_surfaces = fermi_surface3D.band_surfaces
@@ -494,32 +513,31 @@ def fermi3D(
        
     
         energy_values = np.linspace(e_fermi-iso_range/2,e_fermi+iso_range/2,iso_surfaces)
-        e_surfaces = []
-        
         
-        for e_value in energy_values:
-            fermi_surface3D = FermiSurface3D(
-                                            kpoints=data.kpoints,
-                                            bands=data.bands,
-                                            band_numbers = band_numbers,
-                                            spd=spd,
-                                            spd_spin=spd_spin,
-                                            fermi_velocity = fermi_velocity,
-                                            fermi_velocity_vector = fermi_velocity_vector,
-                                            effective_mass = effective_mass,
-                                            fermi=e_value,
-                                            fermi_shift = fermi_shift,
-                                            reciprocal_lattice=reciprocal_lattice,
-                                            interpolation_factor=interpolation_factor,
-                                            projection_accuracy=projection_accuracy,
-                                            supercell=supercell,
-                                            cmap=cmap,
-                                            vmin = vmin,
-                                            vmax=vmax,
-                                            extended_zone_directions = extended_zone_directions
-                                        )
-            brillouin_zone = fermi_surface3D.brillouin_zone
-            e_surfaces.append(fermi_surface3D.fermi_surface)
+        # the band grids are prepared once for all the energies
+        sweep = FermiSurfaceSweep(
+                                  kpoints=data.kpoints,
+                                  bands=data.bands,
+                                  band_numbers = band_numbers,
+                                  band_labels = band_labels,
+                                  spd=spd,
+                                  spd_spin=spd_spin,
+                                  fermi_velocity = fermi_velocity,
+                                  fermi_velocity_vector = fermi_velocity_vector,
+                                  effective_mass = effective_mass,
+                                  fermi_shift = fermi_shift,
+                                  reciprocal_lattice=reciprocal_lattice,
+                                  interpolation_factor=interpolation_factor,
+                                  projection_accuracy=projection_accuracy,
+                                  supercell=supercell,
+                                  cmap=cmap,
+                                  vmin = vmin,
+                                  vmax=vmax,
+                                  extended_zone_directions = extended_zone_directions,
+                                  nthreads=nthreads,
+                                 )
+        e_surfaces = [x.fermi_surface for x in sweep.sweep(energy_values)]
+        brillouin_zone = sweep[energy_values[-1]].brillouin_zone
        
     
     ##########################################################################
@@ -614,8 +632,7 @@ def fermi3D(
             
         elif iso_slider == True:
             def create_mesh(value):
-                res = int(value)
-                closest_idx = find_nearest(energy_values, res)
+                closest_idx = find_nearest(energy_values, value)
                 p.add_mesh(e_surfaces[closest_idx], name='iso_surface')
                 p.remove_scalar_bar()
                 return
@@ -1,4 +1,4 @@
-from .procarfilefilter import ProcarFileFilter
+from .procarfilefilter import ProcarFilterPipeline
 from .splash import welcome
 
 
@@ -14,7 +14,9 @@ def filter(
     human_atoms=False,
 ):
     """
-    This module filters the PROCAR file and re-write a new one.
+    This module filters the PROCAR file and re-write a new one. All the
+    given manipulations (atoms, orbitals, bands, k-points and spin) are
+    applied together, reading the PROCAR only once.
     """
     welcome()
 
@@ -31,8 +33,8 @@ def filter(
     print("spins       :", spin)
     print("k-points    :", kpoints)
 
-    # Access init class of ProcarFileFilter and pass two arguments
-    FileFilter = ProcarFileFilter(inFile, outFile)
+    # all the manipulations are chained and done in a single pass
+    pipeline = ProcarFilterPipeline(inFile)
 
     # for atoms
     if atoms:
@@ -42,11 +44,10 @@ def filter(
             atoms = [[y - 1 for y in x] for x in atoms]
             print("new atoms list :", atoms)
 
-        # Now just left to call the driver member
-        FileFilter.FilterAtoms(atoms)
+        pipeline.atoms(atoms)
 
     # for orbitals
-    elif orbitals:
+    if orbitals:
         print("Manipulating the orbitals")
         # If orbitals orbital_names is None, it needs to be filled
         if orbital_names is None:
@@ -56,10 +57,10 @@ def filter(
         if len(orbitals) != len(orbital_names):
             raise RuntimeError("length of orbitals and orbitals names do not match")
 
-        FileFilter.FilterOrbitals(orbitals, orbital_names)
+        pipeline.orbitals(orbitals, orbital_names)
 
     # for bands
-    elif bands:
+    if bands:
         print("Manipulating the bands")
 
         bmin = bands[0]
@@ -68,10 +69,10 @@ def filter(
             bmax, bmin = bmin, bmax
             print("New bands limits: ", bmin, " to ", bmax)
 
-        FileFilter.FilterBands(bmin, bmax)
+        pipeline.bands(bmin, bmax)
 
     # for k-points
-    elif kpoints:
+    if kpoints:
         print("Manipulating the k-points")
 
         kmin = kpoints[0]
@@ -80,12 +81,14 @@ def filter(
             kmax, kmin = kmin, kmax
             print("New k-points limits: ", kmin, " to ", kmax)
 
-        FileFilter.FilterKpoints(kmin, kmax)
+        pipeline.kpoints(kmin, kmax)
 
     # for spin
-    elif spin:
+    if spin:
         print("Manipulating the spin")
 
-        FileFilter.FilterSpin(spin)
+        pipeline.spin(spin)
+
+    pipeline.run(outFile)
 
     return
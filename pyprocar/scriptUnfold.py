@@ -55,8 +55,8 @@ def unfold(
     if code == "vasp" or code == "abinit":
         if repair:
             repairhandle = UtilsProcar()
-            repairhandle.ProcarRepair(fname, fname)
-            print("PROCAR repaired. Run with repair=False next time.")
+            if repairhandle.ProcarRepair(fname, fname):
+                print("PROCAR repaired. Run with repair=False next time.")
 
     # Turn interactive plotting off
     plt.ioff()
@@ -21,12 +21,6 @@ def Vector(
 
     welcome()
 
-    if code == "vasp" or code == "abinit":
-        if repair:
-            repairhandle = UtilsProcar()
-            repairhandle.ProcarRepair(infile, infile)
-            print("PROCAR repaired. Run with repair=False next time.")
-
     print("Input File    : ", infile)
     print("Bands         : ", bands)
     print("Energy        : ", energy)
@@ -58,7 +52,7 @@ def Vector(
 
     # parsing the file
     procarFile = ProcarParser()
-    procarFile.readFile(infile, recLattice=recLat)
+    procarFile.readFile(infile, recLattice=recLat, repair=repair)
 
     # processing the data
     sx = ProcarSelect(procarFile, deepCopy=True)
@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 from .unfolder import Unfolder
 from . import mathematics
+from . import spectral
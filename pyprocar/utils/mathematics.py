@@ -80,3 +80,49 @@ def fft_interpolate(function, interpolation_factor=2, axis=None):
             interpolation_factor * factor
         )
     return interpolated
+
+
+def unfold_kpoints(kpoints, rotations, tolerance=1e-5):
+    """
+    Applies all the point symmetry operations to the kpoints of the
+    irreducible Brillouin zone, and keeps one copy of every distinct
+    kpoint of the full Brillouin zone.
+
+    The kpoints are compared on an integer grid of spacing
+    ``tolerance``, so the duplicates are found by sorting instead of
+    comparing every pair of kpoints.
+
+    Parameters
+    ----------
+    kpoints : (n,3) float
+        kpoints of the irreducible Brillouin zone in reduced coordinates.
+    rotations : (m,3,3) float
+        Point symmetry operations acting on the reduced coordinates.
+    tolerance : float, optional
+        Kpoints closer than this are the same. The default is 1e-5.
+
+    Returns
+    -------
+    full_kpoints : (N,3) float
+        kpoints of the full Brillouin zone wrapped to [-0.5, 0.5), in the
+        order they are found (operation by operation).
+    index : (N,) int
+        Index of the irreducible kpoint each of them comes from, e.g.
+        ``bands[index]`` are the bands of the full Brillouin zone.
+
+    """
+    kpoints = np.asarray(kpoints, dtype=float)
+    rotations = np.asarray(rotations, dtype=float).reshape(-1, 3, 3)
+    nkpoints = len(kpoints)
+
+    # (noperations, nkpoints, 3) -> (noperations * nkpoints, 3)
+    symmetric = np.matmul(kpoints, rotations.transpose(0, 2, 1)).reshape(-1, 3)
+
+    period = int(round(1 / tolerance))
+    keys = np.round(symmetric * period).astype(np.int64)
+    wrapped_keys = np.mod(keys + period // 2, period) - period // 2
+    symmetric -= (keys - wrapped_keys) // period
+
+    _, first = np.unique(wrapped_keys, axis=0, return_index=True)
+    first = np.sort(first)
+    return symmetric[first], first % nkpoints
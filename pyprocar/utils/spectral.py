@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Spectral derivatives of bands on periodic k-point grids.
+
+A band sampled on a regular grid of the Brillouin zone is a periodic
+function, so its derivatives can be taken exactly (up to the resolution
+of the grid) in Fourier space: one `fftn` per band gives both the
+gradient and the Hessian. This is the same representation used by
+`fft_interpolate`.
+"""
+
+import math
+
+import numpy as np
+
+# Physical constants
+HBAR_EV = 6.582119 * 10 ** (-16)  # eV*s
+HBAR_J = 1.0545718 * 10 ** (-34)  # eV*s
+METER_ANGSTROM = 10 ** (-10)  # m /A
+EV_TO_J = 1.602 * 10 ** (-19)
+FREE_ELECTRON_MASS = 9.11 * 10 ** -31  # kg
+
+
+def _wavenumbers(shape, derivative_order):
+    """Factors `2*pi*i*m/n` of the derivative along each of the grid axes,
+    in units of the grid spacing. For first derivatives the Nyquist
+    frequency of even grids is dropped, as it has no defined sign."""
+    factors = []
+    for n in shape:
+        frequencies = np.fft.fftfreq(n)
+        if derivative_order == 1 and n % 2 == 0:
+            frequencies[n // 2] = 0
+        factors.append(2j * math.pi * frequencies)
+    return factors
+
+
+def _broadcast(factor, axis, ndim):
+    shape = [1] * ndim
+    shape[axis] = len(factor)
+    return factor.reshape(shape)
+
+
+def spectral_gradient(grid_fft):
+    """
+    Gradient of periodic functions along the grid indices (unit spacing).
+
+    Parameters
+    ----------
+    grid_fft : (..., nx, ny, nz) complex
+        `np.fft.fftn` of the functions over the last three axes.
+
+    Returns
+    -------
+    (3, ..., nx, ny, nz) float
+    """
+    ndim = grid_fft.ndim
+    factors = _wavenumbers(grid_fft.shape[-3:], 1)
+    return np.array(
+        [
+            np.fft.ifftn(
+                grid_fft * _broadcast(factors[i], ndim - 3 + i, ndim), axes=(-3, -2, -1)
+            ).real
+            for i in range(3)
+        ]
+    )
+
+
+def spectral_hessian(grid_fft):
+    """
+    Hessian of periodic functions along the grid indices (unit spacing).
+
+    Parameters
+    ----------
+    grid_fft : (..., nx, ny, nz) complex
+        `np.fft.fftn` of the functions over the last three axes.
+
+    Returns
+    -------
+    (3, 3, ..., nx, ny, nz) float
+    """
+    ndim = grid_fft.ndim
+    first = _wavenumbers(grid_fft.shape[-3:], 1)
+    second = _wavenumbers(grid_fft.shape[-3:], 2)
+    hessian = np.zeros((3, 3) + grid_fft.shape)
+    for i in range(3):
+        for j in range(i, 3):
+            if i == j:
+                factor = _broadcast(second[i] ** 2, ndim - 3 + i, ndim)
+            else:
+                factor = _broadcast(first[i], ndim - 3 + i, ndim) * _broadcast(
+                    first[j], ndim - 3 + j, ndim
+                )
+            hessian[i, j] = hessian[j, i] = np.fft.ifftn(
+                grid_fft * factor, axes=(-3, -2, -1)
+            ).real
+    return hessian
+
+
+class BandDerivatives:
+    """
+    First and second derivatives of a set of bands on a k-point grid,
+    computed once for all the bands and reused by the Fermi velocity,
+    the Fermi velocity vectors and the effective mass.
+
+    The k-points must form a complete regular grid of the Brillouin zone
+    (in any order). The derivatives are in cartesian coordinates, with
+    the units used by `FermiSurfaceBand3D` (eV*m and eV*m^2).
+
+    Parameters
+    ----------
+    kpoints : (nkpoints, 3) float
+        k-points in reduced coordinates
+    bands : (nkpoints, nbands) float
+        energies of the bands at the k-points
+    reciprocal_lattice : (3, 3) float
+
+    Example
+    -------
+    >>> derivatives = BandDerivatives(kpoints, bands, reciprocal_lattice)
+    >>> velocities = derivatives.velocity[iband]
+    """
+
+    def __init__(self, kpoints, bands, reciprocal_lattice):
+        kpoints = np.asarray(kpoints)
+        bands = np.asarray(bands).reshape(len(kpoints), -1)
+        axes = [np.unique(kpoints[:, i], return_inverse=True) for i in range(3)]
+        self.mesh_index = tuple(index.ravel() for _, index in axes)
+        shape = tuple(len(values) for values, _ in axes)
+
+        grids = np.zeros((bands.shape[1],) + shape)
+        grids[(slice(None),) + self.mesh_index] = bands.T
+        self._fft = np.fft.fftn(grids, axes=(-3, -2, -1))
+
+        self.lattice = np.linalg.inv(np.asarray(reciprocal_lattice).T).T
+        # from a derivative along the grid indices to the real units
+        self.scale = (
+            np.linalg.norm(self.lattice, axis=0)
+            * METER_ANGSTROM
+            * np.array(shape)
+            / (2 * math.pi)
+        )
+        self._gradient = None
+        self._hessian = None
+        self._effective_mass_tensor = None
+
+    @property
+    def nbands(self):
+        return self._fft.shape[0]
+
+    @property
+    def gradient(self):
+        """(nbands, nkpoints, 3) cartesian gradient of the bands"""
+        if self._gradient is None:
+            gradient = spectral_gradient(self._fft)[
+                (slice(None), slice(None)) + self.mesh_index
+            ]
+            gradient = np.moveaxis(gradient, 0, -1) * self.scale
+            self._gradient = np.matmul(gradient, self.lattice.T)
+        return self._gradient
+
+    @property
+    def hessian(self):
+        """(nbands, nkpoints, 3, 3) cartesian Hessian of the bands"""
+        if self._hessian is None:
+            hessian = spectral_hessian(self._fft)[
+                (slice(None), slice(None), slice(None)) + self.mesh_index
+            ]
+            hessian = np.moveaxis(hessian, (0, 1), (-2, -1))
+            hessian = hessian * self.scale[:, None] * self.scale
+            self._hessian = np.matmul(np.matmul(self.lattice, hessian), self.lattice.T)
+        return self._hessian
+
+    @property
+    def velocity(self):
+        """(nbands, nkpoints, 3) group velocity of the bands"""
+        return self.gradient / HBAR_EV
+
+    @property
+    def effective_mass_tensor(self):
+        """(nbands, nkpoints, 3, 3) effective mass tensor of the bands"""
+        if self._effective_mass_tensor is None:
+            self._effective_mass_tensor = np.linalg.inv(
+                self.hessian * EV_TO_J / HBAR_J ** 2
+            )
+        return self._effective_mass_tensor
+
+    @property
+    def effective_mass(self):
+        """(nbands, nkpoints) harmonic mean of the diagonal of the effective
+        mass tensor, in units of the free electron mass"""
+        tensor = self.effective_mass_tensor
+        return (
+            3
+            / (1 / tensor[..., 0, 0] + 1 / tensor[..., 1, 1] + 1 / tensor[..., 2, 2])
+            / FREE_ELECTRON_MASS
+        )
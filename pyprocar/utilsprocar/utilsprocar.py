@@ -5,6 +5,9 @@ import sys
 import matplotlib.pyplot as plt
 import numpy as np
 
+from ..io.procar_merge import merge_procars
+from ..io.procar_reader import BROKEN_LINE, needs_repair, repair_line
+
 
 class UtilsProcar:
     """
@@ -149,89 +152,21 @@ class UtilsProcar:
 
     -gzipOut: whether gzip or not the outout file.
 
-    Warning: spin polarized case is not Ok!
+    The spin down k-points of spin polarized files follow the spin up
+    k-points of all the files.
 
     """
-        import gzip
-
         self.log.debug("MergeFiles()")
         self.log.debug("infiles: " " ,".join(inFiles))
 
-        inFiles = [self.OpenFile(x) for x in inFiles]
-        header = [x.readline() for x in inFiles]
-        self.log.debug("All the input headers are: \n" + "".join(header))
-        metas = [x.readline() for x in inFiles]
-        self.log.debug("All the input metalines are:\n " + "".join(metas))
-        # parsing metalines
-
-        parsedMeta = [list(map(int, re.findall(r"#[^:]+:([^#]+)", x))) for x in metas]
-        kpoints = [x[0] for x in parsedMeta]
-        bands = set([x[1] for x in parsedMeta])
-        ions = set([x[2] for x in parsedMeta])
-
-        # checking that bands and ions match (mind: bands & ions are 'sets'):
-        if len(bands) != 1 or len(ions) != 1:
+        # the files are streamed in large blocks, only the k-point headers
+        # and the metadata lines are rewritten
+        try:
+            kpoints, bands, ions = merge_procars(inFiles, outFile, gzip_out=gzipOut)
+        except RuntimeError:
             self.log.error("Number of bands/ions  do not match")
-            raise RuntimeError("Files are incompatible")
-
-        newKpoints = np.array(kpoints, dtype=int).sum()
-        self.log.info("New number of Kpoints: " + str(newKpoints))
-        newMeta = metas[0].replace(str(kpoints[0]), str(newKpoints), 1)
-        self.log.debug("New meta line:\n" + newMeta)
-
-        if gzipOut:
-            self.log.debug("gzipped output")
-            outFile = gzip.open(outFile, mode="wt")
-        else:
-            self.log.debug("normal output")
-            outFile = open(outFile, "w")
-        outFile.write(header[0])
-        outFile.write(newMeta)
-
-        # embedded function to change old k-point indexes by the correct
-        # ones. The `kreplace.k` syntax is for making the variable 'static'
-        def kreplace(matchobj):
-            # self.log.debug(print matchobj.group(0))
-            kreplace.k += 1
-            kreplace.localCounter += 1
-            return matchobj.group(0).replace(
-                str(kreplace.localCounter), str(kreplace.k)
-            )
-
-        kreplace.k = 0
-        down = []  # to handle spin-down (if found)
-        self.log.debug("Going to replace K-points indexes")
-        for inFile in inFiles:
-            lines = inFile.read()
-            # looking for an extra metada line, if found the file is
-            # spin-polarized
-            p = re.compile(
-                r"#[\s\w]+k-points:[\s\d]+#[\s\w]+bands:[\s\d]+#[\w\s]+ions:\s*\d+\s*"
-            )
-            lines = p.split(lines)
-            up = lines[0]
-            if len(lines) == 2:
-                down.append(lines[1])
-                self.log.info("Spin-polarized PROCAR!")
-            # closing inFile
-            inFile.close()
-            kreplace.localCounter = 0
-            up = re.sub("(\s+k-point\s*\d+\s*:)", kreplace, up)
-            outFile.write(up)
-
-        # handling the spin-down channel, if present
-        if down:
-            self.log.debug("writing spin down metadata")
-            outFile.write("\n")
-            outFile.write(newMeta)
-        kreplace.k = 0
-        for group in down:
-            kreplace.localCounter = 0
-            group = re.sub("(\s+k-point\s*\d+\s*:)", kreplace, group)
-            outFile.write(group)
-
-        self.log.debug("Closing output file")
-        outFile.close()
+            raise
+        self.log.info("New number of Kpoints: " + str(kpoints))
         self.log.debug("MergeFiles()...done")
         return
 
@@ -286,25 +221,43 @@ class UtilsProcar:
     k-point    61 :    0.00000000 -0.50000000 0.00000000 ...
 
     But as I found new stupid errors they should be fixed here.
-    """
-        self.log.debug("ProcarRepair(): ...")
-        infile = self.OpenFile(infilename)
-        fileStr = infile.read()
-        infile.close()
 
-        # Fixing bands issues (when there are more than 999 bands)
-        # band *** # energy    6.49554019 # occ.  0.00000000
-        fileStr = re.sub(r"(band\s)(\*\*\*)", r"\1 1000", fileStr)
+    The file is first scanned for problems, a healthy file is never
+    rewritten in place. Otherwise it is streamed line by line and only
+    the broken lines are modified.
 
-        # Fixing k-point issues
-        fileStr = re.sub(r"(\.\d{8})(\d{2}\.)", r"\1 \2", fileStr)
-        fileStr = re.sub(r"(\d)-(\d)", r"\1 -\2", fileStr)
-
-        fileStr = re.sub(r"\*+", r" -10.0000 ", fileStr)
+    Returns `True` if something was repaired.
+    """
+        import os
 
-        outfile = open(outfilename, "w")
-        outfile.write(fileStr)
+        self.log.debug("ProcarRepair(): ...")
+        infile = self.OpenFile(infilename)
+        infilename = infile.name
+        inplace = os.path.abspath(infilename) == os.path.abspath(outfilename)
+        if not needs_repair(infilename):
+            self.log.info("Nothing to repair in " + infilename)
+            if inplace:
+                infile.close()
+                self.log.debug("ProcarRepair(): ...Done")
+                return False
+
+        if inplace:
+            # the repaired file is written aside and then moved over the
+            # original one
+            outfile = open(outfilename + ".repairing", "w")
+        else:
+            outfile = open(outfilename, "w")
+        repaired = 0
+        for line in infile:
+            if BROKEN_LINE.search(line):
+                line = repair_line(line)
+                repaired += 1
+            outfile.write(line)
         outfile.close()
+        infile.close()
+        if inplace:
+            os.replace(outfilename + ".repairing", outfilename)
+        self.log.info(str(repaired) + " lines repaired")
 
         self.log.debug("ProcarRepair(): ...Done")
-        return
+        return repaired != 0
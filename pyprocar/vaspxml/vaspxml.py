@@ -6,6 +6,7 @@ Created on Wed Aug 19 20:49:03 2020
 """
 
 from ..core import Structure, DensityOfStates
+from ..io.cache import load_cache, save_cache, pack_tree, unpack_tree
 from numpy import array
 import xml.etree.ElementTree as ET
 import os
@@ -15,10 +16,14 @@ import collections
 
 class VaspXML(collections.abc.Mapping):
     """contains."""
-    def __init__(self, filename='vasprun.xml', dos_interpolation_factor=None):
+    def __init__(self,
+                 filename='vasprun.xml',
+                 dos_interpolation_factor=None,
+                 cache=True):
 
         self.variables = {}
         self.dos_interpolation_factor = dos_interpolation_factor
+        self.cache = cache
 
         if not os.path.isfile(filename):
             raise ValueError('File not found ' + filename)
@@ -41,7 +46,8 @@ class VaspXML(collections.abc.Mapping):
 
     def read(self):
         """
-        Read and parse vasprun.xml.
+        Read and parse vasprun.xml. If the file was already parsed, the
+        data is loaded from the on-disk cache (see `pyprocar.io.cache`).
 
         Returns
         -------
@@ -49,7 +55,17 @@ class VaspXML(collections.abc.Mapping):
             DESCRIPTION.
 
         """
-        return parse_vasprun(self.filename)
+        if self.cache:
+            cached = load_cache(self.filename, 'vasprun')
+            if cached is not None:
+                return unpack_tree(cached)
+        data = parse_vasprun(self.filename)
+        if self.cache:
+            # the data is returned as it is loaded from the cache
+            arrays = pack_tree(data)
+            save_cache(self.filename, 'vasprun', arrays)
+            data = unpack_tree(arrays)
+        return data
 
     def _get_dos_total(self):
 
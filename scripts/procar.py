@@ -127,14 +127,15 @@ def call_filter(args):
 	"""
 
     pyprocar.filter(
-        args.infile,
-        args.outfile,
+        args.inFile,
+        args.outFile,
         atoms=args.atoms,
         orbitals=args.orbitals,
         orbital_names=args.orbital_names,
         bands=args.bands,
         spin=args.spin,
-        human_atoms=args.human_atoms,
+        kpoints=args.kpoints,
+        human_atoms=args.human,
     )
 
 
@@ -279,9 +280,9 @@ if __name__ == "__main__":
         ############### filter ##########################################
         phelp = (
             "Filters (manipulates) the data of the input file (PROCAR-like) and"
-            " it yields a new file (PROCAR-like too) with the changes. This "
-            "method can do only one manipulation at time (ie: spin, atoms, "
-            "bands or orbitals)."
+            " it yields a new file (PROCAR-like too) with the changes. The "
+            "manipulations (spin, atoms, orbitals, bands and k-points) can be "
+            "combined, all of them are done reading the input file only once."
         )
         parserFilter = subparsers.add_parser("filter", help=phelp)
 
@@ -291,7 +292,7 @@ if __name__ == "__main__":
         phelp = "Output file."
         parserFilter.add_argument("outFile", help=phelp)
 
-        OptFilter = parserFilter.add_mutually_exclusive_group()
+        OptFilter = parserFilter.add_argument_group("manipulations")
         phelp = (
             "List of atoms to group (add) as a new single entry. Each group of"
             " atoms should be specified in a different `--atoms` option. "
@@ -332,6 +333,12 @@ if __name__ == "__main__":
         )
         OptFilter.add_argument("-s", "--spin", help=phelp, type=int, nargs="+")
 
+        phelp = (
+            "Keeps only the k-points between `min` and `max` indexes (as "
+            "written in the file, starting from 1)."
+        )
+        OptFilter.add_argument("-k", "--kpoints", help=phelp, type=int, nargs=2)
+
         phelp = (
             "enable to give atoms list in a more human, 1-based order (say the"
             " 1st is 1, 2nd is 2 and so on ). Mind: this only holds for atoms."
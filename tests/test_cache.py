@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+
+from pyprocar.io.cache import (
+    cache_filename,
+    load_cache,
+    pack_tree,
+    save_cache,
+    unpack_tree,
+)
+
+
+def _input(tmp_path):
+    filename = str(tmp_path / "PROCAR")
+    with open(filename, "w") as wf:
+        wf.write("PROCAR lm decomposed\n")
+    return filename
+
+
+def test_round_trip(tmp_path):
+    filename = _input(tmp_path)
+    arrays = {"spd_0": np.arange(12.0).reshape(3, 4), "names": np.array(["s", "p"])}
+    save_cache(filename, "procar", arrays)
+    cached = load_cache(filename, "procar")
+    assert sorted(cached) == ["names", "spd_0"]
+    assert np.array_equal(cached["spd_0"], arrays["spd_0"])
+    assert list(cached["names"]) == ["s", "p"]
+
+
+def test_changed_input_invalidates_the_cache(tmp_path):
+    filename = _input(tmp_path)
+    save_cache(filename, "procar", {"x": np.zeros(3)})
+    with open(filename, "a") as wf:
+        wf.write("# of k-points:  1\n")
+    assert load_cache(filename, "procar") is None
+
+
+def test_object_arrays_are_not_stored(tmp_path):
+    filename = _input(tmp_path)
+    save_cache(filename, "procar", {"x": np.array([{"a": 1}], dtype=object)})
+    assert not os.path.isfile(cache_filename(filename, "procar"))
+
+
+def test_pickled_cache_is_not_loaded(tmp_path):
+    filename = _input(tmp_path)
+    save_cache(filename, "procar", {"x": np.zeros(3)})
+    path = cache_filename(filename, "procar")
+    with np.load(path) as data:
+        signature = data["signature"]
+    # a valid signature with a pickled payload
+    np.savez(path, signature=signature, x=np.array([{"a": 1}], dtype=object))
+    assert load_cache(filename, "procar") is None
+
+
+def test_pack_tree(tmp_path):
+    filename = _input(tmp_path)
+    tree = {
+        "general": {
+            "dos": {"efermi": 1.5, "total": np.ones((2, 3, 3))},
+            "kpoints": [[0.0, 0.0, 0.0], [0.5, 0.0, 0.0]],
+            "labels": ["s", "p", "d"],
+        },
+        "ragged": [[1, 2], [3]],
+        "flag": True,
+        "missing": None,
+    }
+    save_cache(filename, "vasprun", pack_tree(tree))
+    cached = unpack_tree(load_cache(filename, "vasprun"))
+    assert cached["general"]["dos"]["efermi"] == 1.5
+    assert np.array_equal(cached["general"]["dos"]["total"], np.ones((2, 3, 3)))
+    assert isinstance(cached["general"]["kpoints"], np.ndarray)
+    assert np.array_equal(cached["general"]["kpoints"], tree["general"]["kpoints"])
+    assert cached["general"]["labels"] == ["s", "p", "d"]
+    assert cached["ragged"] == [[1, 2], [3]]
+    assert cached["flag"] is True
+    assert cached["missing"] is None
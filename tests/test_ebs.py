@@ -0,0 +1,18 @@
+import numpy as np
+
+from pyprocar.core import ElectronicBandStructure
+
+
+def test_ibz2fbz_keeps_the_weights():
+    # four-fold rotations around z
+    rotation = np.array([[0, -1, 0], [1, 0, 0], [0, 0, 1]])
+    rotations = [np.linalg.matrix_power(rotation, i) for i in range(4)]
+    ebs = ElectronicBandStructure(
+        kpoints=np.array([[0, 0, 0], [0.25, 0, 0]]),
+        bands=np.array([[[-1.0]], [[2.0]]]),
+        weights=np.array([0.2, 0.8]),
+    )
+    ebs.ibz2fbz(rotations)
+    assert ebs.nkpoints == 5
+    assert np.allclose(ebs.bands[:, 0, 0], [-1, 2, 2, 2, 2])
+    assert np.allclose(ebs.weights, [0.2, 0.2, 0.2, 0.2, 0.2])
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from pyprocar.fermisurface3d import FermiSurface3D, FermiSurfaceSweep, crossing_bands
+from pyprocar.fermisurface3d import fermisurface3D
+
+
+@pytest.fixture
+def kwargs():
+    """Tight binding bands on a 8x8x8 grid, the last one is far above the
+    Fermi energy"""
+    axes = [np.arange(8) / 8 - 0.5] * 3
+    kpoints = np.array(np.meshgrid(*axes, indexing="ij")).reshape(3, -1).T
+    band = (
+        -np.cos(2 * np.pi * kpoints[:, 0])
+        - 0.8 * np.cos(2 * np.pi * kpoints[:, 1])
+        - 0.6 * np.cos(2 * np.pi * kpoints[:, 2])
+    )
+    bands = np.stack([band, band + 0.5, band + 10], axis=1)
+    return dict(
+        kpoints=kpoints,
+        bands=bands,
+        spd=[None] * 3,
+        spd_spin=[None] * 3,
+        fermi=0.0,
+        fermi_shift=0.1,
+        reciprocal_lattice=np.diag([1.1, 0.9, 1.3]),
+        interpolation_factor=2,
+    )
+
+
+def _points(fermi_surface):
+    return [x.pyvista_obj.points for x in fermi_surface.band_surfaces_obj]
+
+
+@pytest.mark.parametrize("nthreads", [1, 2])
+def test_bands_are_extracted_together(kwargs, nthreads):
+    together = FermiSurface3D(band_numbers=[0, 1], nthreads=nthreads, **kwargs)
+    alone = [FermiSurface3D(band_numbers=[x], **kwargs) for x in (0, 1)]
+    assert len(together.band_surfaces_obj) == 2
+    for x, y in zip(_points(together), [_points(x)[0] for x in alone]):
+        assert np.array_equal(x, y)
+
+
+def test_bands_not_crossing_the_fermi_energy_are_skipped(kwargs, monkeypatch):
+    built = []
+    band_3d = fermisurface3D.FermiSurfaceBand3D
+
+    def counted(band, **other):
+        built.append(band.max())
+        return band_3d(band=band, **other)
+
+    monkeypatch.setattr(fermisurface3D, "FermiSurfaceBand3D", counted)
+    surface = FermiSurface3D(band_numbers=[0, 2, 1], **kwargs)
+    assert built == [kwargs["bands"][:, x].max() for x in (0, 1)]
+    assert len(surface.band_surfaces_obj) == 2
+
+
+def test_crossing_bands(kwargs):
+    bands = kwargs["bands"]
+    assert np.array_equal(crossing_bands(bands, 0.1), [True, True, False])
+    # the lowest band goes down to -2.4, the second one to -1.9
+    assert np.array_equal(crossing_bands(bands, -3, -2), [True, False, False])
+    assert np.array_equal(crossing_bands(bands, 5, 12), [False, False, True])
+    grid = bands.reshape(8, 8, 8, 3)
+    assert np.array_equal(crossing_bands(grid, 0.1), [True, True, False])
+
+
+@pytest.mark.parametrize("nthreads", [1, 2])
+def test_sweep_matches_separate_surfaces(kwargs, nthreads):
+    energies = [-0.3, 0.0, 0.3]
+    kwargs.pop("fermi")
+    kwargs["band_numbers"] = [0, 1, 2]
+    kwargs["fermi_velocity"] = True
+    sweep = FermiSurfaceSweep(nthreads=nthreads, **kwargs)
+    surfaces = sweep.sweep(energies)
+    for energy, surface in zip(energies, surfaces):
+        alone = FermiSurface3D(fermi=energy, **kwargs)
+        assert len(surface.band_surfaces_obj) == len(alone.band_surfaces_obj)
+        for x, y in zip(surface.band_surfaces_obj, alone.band_surfaces_obj):
+            assert np.array_equal(x.pyvista_obj.points, y.pyvista_obj.points)
+            assert np.allclose(
+                x.group_velocity_magnitude, y.group_velocity_magnitude
+            )
+    # going back to an energy of the sweep reuses its surface
+    again = sweep.sweep(energies[::-1])
+    assert all(x is y for x, y in zip(again, surfaces[::-1]))
@@ -0,0 +1,102 @@
+import itertools
+
+import numpy as np
+import pytest
+import pyvista
+
+from pyprocar.core.isosurface import clip_by_planes, isosurface_extent, map2matrix
+from pyprocar.fermisurface3d import BrillouinZone
+
+
+def _area(verts, faces):
+    triangles = verts[faces]
+    normals = np.cross(
+        triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]
+    )
+    return 0.5 * np.linalg.norm(normals, axis=1).sum()
+
+
+def test_clip_by_planes():
+    verts = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [3, 3, 0], [3, 4, 0]])
+    # the second triangle is outside the plane x = 0.5
+    faces = np.array([[0, 1, 2], [3, 4, 1]])
+    clipped_verts, clipped_faces = clip_by_planes(
+        verts, faces, origins=[[0.5, 0, 0]], normals=[[1, 0, 0]]
+    )
+    assert np.all(clipped_verts[:, 0] <= 0.5)
+    assert np.isclose(_area(clipped_verts, clipped_faces), 0.5 - 0.125)
+    # the new vertices are shared by the two triangles of the cut
+    assert len(clipped_verts) == 4
+
+
+def test_clip_by_planes_keeps_the_inside():
+    verts = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]])
+    faces = np.array([[0, 1, 2]])
+    origins = [[2, 0, 0], [0, 2, 0]]
+    normals = [[1, 0, 0], [0, 1, 0]]
+    clipped_verts, clipped_faces = clip_by_planes(verts, faces, origins, normals)
+    assert np.array_equal(clipped_verts[clipped_faces], verts[faces])
+
+
+@pytest.mark.parametrize(
+    "reciprocal_lattice",
+    [
+        [[-1, 1, 1], [1, -1, 1], [1, 1, -1]],
+        [[1, 0, 0], [0.3, 1.1, 0], [0.2, -0.1, 0.9]],
+    ],
+)
+def test_clip_to_the_brillouin_zone(reciprocal_lattice):
+    reciprocal_lattice = np.array(reciprocal_lattice, dtype=float)
+    brillouin_zone = BrillouinZone(reciprocal_lattice)
+    # between the inscribed and the circumscribed spheres of the zone
+    radius = 0.5 * (
+        np.linalg.norm(brillouin_zone.centers, axis=1).min()
+        + np.linalg.norm(
+            brillouin_zone.verts[np.concatenate(brillouin_zone.faces)], axis=1
+        ).max()
+    )
+    sphere = pyvista.Sphere(radius=radius, theta_resolution=40, phi_resolution=40)
+    verts = np.asarray(sphere.points, dtype=float)
+    faces = np.asarray(sphere.faces).reshape(-1, 4)[:, 1:]
+    clipped_verts, clipped_faces = clip_by_planes(
+        verts, faces, brillouin_zone.centers, brillouin_zone.face_normals
+    )
+
+    # a point is in the Brillouin zone when no other reciprocal lattice
+    # point is closer to it than Gamma: k.G <= |G|^2 / 2
+    lattice_points = np.array(
+        [
+            np.dot(x, reciprocal_lattice)
+            for x in itertools.product([-1, 0, 1], repeat=3)
+            if any(x)
+        ]
+    )
+    half = 0.5 * (lattice_points**2).sum(axis=1)
+    excess = clipped_verts @ lattice_points.T - half
+    assert excess.max() < 1e-8
+    inside = (verts @ lattice_points.T - half).max(axis=1) < 0
+    assert 0 < inside.sum() < len(verts)
+    # all the vertices inside are kept, the new ones are on the boundary
+    same = np.abs(clipped_verts[:, None] - verts[None, inside]).max(axis=-1) < 1e-12
+    assert same.any(axis=0).all()
+    on_boundary = np.abs(excess).min(axis=1) < 1e-8
+    assert on_boundary.sum() == len(clipped_verts) - inside.sum() > 0
+    assert len(clipped_faces) > 0
+
+
+def test_isosurface_extent():
+    x = np.arange(11) - 5
+    distance = np.sqrt(
+        x[:, None, None] ** 2 + x[None, :, None] ** 2 + x[None, None, :] ** 2
+    )
+    assert np.allclose(isosurface_extent(distance, 3), [6, 6, 6])
+    assert isosurface_extent(distance, 100) is None
+
+
+def test_map2matrix():
+    kpoints = np.array([[0, 0, 0], [0.5, 0, 0], [0, 0.5, 0], [0.5, 0.5, 0]])
+    bands = np.array([[1, 10], [2, 20], [3, 30], [4, 40]])
+    matrix = map2matrix(kpoints[::-1], bands[::-1])
+    assert matrix.shape == (2, 2, 1, 2)
+    assert np.array_equal(matrix[..., 0, 0], [[1, 3], [2, 4]])
+    assert np.array_equal(matrix[..., 0, 1], [[10, 30], [20, 40]])
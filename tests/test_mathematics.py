@@ -0,0 +1,18 @@
+import numpy as np
+
+from pyprocar.utils.mathematics import unfold_kpoints
+
+
+def test_unfold_kpoints():
+    # four-fold rotations around z
+    rotation = np.array([[0, -1, 0], [1, 0, 0], [0, 0, 1]])
+    rotations = [np.linalg.matrix_power(rotation, i) for i in range(4)]
+    kpoints = [[0, 0, 0], [0.25, 0, 0], [0.5, 0.5, 0]]
+
+    full, index = unfold_kpoints(kpoints, rotations)
+    assert len(full) == len(index) == 1 + 4 + 1
+    assert np.allclose(full[index == 0], [[0, 0, 0]])
+    expected = [[0.25, 0, 0], [0, 0.25, 0], [-0.25, 0, 0], [0, -0.25, 0]]
+    assert np.allclose(sorted(map(tuple, full[index == 1])), sorted(expected))
+    # the images of the zone boundary are wrapped to [-0.5, 0.5)
+    assert np.allclose(full[index == 2], [[-0.5, -0.5, 0]])
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+
+from pyprocar.io.procar_reader import ProcarReader
+from pyprocar.procarfilefilter.pipeline import ProcarFilterPipeline, reduction_matrix
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+PROCAR = os.path.join(DATA, "PROCAR")
+
+
+def _read(filename):
+    with open(filename) as rf:
+        return ProcarReader().read(rf)
+
+
+def test_reduction_matrix():
+    matrix = reduction_matrix([[0, 2], [1, 1]], 3)
+    assert np.array_equal(np.array([1, 10, 100]) @ matrix, [101, 20])
+
+
+def test_pipeline(tmp_path):
+    outfile = str(tmp_path / "PROCAR-filtered")
+    ProcarFilterPipeline(PROCAR).atoms([[0, 1], [1]]).orbitals(
+        [[0], [1, 2, 3], [4, 5, 6, 7, 8]], ["s", "p", "d"]
+    ).bands(2, 2).spin([1]).run(outfile)
+
+    full = _read(PROCAR)
+    filtered = _read(outfile)
+    assert filtered.nsets == 1
+    assert (filtered.kpointsCount, filtered.bandsCount) == (2, 1)
+    # two atom groups and the `tot` row
+    assert filtered.ionsCount == 3
+    assert filtered.orbitalNames == ["s", "p", "d", "tot"]
+    assert np.array_equal(filtered.kpoints[0], full.kpoints[1])
+    assert np.array_equal(filtered.bands[0], full.bands[1][:, [1]])
+
+    spd = full.spd[1][:, [1], :, :, 1:]
+    atoms = np.stack([spd[:, :, :, 0] + spd[:, :, :, 1], spd[:, :, :, 1]], axis=3)
+    orbitals = np.stack(
+        [
+            atoms[..., 0],
+            atoms[..., 1:4].sum(axis=-1),
+            atoms[..., 4:9].sum(axis=-1),
+            atoms[..., 9],
+        ],
+        axis=-1,
+    )
+    assert np.allclose(filtered.spd[0][:, :, :, :2, 1:], orbitals, atol=2e-3)
+    # the `tot` row is not changed by the atom groups
+    assert np.allclose(filtered.spd[0][:, :, :, 2, -1], spd[:, :, :, -1, -1])
+
+
+def test_pipeline_without_reductions_keeps_the_file(tmp_path):
+    outfile = str(tmp_path / "PROCAR-filtered")
+    ProcarFilterPipeline(PROCAR).run(outfile)
+    full = _read(PROCAR)
+    copy = _read(outfile)
+    for name in ProcarReader._arrays:
+        for x, y in zip(getattr(copy, name), getattr(full, name)):
+            assert np.array_equal(x, y)
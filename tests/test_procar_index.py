@@ -0,0 +1,36 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from pyprocar.io.procar_index import ProcarIndex
+from pyprocar.io.procar_reader import ProcarReader
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+@pytest.fixture
+def procar(tmp_path):
+    """Copy of the PROCAR fixture (2 spin blocks, 2 k-points, 2 bands and
+    2 ions), the caches are written next to it"""
+    filename = str(tmp_path / "PROCAR")
+    shutil.copy(os.path.join(DATA, "PROCAR"), filename)
+    return filename
+
+
+def test_index_reads_a_selection(procar):
+    with open(procar) as rf:
+        full = ProcarReader().read(rf)
+    index = ProcarIndex(procar)
+    assert index.nsets == 2
+    selection = index.read(bands=[1], kpoints=[1], atoms=[0, 2])
+    assert (selection.kpointsCount, selection.bandsCount) == (1, 1)
+    for iset in range(2):
+        assert np.array_equal(selection.kpoints[iset], full.kpoints[iset][[1]])
+        assert np.array_equal(selection.bands[iset], full.bands[iset][[1]][:, [1]])
+        assert np.array_equal(
+            selection.spd[iset], full.spd[iset][1:, 1:][:, :, :, [0, 2]]
+        )
+    # the offsets are cached next to the file
+    assert np.array_equal(ProcarIndex(procar).band_offsets, index.band_offsets)
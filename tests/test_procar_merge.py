@@ -0,0 +1,72 @@
+import gzip
+import os
+import re
+import shutil
+
+import numpy as np
+import pytest
+
+from pyprocar.io.procar_merge import concatenate, merge_procars, parse_meta
+from pyprocar.io.procar_reader import ProcarReader
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+@pytest.fixture
+def procar(tmp_path):
+    filename = str(tmp_path / "PROCAR")
+    shutil.copy(os.path.join(DATA, "PROCAR"), filename)
+    return filename
+
+
+def _read(filename):
+    opener = gzip.open if filename.endswith("gz") else open
+    with opener(filename, "rt") as rf:
+        return ProcarReader().read(rf)
+
+
+@pytest.mark.parametrize("gzip_out", [False, True])
+def test_merge(procar, tmp_path, gzip_out):
+    outfile = str(tmp_path / ("PROCAR-merged" + (".gz" if gzip_out else "")))
+    assert merge_procars([procar, procar], outfile, gzip_out=gzip_out) == (4, 2, 2)
+
+    single = _read(procar)
+    merged = _read(outfile)
+    assert merged.nsets == 2
+    assert merged.kpointsCount == 4
+    for iset in range(2):
+        # the spin down k-points of both files follow the spin up ones
+        for name in ("kpoints", "bands", "spd"):
+            expected = np.concatenate([getattr(single, name)[iset]] * 2)
+            assert np.array_equal(getattr(merged, name)[iset], expected)
+
+    opener = gzip.open if gzip_out else open
+    with opener(outfile, "rt") as rf:
+        text = rf.read()
+    numbers = [int(x) for x in re.findall(r"k-point\s+(\d+)", text)]
+    assert numbers == [1, 2, 3, 4] * 2
+
+
+def test_merge_refuses_different_files(procar, tmp_path):
+    other = str(tmp_path / "PROCAR-other")
+    with open(procar) as rf:
+        text = rf.read()
+    with open(other, "w") as wf:
+        wf.write(text.replace("# of bands:  2", "# of bands:  3"))
+    with pytest.raises(RuntimeError):
+        merge_procars([procar, other], str(tmp_path / "PROCAR-merged"))
+
+
+def test_parse_meta():
+    line = b"# of k-points:  816         # of bands:   52         # of ions:    8\n"
+    assert parse_meta(line) == (816, 52, 8)
+
+
+def test_concatenate(tmp_path):
+    first = str(tmp_path / "first")
+    with open(first, "wb") as wf:
+        wf.write(b"a\nb\n")
+    outfile = str(tmp_path / "out")
+    concatenate([b"header\n", first, first], outfile)
+    with open(outfile, "rb") as rf:
+        assert rf.read() == b"header\na\nb\na\nb\n"
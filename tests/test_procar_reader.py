@@ -0,0 +1,157 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from pyprocar.io import procar_reader
+from pyprocar.io.procar_reader import ProcarReader, needs_repair, read_procar
+from pyprocar.core import Structure
+from pyprocar.io.vasp import Procar
+from pyprocar.utils import mathematics
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+@pytest.fixture
+def procar(tmp_path):
+    """Copy of the PROCAR fixture (2 spin blocks, 2 k-points, 2 bands and
+    2 ions), the caches are written next to it"""
+    filename = str(tmp_path / "PROCAR")
+    shutil.copy(os.path.join(DATA, "PROCAR"), filename)
+    return filename
+
+
+def projection(spin, kpoint, band, ion, orbital):
+    """Value written in the fixture for an ion and orbital (0-based)"""
+    return round(
+        0.1 * (ion + 1)
+        + 0.01 * orbital
+        + 0.002 * band
+        + 0.004 * kpoint
+        + 0.5 * spin,
+        3,
+    )
+
+
+def test_read(procar):
+    with open(procar) as rf:
+        reader = ProcarReader().read(rf)
+    assert reader.nsets == 2
+    assert (reader.kpointsCount, reader.bandsCount) == (2, 2)
+    # 2 ions and the `tot` row
+    assert reader.ionsCount == 3
+    assert reader.orbitalNames[0] == "s" and reader.orbitalNames[-1] == "tot"
+    assert reader.nblocks == 1
+    assert np.allclose(reader.kpoints[1], [[0, 0, 0], [0.25, 0.5, 0.125]])
+    assert np.allclose(reader.weights[0], 0.5)
+    assert np.allclose(reader.bands[0], [[-2, 1], [-1.5, 1.5]])
+    assert np.allclose(reader.bands[1], reader.bands[0] - 0.25)
+    assert np.allclose(reader.occupancies[0], [[1, 0], [1, 0]])
+
+    spd = reader.spd[1]
+    assert spd.shape == (2, 2, 1, 3, 11)
+    assert np.allclose(spd[:, :, 0, :, 0], [1, 2, 0])
+    for ion in range(2):
+        for orbital in range(9):
+            assert spd[1, 0, 0, ion, orbital + 1] == pytest.approx(
+                projection(1, 1, 0, ion, orbital)
+            )
+    assert np.allclose(spd[..., -1, 1:], spd[..., :-1, 1:].sum(axis=-2))
+
+
+def test_read_procar_uses_the_cache(procar, monkeypatch):
+    with open(procar) as rf:
+        parsed = read_procar(rf)
+
+    def read(self, rf):
+        raise AssertionError("the PROCAR should not be parsed again")
+
+    monkeypatch.setattr(ProcarReader, "read", read)
+    with open(procar) as rf:
+        cached = read_procar(rf)
+    assert cached.orbitalNames == parsed.orbitalNames
+    assert cached.ionsCount == parsed.ionsCount
+    for name in ProcarReader._arrays:
+        for x, y in zip(getattr(cached, name), getattr(parsed, name)):
+            assert np.array_equal(x, y)
+
+
+@pytest.mark.parametrize("repair", [False, True])
+def test_read_procar_in_parallel(procar, repair):
+    if repair:
+        with open(procar) as rf:
+            text = rf.read()
+        with open(procar, "w") as wf:
+            wf.write(text.replace("0.25000000 0.50000000", "0.25000000-0.50000000"))
+    with open(procar) as rf:
+        serial = read_procar(rf, repair=repair, cache=False).to_arrays()
+    with open(procar) as rf:
+        parallel = read_procar(rf, repair=repair, cache=False, nprocs=2).to_arrays()
+    assert parallel.keys() == serial.keys()
+    for key in serial:
+        assert np.array_equal(parallel[key], serial[key]), key
+
+
+def test_repair(procar):
+    with open(procar) as rf:
+        text = rf.read()
+    # fields glued together by the Fortran output
+    with open(procar, "w") as wf:
+        wf.write(text.replace("0.25000000 0.50000000", "0.25000000-0.50000000"))
+    assert needs_repair(procar)
+
+    with open(procar) as rf:
+        reader = ProcarReader().read(rf)
+    assert reader.bad_kpoints == 2
+    assert np.isnan(reader.kpoints[0][1]).all()
+
+    with open(procar) as rf:
+        reader = ProcarReader(repair=True).read(rf)
+    assert reader.repaired_lines == 2
+    assert np.allclose(reader.kpoints[0][1], [0.25, -0.5, 0.125])
+
+
+def test_scan_finds_problems_across_chunks(procar, monkeypatch):
+    assert not needs_repair(procar)
+    with open(procar) as rf:
+        text = rf.read()
+    position = text.index("0.25000000 0.50000000") + len("0.25000000")
+    with open(procar, "w") as wf:
+        wf.write(text[:position] + "-" + text[position + 1 :])
+    monkeypatch.setattr(procar_reader, "_SCAN_CHUNK", position)
+    assert needs_repair(procar)
+
+
+def test_procar_does_not_write_a_repaired_copy(procar):
+    with open(procar) as rf:
+        text = rf.read()
+    with open(procar, "w") as wf:
+        wf.write(text.replace("0.25000000 0.50000000", "0.25000000-0.50000000"))
+    # parsed, then loaded from the cache
+    for _ in range(2):
+        parser = Procar(procar)
+        assert np.allclose(parser.kpoints[1], [0.25, -0.5, 0.125])
+        assert not os.path.exists(procar + "-repaired")
+
+
+def test_symmetrize_merges_kpoints_with_their_own_tolerance(procar, monkeypatch):
+    tolerances = []
+    unfold_kpoints = mathematics.unfold_kpoints
+
+    def recorded(kpoints, rotations, tolerance=1e-5):
+        tolerances.append(tolerance)
+        return unfold_kpoints(kpoints, rotations, tolerance)
+
+    monkeypatch.setattr(mathematics, "unfold_kpoints", recorded)
+    structure = Structure(
+        atoms=["Si"], fractional_coordinates=[[0, 0, 0]], lattice=np.eye(3) * 3
+    )
+    parser = Procar(procar)
+    parser.symmetrize(symprec=0.1, structure=structure)
+    # the procar and its band structure
+    assert tolerances == [1e-5, 1e-5]
+    # (0.25, 0.5, 0.125) is on the zone boundary, where 0.5 and -0.5 are
+    # the same, so the 48 operations of the cube give 24 kpoints
+    assert len(parser.kpoints) == 25
+    assert parser.ebs.nkpoints == 25
@@ -0,0 +1,72 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from pyprocar.fermisurface3d.projection import PeriodicProjector
+
+LATTICES = {
+    "orthogonal": np.diag([1.0, 1.5, 2.0]),
+    "fcc": np.array([[-1.0, 1.0, 1.0], [1.0, -1.0, 1.0], [1.0, 1.0, -1.0]]),
+}
+
+
+def _mesh(n):
+    axis = np.arange(n) / n - 0.5
+    return np.array(np.meshgrid(axis, axis, axis, indexing="ij")).reshape(3, -1).T
+
+
+def _nearest(kpoints, reciprocal_lattice, values, points):
+    """Value of the closest periodic image of the kpoints, by brute force"""
+    images = np.array(list(itertools.product([-1, 0, 1], repeat=3)))
+    result = []
+    for point in points:
+        best = None
+        for ik, kpoint in enumerate(kpoints):
+            for image in images:
+                distance = np.linalg.norm(
+                    np.dot(kpoint + image, reciprocal_lattice) - point
+                )
+                if best is None or distance < best[0]:
+                    best = (distance, ik)
+        result.append(values[best[1]])
+    return np.array(result)
+
+
+def _linear(kpoints, reciprocal_lattice, values, points, n):
+    """Trilinear interpolation on the periodic mesh, corner by corner"""
+    inverse = np.linalg.inv(reciprocal_lattice)
+    result = []
+    for point in points:
+        position = (np.dot(point, inverse) + 0.5) * n
+        lower = np.floor(position)
+        weight = position - lower
+        total = 0
+        for corner in itertools.product([0, 1], repeat=3):
+            coordinates = np.mod(lower + corner, n) / n - 0.5
+            ik = np.flatnonzero(np.all(np.isclose(kpoints, coordinates), axis=1))[0]
+            total += np.prod(np.where(corner, weight, 1 - weight)) * values[ik]
+        result.append(total)
+    return np.array(result)
+
+
+@pytest.mark.parametrize("lattice", LATTICES)
+@pytest.mark.parametrize("n", [2, 4])
+def test_projection_matches_brute_force(lattice, n):
+    reciprocal_lattice = LATTICES[lattice]
+    kpoints = _mesh(n)
+    rng = np.random.default_rng(n)
+    values = rng.random(len(kpoints))
+    order = rng.permutation(len(kpoints))
+    points = np.dot(rng.random((20, 3)) * 2 - 1, reciprocal_lattice)
+
+    projector = PeriodicProjector(kpoints[order], reciprocal_lattice)
+    assert projector.orthogonal == (lattice == "orthogonal")
+    assert np.allclose(
+        projector.nearest(values[order], points),
+        _nearest(kpoints, reciprocal_lattice, values, points),
+    )
+    assert np.allclose(
+        projector.linear(values[order], points),
+        _linear(kpoints, reciprocal_lattice, values, points, n),
+    )
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pytest
+
+from pyprocar.qeparser import QEDOSParser, QEParser
+
+DATA = os.path.join(os.path.dirname(__file__), "data", "qe")
+# projwfc output of one Si atom with s and p states, without and with spin
+DOS_DATA = os.path.join(os.path.dirname(__file__), "data", "qe_dos")
+
+
+@pytest.fixture
+def parser(monkeypatch):
+    # the parser finds kpdos.out from the name of kpdos.in
+    monkeypatch.chdir(DATA)
+    return QEParser(bandsin="bands.in", kpdosin="kpdos.in", outfile="scf.out")
+
+
+def test_kpdos(parser):
+    assert [state["species_num"] for state in parser.states] == [1] * 4 + [2] * 4
+    assert np.allclose(parser.kpoints, [[0, 0, 0], [0.5, 0, 0.5]])
+    # the bands are shifted by the Fermi energy (1 eV)
+    assert np.allclose(parser.bands, [[-6, 1], [-5, 2]])
+
+    spd = parser.spd
+    assert spd.shape == (2, 2, 1, 3, 11)
+    assert np.allclose(spd[:, :, 0, :2, 0], [1, 2])
+    # s of both atoms
+    assert np.allclose(spd[:, 0, 0, :2, 1], [[0.5, 0.3], [0.2, 0.6]])
+    # py, pz and px are the states with m = 3, 1 and 2
+    assert np.allclose(spd[0, 1, 0, 0, 2:5], [0.1, 0.4, 0.2])
+    # the terms after the line break of psi
+    assert np.allclose(spd[0, 1, 0, 1, 2:5], [0.1, 0.05, 0.05])
+    # a band without projections
+    assert np.allclose(spd[1, 1, 0, :, 1:], 0)
+    assert np.allclose(spd[..., -1], spd[..., 1:-1].sum(axis=-1))
+    assert np.allclose(spd[:, :, :, -1, 1:], spd[:, :, :, :-1, 1:].sum(axis=-2))
+
+
+def pdos(orbital, energies, spin):
+    """Value written in the pdos fixtures for an orbital (s, py, pz, px),
+    the energies being -1, 0, 1 and 2 eV"""
+    code = {"s": 1, "py": 4, "pz": 2, "px": 3}[orbital]
+    return code + 0.1 * (energies + 1) + 0.5 * spin
+
+
+@pytest.mark.parametrize("spin", [False, True])
+@pytest.mark.parametrize("dos_interpolation_factor", [None, 3])
+def test_pdos(monkeypatch, spin, dos_interpolation_factor):
+    monkeypatch.chdir(os.path.join(DOS_DATA, "spin" if spin else "nospin"))
+    parser = QEDOSParser(dos_interpolation_factor=dos_interpolation_factor)
+    nspin = 2 if spin else 1
+    assert parser.is_spin_polarized == spin
+
+    dos = parser.dos
+    # E_F = 1 eV
+    energies = dos.energies + 1
+    nenergies = 4 * (dos_interpolation_factor or 1)
+    assert np.allclose(energies, np.linspace(-1, 2, nenergies))
+    # projected[iatom][iprincipal][iorbital][ispin][ienergy]
+    assert dos.projected.shape == (1, 1, 9, nspin, nenergies)
+    orbitals = ["s", "py", "pz", "px"]
+    for iorbital, orbital in enumerate(orbitals):
+        for ispin in range(nspin):
+            assert np.allclose(
+                dos.projected[0][0][iorbital][ispin][:],
+                pdos(orbital, energies, ispin),
+            )
+    # no d states in the fixture
+    assert np.allclose(dos.projected[0, 0, 4:], 0)
+    total = sum(pdos(x, energies[:, None], np.arange(nspin)) for x in orbitals)
+    assert np.allclose(dos.total.T, total)
@@ -0,0 +1,60 @@
+import numpy as np
+
+from pyprocar.utils.spectral import (
+    HBAR_EV,
+    BandDerivatives,
+    spectral_gradient,
+    spectral_hessian,
+)
+
+
+def _grid(n):
+    """Kpoints of a complete n x n x n grid in reduced coordinates"""
+    axis = np.arange(n) / n - 0.5
+    return np.array(np.meshgrid(axis, axis, axis, indexing="ij")).reshape(3, -1).T
+
+
+def test_spectral_derivatives_of_a_plane_wave():
+    n = 8
+    x = np.arange(n)
+    phase = 2 * np.pi * (x[:, None, None] + 2 * x[None, None, :]) / n
+    grid = np.broadcast_to(np.sin(phase), (n, n, n))
+    gradient = spectral_gradient(np.fft.fftn(grid))
+    hessian = spectral_hessian(np.fft.fftn(grid))
+
+    step = 2 * np.pi / n
+    assert np.allclose(gradient[0], step * np.cos(phase))
+    assert np.allclose(gradient[1], 0)
+    assert np.allclose(gradient[2], 2 * step * np.cos(phase))
+    assert np.allclose(hessian[0, 0], -(step ** 2) * np.sin(phase))
+    assert np.allclose(hessian[0, 2], -2 * step ** 2 * np.sin(phase))
+    assert np.allclose(hessian[2, 0], hessian[0, 2])
+    assert np.allclose(hessian[1], 0)
+
+
+def test_band_derivatives_do_not_depend_on_the_kpoint_order():
+    kpoints = _grid(6)
+    bands = np.stack(
+        [
+            -np.cos(2 * np.pi * kpoints[:, 0]),
+            np.cos(2 * np.pi * kpoints[:, 0]) + np.cos(2 * np.pi * kpoints[:, 2]),
+        ],
+        axis=1,
+    )
+    reciprocal_lattice = np.diag([1.0, 1.5, 2.0])
+    derivatives = BandDerivatives(kpoints, bands, reciprocal_lattice)
+    assert derivatives.nbands == 2
+    assert derivatives.gradient.shape == (2, len(kpoints), 3)
+    assert derivatives.hessian.shape == (2, len(kpoints), 3, 3)
+    # the first band only depends on the first coordinate, its gradient
+    # follows the derivative of the cosine
+    sine = np.sin(2 * np.pi * kpoints[:, 0])
+    gradient = derivatives.gradient[0] / derivatives.gradient[0][np.argmax(sine), 0]
+    assert np.allclose(gradient[:, 1:], 0)
+    assert np.allclose(gradient[:, 0], sine / sine.max())
+    assert np.allclose(derivatives.velocity, derivatives.gradient / HBAR_EV)
+
+    order = np.random.default_rng(0).permutation(len(kpoints))
+    shuffled = BandDerivatives(kpoints[order], bands[order], reciprocal_lattice)
+    assert np.allclose(shuffled.gradient, derivatives.gradient[:, order])
+    assert np.allclose(shuffled.hessian, derivatives.hessian[:, order])
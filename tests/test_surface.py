@@ -0,0 +1,34 @@
+import numpy as np
+
+from pyprocar.core.surface import (
+    Surface,
+    _as_faces_array,
+    _to_pyvista_faces,
+    convert_from_pyvista_faces,
+)
+
+VERTS = np.array(
+    [[0, 0, 0], [1, 0, 0], [0, 1, 0], [1, 1, 0], [2, 1, 0], [2, 0, 0]], dtype=float
+)
+# a triangle and a square next to it
+FACES = [[0, 1, 2], [1, 5, 4, 3]]
+
+
+def test_triangles_are_one_array():
+    faces = _as_faces_array([[0, 1, 2], [1, 3, 2]])
+    assert isinstance(faces, np.ndarray)
+    assert faces.shape == (2, 3)
+    assert np.array_equal(_to_pyvista_faces(faces), [3, 0, 1, 2, 3, 1, 3, 2])
+
+
+def test_mixed_faces():
+    faces = _as_faces_array(FACES)
+    assert [x.tolist() for x in faces] == FACES
+    assert np.array_equal(_to_pyvista_faces(faces), [3, 0, 1, 2, 4, 1, 5, 4, 3])
+
+    surface = Surface(verts=VERTS, faces=FACES)
+    faces = convert_from_pyvista_faces(surface.pyvista_obj)
+    assert [x.tolist() for x in faces] == FACES
+    # the square is split in two triangles
+    assert len(surface.trimesh_obj.faces) == 3
+    assert np.isclose(surface.trimesh_obj.area, 1.5)
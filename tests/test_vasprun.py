@@ -0,0 +1,94 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from pyprocar.io.cache import pack_tree
+from pyprocar.io.vasp import VaspXML
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+@pytest.fixture
+def vasprun(tmp_path):
+    """Copy of the vasprun.xml fixture, the caches are written next to it"""
+    filename = str(tmp_path / "vasprun.xml")
+    shutil.copy(os.path.join(DATA, "vasprun.xml"), filename)
+    return filename
+
+
+def test_dos_total_energies_are_not_shifted_twice(vasprun):
+    parser = VaspXML(vasprun, cache=False)
+    # energies of the fixture are written with 4 decimals, E_F = 1.5
+    expected = np.array([-5.0, -1.6667, 1.6667, 5.0])
+    first = parser.dos_total["energies"]
+    second = parser.dos_total["energies"]
+    assert np.allclose(first, expected - 1.5)
+    assert np.allclose(second, expected - 1.5)
+    assert np.allclose(parser.dos.energies, expected - 1.5)
+    total = parser.data["general"]["dos"]["total"]["array"]["data"]
+    assert np.allclose(total[0, :, 0], expected)
+
+
+def test_both_parsers_share_a_directory(vasprun):
+    from pyprocar.vaspxml import VaspXML as LegacyVaspXML
+
+    for _ in range(2):
+        parser = VaspXML(vasprun)
+        legacy = LegacyVaspXML(vasprun)
+        assert parser.bands["spin 1"]["eigen_values"].shape == (2, 2)
+        assert np.allclose(
+            parser.dos_total["energies"], legacy.dos_total["energies"]
+        )
+
+
+def test_missing_sections_are_read_in_one_pass_and_cached(vasprun, monkeypatch):
+    reads = []
+    parse_vasprun = VaspXML.parse_vasprun
+
+    def counted(self, source, sections=None):
+        # the missing blocks are read from their offsets, not from the file
+        reads.append(sorted(sections) if source == vasprun else source.read)
+        return parse_vasprun(self, source, sections=sections)
+
+    monkeypatch.setattr(VaspXML, "parse_vasprun", counted)
+    parser = VaspXML(vasprun, sections=["structures"])
+    parser.bands
+    assert len(reads) == 2
+    assert reads[0] == ["structures"]
+
+    # the second run finds the blocks read by the first one in the cache
+    parser = VaspXML(vasprun, sections=["dos", "eigenvalues", "structures"])
+    parser.bands
+    parser.dos
+    assert len(reads) == 2
+    assert np.allclose(
+        parser.bands["spin 1"]["eigen_values"],
+        VaspXML(vasprun, cache=False).bands["spin 1"]["eigen_values"],
+    )
+
+
+def _same(x, y):
+    """Whether two parsed trees hold the same data, lists and arrays alike"""
+    x, y = pack_tree(x), pack_tree(y)
+    return x.keys() == y.keys() and all(np.array_equal(x[k], y[k]) for k in x)
+
+
+def test_missing_sections_match_the_whole_file(vasprun):
+    full = VaspXML(vasprun, cache=False)
+    parser = VaspXML(vasprun, sections=[])
+    with open(vasprun, "rb") as rf:
+        text = rf.read()
+    for _, tag, start, end in parser._blocks["children"]:
+        assert text[start:].startswith(b"<" + tag.encode())
+        assert text[end:].startswith(b"</" + tag.encode() + b">")
+
+    # once from the offsets, then from the cache
+    for parser in (parser, VaspXML(vasprun, sections=[])):
+        for name in ("eigenvalues", "projected", "dos"):
+            parser._load_sections([name])
+            assert _same(parser.data["general"][name], full.data["general"][name])
+        parser._load_sections(["structures", "scsteps", "forces"])
+        for name in ("structures", "calculation", "forces"):
+            assert _same(parser.data[name], full.data[name])